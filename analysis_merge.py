@@ -0,0 +1,160 @@
+"""
+Reduce step of map-reduce PDF analysis
+Analyses of separate document chunks are merged field by field: numeric values
+are checked against plausible ranges (common unit slips are converted back),
+agreeing values are grouped and the group with the highest confidence weight
+wins. Conflicts end up in the notes instead of being silently dropped.
+"""
+import logging
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from rule_extractor import FIELD_RANGES, FOUND_DATA_FIELDS, is_sufficient, parse_number
+
+logger = logging.getLogger(__name__)
+
+NUMERIC_TOLERANCE = 0.03  # relative difference of values counted as the same answer
+DEMAND_TOLERANCE = 0.25  # zapotrzebowanie_cieplo vs powierzchnia_uzytkowa * wskaznik_eu
+
+# Unit slips seen in model answers: factors to the found_data unit, tried in order
+_UNIT_FIXES = {
+    'moc_grzewcza': (0.001,),  # W instead of kW
+    'zapotrzebowanie_cieplo': (1000.0,),  # MWh/rok instead of kWh/rok
+}
+
+# First number of a value the model returned as text, e.g. "-20 °C", "7,2 kW"
+_NUMBER_RE = re.compile(r'([-−–]?)\s?(\d+(?:[.,]\d+)?)')
+
+
+def normalize_value(field: str, value: Any) -> Tuple[Optional[Any], bool]:
+    """(value in found_data units or None when implausible, unit corrected)"""
+    if value is None or value == '':
+        return None, False
+    if field not in FIELD_RANGES:
+        text = str(value).strip()
+        return (text or None), False
+
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        number = float(value)
+    else:
+        match = _NUMBER_RE.search(str(value).replace(' ', ''))
+        if not match:
+            return None, False
+        number = parse_number(match.group(1), match.group(2))
+    low, high = FIELD_RANGES[field]
+    if low <= number <= high:
+        return number, False
+    for factor in _UNIT_FIXES.get(field, ()):
+        if low <= number * factor <= high:
+            return round(number * factor, 3), True
+    return None, False
+
+
+def _groups(field: str, candidates: List[Tuple[Any, float, int]]) -> List[Dict[str, Any]]:
+    """Agreeing candidates grouped: numbers within tolerance, texts case-insensitively"""
+    groups: List[Dict[str, Any]] = []
+    for value, weight, chunk in candidates:
+        for group in groups:
+            if field in FIELD_RANGES:
+                same = abs(value - group['value']) <= NUMERIC_TOLERANCE * max(abs(group['value']), 1e-9)
+            else:
+                same = value.casefold() == group['value'].casefold()
+            if same:
+                group['weight'] += weight
+                group['confidence'] = max(group['confidence'], weight)
+                group['chunks'].append(chunk)
+                break
+        else:
+            groups.append({'value': value, 'weight': weight, 'confidence': weight, 'chunks': [chunk]})
+    return groups
+
+
+def merge_analyses(analyses: List[Optional[Dict[str, Any]]]) -> Dict[str, Any]:
+    """analyze_construction_project-shaped result from per-chunk analyses
+
+    `analyses` is in document order; None marks a chunk whose analysis failed.
+    Each candidate value is weighted by its chunk's confidence_level.
+    """
+    candidates: Dict[str, List[Tuple[Any, float, int]]] = {field: [] for field in FOUND_DATA_FIELDS}
+    unit_corrections = 0
+    for chunk, analysis in enumerate(analyses):
+        if not analysis:
+            continue
+        try:
+            weight = min(1.0, max(0.05, float(analysis.get('confidence_level') or 0)))
+        except (TypeError, ValueError):
+            weight = 0.05
+        for field, value in (analysis.get('found_data') or {}).items():
+            if field not in candidates:
+                continue
+            value, corrected = normalize_value(field, value)
+            if value is None:
+                continue
+            unit_corrections += corrected
+            candidates[field].append((value, weight, chunk))
+
+    found: Dict[str, Any] = dict.fromkeys(FOUND_DATA_FIELDS)
+    sources: Dict[str, List[int]] = {}
+    confidences: List[float] = []
+    conflicts: List[str] = []
+    for field, field_candidates in candidates.items():
+        if not field_candidates:
+            continue
+        groups = sorted(_groups(field, field_candidates), key=lambda group: group['weight'], reverse=True)
+        winner = groups[0]
+        total = sum(group['weight'] for group in groups)
+        value = winner['value']
+        found[field] = int(value) if isinstance(value, float) and value.is_integer() else value
+        sources[field] = [chunk + 1 for chunk in winner['chunks']]
+        confidences.append(winner['confidence'] * winner['weight'] / total)
+        if len(groups) > 1:
+            others = ", ".join(str(group['value']) for group in groups[1:])
+            conflicts.append(f"{field}: wybrano {found[field]} (fragmenty {sources[field]}), inne odczyty: {others}")
+
+    area, eu, demand = found['powierzchnia_uzytkowa'], found['wskaznik_eu'], found['zapotrzebowanie_cieplo']
+    consistent = True
+    if area and eu and demand and abs(demand - area * eu) > DEMAND_TOLERANCE * area * eu:
+        consistent = False
+        conflicts.append(f"zapotrzebowanie_cieplo {demand} kWh/rok niezgodne z powierzchnia × EU "
+                         f"({area * eu:.0f} kWh/rok)")
+
+    analysed = sum(1 for analysis in analyses if analysis)
+    known = len(confidences)
+    confidence = sum(confidences) / known if known else 0.0
+    if not consistent:
+        confidence *= 0.8
+    if is_sufficient(found) and known >= 4:
+        quality = "good"
+    else:
+        quality = "partial" if known else "insufficient"
+    if found['moc_grzewcza']:
+        method = "direct_power"
+    elif area and eu:
+        method = "zordon_formula"
+    else:
+        method = "manual_input"
+
+    notes = [f"Wartości scalone z {analysed} z {len(analyses)} fragmentów dokumentu."]
+    if unit_corrections:
+        notes.append(f"Poprawiono jednostki {unit_corrections} odczytów.")
+    if conflicts:
+        notes.append("Rozbieżności: " + "; ".join(conflicts))
+        logger.info(f"Chunk merge conflicts: {conflicts}")
+
+    return {
+        "found_data": found,
+        "analysis_summary": f"Analiza dokumentu w {len(analyses)} fragmentach - znaleziono {known} "
+                            f"z {len(FOUND_DATA_FIELDS)} pól",
+        "data_quality": quality,
+        "recommended_calculation_method": method,
+        "confidence_level": round(confidence, 2),
+        "notes": " ".join(notes),
+        "extraction_method": "llm_map_reduce",
+        "chunks": {
+            "total": len(analyses),
+            "analysed": analysed,
+            "field_sources": sources,
+            "unit_corrections": unit_corrections,
+            "conflicts": len(conflicts)
+        }
+    }
@@ -0,0 +1,557 @@
+#!/usr/bin/env python3
+"""
+Benchmarki proxy cieplo.app
+Uruchamiane lokalnie na cieplo_stub_server.py, bez ruchu do api.cieplo.app
+
+Użycie:
+    python bench_cieplo.py pool [--requests 200 --connect-latency 0.03 | --base-url https://...]
+    python bench_cieplo.py hitrate [--payloads nagrane.jsonl]
+    python bench_cieplo.py cache [--entries 10000]
+    python bench_cieplo.py restart [--latency 0.08]
+    python bench_cieplo.py coalesce [--clients 50]
+    python bench_cieplo.py swr [--latency 1.0]
+    python bench_cieplo.py breaker
+    python bench_cieplo.py batch [--buildings 100 --latency 0.2]
+    python bench_cieplo.py surrogate [--observations wyniki.jsonl]
+    python bench_cieplo.py zones [--lookups 100000]
+    python bench_cieplo.py load [--recordings nagrania.jsonl --latency lognormal:0.3:0.6]
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+from collections import Counter
+
+import requests
+
+from cieploProxy import CieploApiProxy, canonical_cache_key
+from cieplo_stub_server import (LatencyModel, SAMPLE_RESPONSE, load_recordings,
+                                start_stub_server, synthetic_response)
+from heat_surrogate import HeatDemandSurrogate
+from postcode_zones import PostcodeZoneIndex, build_index
+from result_cache import TTLCache
+
+def _summary(label, samples):
+    samples = sorted(samples)
+    p50 = samples[len(samples) // 2] * 1000
+    p95 = samples[int(len(samples) * 0.95) - 1] * 1000
+    mean = statistics.mean(samples) * 1000
+    print(f"{label:<28} p50={p50:7.3f} ms  p95={p95:7.3f} ms  mean={mean:7.3f} ms")
+
+
+def bench_pool(args):
+    """Zimne połączenie (nowe TCP/TLS na każde wywołanie) vs połączenie z puli"""
+    server = None
+    base_url = args.base_url
+    if base_url is None:
+        # Lokalny stub nie ma kosztu uzgadniania - dodaje go connect_latency
+        server, base_url = start_stub_server(connect_latency=args.connect_latency)
+    payload = {'surface_area': 120, 'location': '00-001'}
+
+    cold = []
+    for _ in range(args.requests):
+        started = time.perf_counter()
+        response = requests.post(f"{base_url}/calculate", json=payload,
+                                 headers={'Connection': 'close'}, timeout=5)
+        response.json()
+        cold.append(time.perf_counter() - started)
+
+    proxy = CieploApiProxy({'CIEPLO_POOL_SIZE': 4, 'CIEPLO_BASE_URL': base_url})
+    warm = []
+    for i in range(args.requests):
+        # Unikalna powierzchnia omija cache - mierzymy tylko warstwę HTTP
+        data = {'powierzchnia': 100 + i, 'kodPocztowy': '00-001'}
+        started = time.perf_counter()
+        result = proxy.calculate_heating_demand(data)
+        warm.append(time.perf_counter() - started)
+        assert result['status'] == 'success', result
+
+    if server is not None:
+        connections = server.stats()['counts'].get('connections')
+        server.shutdown()
+        print(f"cieplo.app stub @ {base_url}, connect latency {args.connect_latency * 1000:.0f} ms, "
+              f"{args.requests} requests each, {connections} connections opened")
+    else:
+        print(f"{base_url}, {args.requests} requests each")
+    _summary('cold connection', cold)
+    _summary('pooled keep-alive (proxy)', warm)
+    print(f"connection stats: {proxy.get_connection_stats()}")
+
+
+def _legacy_cache_key(data):
+    """Klucz sprzed zmiany: tylko 4 pola formularza"""
+    return "_".join([
+        str(data.get('powierzchnia', 0)),
+        str(data.get('kodPocztowy', '')),
+        str(data.get('typBudynku', '')),
+        str(data.get('kondygnacje', 1))
+    ])
+
+
+def synthetic_form_payloads(count, seed=2025):
+    """Strumień formularzy o rozkładzie zbliżonym do ruchu produkcyjnego"""
+    rng = random.Random(seed)
+    areas = [90, 100, 120, 120, 140, 150, 160, 180, 200]
+    postcodes = ['00-001', '30-001', '50-001', '60-001', '80-001', '15-001']
+    insulation = ['standard', 'standard', 'dobre', 'slabe']
+    windows = ['standard', 'standard', 'trzyszybowe', 'stare']
+    ventilation = ['natural', 'natural', 'mechanical', 'recuperation']
+    temps = [35, 45, 55, 55]
+
+    forms = []
+    for _ in range(count):
+        area = rng.choice(areas)
+        form = {
+            # Formularz wysyła liczby raz jako int, raz jako tekst
+            'powierzchnia': rng.choice([area, str(area), f"{area}.0"]),
+            'kodPocztowy': rng.choice(postcodes),
+            'typBudynku': 'dom',
+            'ocieplenie': rng.choice(insulation),
+            'tempOgrzewania': rng.choice(temps),
+            'kondygnacje': rng.choice([1, 1, 2]),
+            'okna': rng.choice(windows),
+            'wentylacja': rng.choice(ventilation)
+        }
+        forms.append(form)
+    return forms
+
+
+def load_payloads(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def bench_hitrate(args):
+    """Trafienia cache: stary klucz (4 pola, TTL 5 min) vs pełny payload (długi TTL)"""
+    forms = load_payloads(args.payloads) if args.payloads else synthetic_form_payloads(args.count)
+    proxy = CieploApiProxy()
+    span = args.hours * 3600
+    step = span / max(1, len(forms))
+
+    def simulate(key_fn, ttl):
+        cache = {}
+        hits = wrong = 0
+        for i, form in enumerate(forms):
+            now = form.get('ts', i * step)
+            payload = proxy._prepare_heating_payload(form)
+            truth = canonical_cache_key(payload)
+            key = key_fn(form, payload)
+            entry = cache.get(key)
+            if entry and entry[1] + ttl > now:
+                hits += 1
+                if entry[0] != truth:
+                    wrong += 1
+            else:
+                cache[key] = (truth, now)
+        return hits, wrong
+
+    legacy = simulate(lambda form, payload: _legacy_cache_key(form), 300)
+    canonical = simulate(lambda form, payload: canonical_cache_key(payload), args.ttl)
+
+    total = len(forms)
+    print(f"{total} payloads over {args.hours} h "
+          f"({'recorded' if args.payloads else 'synthetic'})")
+    for label, (hits, wrong) in (('legacy key, TTL 300 s', legacy),
+                                 (f"full payload key, TTL {args.ttl} s", canonical)):
+        print(f"{label:<34} hit rate={hits / total:6.1%}  "
+              f"wrong answers={wrong} ({wrong / total:.1%})")
+
+
+class _LegacyDictCache:
+    """Dawna implementacja: dict + sortowanie całości przy przepełnieniu"""
+
+    def __init__(self, ttl, max_entries):
+        self.cache = {}
+        self.cache_ttl = ttl
+        self.max_entries = max_entries
+
+    def get(self, key):
+        if key in self.cache:
+            cached_data, timestamp = self.cache[key]
+            if (timestamp + self.cache_ttl) > time.time():
+                return cached_data
+            del self.cache[key]
+        return None
+
+    def put(self, key, data):
+        self.cache[key] = (data, time.time())
+        if len(self.cache) > self.max_entries:
+            sorted_cache = sorted(self.cache.items(), key=lambda x: x[1][1])
+            for key_to_remove, _ in sorted_cache[:20]:
+                del self.cache[key_to_remove]
+
+
+def bench_cache(args):
+    """Mikrobenchmark put/get przy pełnym cache (stara vs nowa implementacja)"""
+    value = CieploApiProxy()._process_heating_result(SAMPLE_RESPONSE)
+    keys = [canonical_cache_key({'i': i}) for i in range(args.entries * 2)]
+    rng = random.Random(7)
+    lookups = [rng.choice(keys) for _ in range(args.ops)]
+
+    caches = (
+        ('legacy dict + sort', _LegacyDictCache(3600, args.entries)),
+        ('TTLCache (LRU, O(1))', TTLCache(ttl=3600, max_entries=args.entries,
+                                         max_bytes=64 * 1024 * 1024))
+    )
+    print(f"{args.entries} entries at capacity, {args.ops} ops per phase")
+    for label, cache in caches:
+        for key in keys[:args.entries]:
+            cache.put(key, value)
+
+        # Wstawienia ponad limit - każde wymusza ewikcję
+        started = time.perf_counter()
+        for key in keys[args.entries:args.entries + args.ops]:
+            cache.put(key, value)
+        put_us = (time.perf_counter() - started) / args.ops * 1e6
+
+        started = time.perf_counter()
+        for key in lookups:
+            cache.get(key)
+        get_us = (time.perf_counter() - started) / args.ops * 1e6
+
+        print(f"{label:<24} put={put_us:9.2f} us/op  get={get_us:6.2f} us/op")
+
+
+def bench_restart(args):
+    """p50 po restarcie: cache w pamięci (zimny) vs współdzielony SQLite (ciepły)"""
+    server, base_url = start_stub_server(latency=args.latency)
+    forms = synthetic_form_payloads(args.requests)
+
+    def run(config):
+        # Nowa instancja proxy = nowy proces po deployu
+        proxy = CieploApiProxy(dict(config, CIEPLO_BASE_URL=base_url))
+        samples = []
+        for form in forms:
+            started = time.perf_counter()
+            proxy.calculate_heating_demand(form)
+            samples.append(time.perf_counter() - started)
+        return samples
+
+    with tempfile.TemporaryDirectory() as tmp:
+        sqlite_config = {'CIEPLO_CACHE_BACKEND': 'sqlite',
+                         'CIEPLO_CACHE_PATH': os.path.join(tmp, 'cache.sqlite3')}
+        run({})
+        memory_after_restart = run({})
+        run(sqlite_config)
+        sqlite_after_restart = run(sqlite_config)
+
+    server.shutdown()
+    print(f"{args.requests} requests replayed after restart, upstream latency {args.latency * 1000:.0f} ms")
+    _summary('memory cache (per process)', memory_after_restart)
+    _summary('sqlite cache (shared)', sqlite_after_restart)
+
+
+def bench_coalesce(args):
+    """N równoczesnych identycznych formularzy -> jedno wywołanie upstream"""
+    server, base_url = start_stub_server(latency=args.latency)
+    proxy = CieploApiProxy({'CIEPLO_BASE_URL': base_url})
+    form = synthetic_form_payloads(1)[0]
+    barrier = threading.Barrier(args.clients)
+    results = []
+
+    def client():
+        barrier.wait()
+        started = time.perf_counter()
+        result = proxy.calculate_heating_demand(form)
+        results.append((time.perf_counter() - started, result))
+
+    threads = [threading.Thread(target=client) for _ in range(args.clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    server.shutdown()
+
+    ok = sum(1 for _, result in results if result.get('status') == 'success')
+    print(f"{args.clients} concurrent identical requests, upstream latency {args.latency * 1000:.0f} ms")
+    print(f"upstream calls: {server.request_count}, successful responses: {ok}")
+    print(f"coalescing: {proxy.single_flight.stats()}")
+    _summary('client latency', [elapsed for elapsed, _ in results])
+    assert server.request_count == 1, 'identical in-flight requests were not coalesced'
+    assert ok == args.clients
+
+
+def bench_swr(args):
+    """Opóźnienie ogona przy wolnym upstream: twardy TTL vs stale-while-revalidate"""
+    server, base_url = start_stub_server(latency=args.latency)
+    forms = synthetic_form_payloads(args.keys)
+
+    def run(config):
+        proxy = CieploApiProxy(dict(config, CIEPLO_BASE_URL=base_url))
+        for form in forms:
+            proxy.calculate_heating_demand(form)
+
+        samples = []
+        rng = random.Random(11)
+        deadline = time.monotonic() + args.duration
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            proxy.calculate_heating_demand(rng.choice(forms))
+            samples.append(time.perf_counter() - started)
+            time.sleep(0.005)
+        return proxy, samples
+
+    ttl = args.ttl
+    _, expiring = run({'CIEPLO_CACHE_TTL': ttl, 'CIEPLO_CACHE_SOFT_TTL': ttl})
+    proxy, swr = run({'CIEPLO_CACHE_TTL': 3600, 'CIEPLO_CACHE_SOFT_TTL': ttl})
+    server.shutdown()
+
+    print(f"{args.keys} keys, TTL {ttl} s, upstream latency {args.latency * 1000:.0f} ms, "
+          f"{args.duration} s of traffic")
+    for label, samples in (('hard TTL only', expiring), ('soft TTL + bg refresh', swr)):
+        samples = sorted(samples)
+        p99 = samples[int(len(samples) * 0.99) - 1] * 1000
+        _summary(label, samples)
+        print(f"{'':<28} p99={p99:7.3f} ms  max={samples[-1] * 1000:7.3f} ms")
+    print(f"refresh: {proxy.get_metrics()['refresh']}")
+
+
+def bench_breaker(args):
+    """Zawieszony upstream: adaptacyjny timeout + szybka odmowa przy otwartym bezpieczniku"""
+    server, base_url = start_stub_server(latency=args.latency)
+    proxy = CieploApiProxy({'CIEPLO_TIMEOUT_MIN': 0.1, 'CIEPLO_BREAKER_RECOVERY': 60,
+                            'CIEPLO_SURROGATE_ENABLED': 'false', 'CIEPLO_BASE_URL': base_url})
+    forms = iter({'powierzchnia': 50 + i, 'kodPocztowy': '00-001'} for i in range(10000))
+
+    def phase(label, count):
+        samples, outcomes = [], Counter()
+        for _ in range(count):
+            started = time.perf_counter()
+            result = proxy.calculate_heating_demand(next(forms))
+            samples.append(time.perf_counter() - started)
+            outcomes[result.get('error_type') or result['status']] += 1
+        _summary(label, samples)
+        print(f"{'':<28} outcomes={dict(outcomes)} timeout={proxy.current_timeout()} s "
+              f"circuit={proxy.breaker.state}")
+
+    print(f"healthy upstream {args.latency * 1000:.0f} ms, then hung ({args.hang} s)")
+    phase('healthy upstream', 40)
+    server.latency = LatencyModel.parse(args.hang)
+    phase('hung upstream', 40)
+    server.shutdown()
+
+
+def bench_batch(args):
+    """Osiedle: sekwencyjne POST-y vs calculate_batch z równoległym fan-outem"""
+    server, base_url = start_stub_server(latency=args.latency)
+    forms = synthetic_form_payloads(args.buildings, seed=3)
+
+    proxy = CieploApiProxy({'CIEPLO_BASE_URL': base_url})
+    started = time.perf_counter()
+    for form in forms:
+        proxy.calculate_heating_demand(form)
+    sequential = time.perf_counter() - started
+    sequential_calls = server.request_count
+
+    server.reset_stats()
+    proxy = CieploApiProxy({'CIEPLO_BATCH_CONCURRENCY': args.concurrency, 'CIEPLO_BASE_URL': base_url})
+    started = time.perf_counter()
+    first_line = None
+    for line in proxy.calculate_batch(forms):
+        if first_line is None:
+            first_line = time.perf_counter() - started
+        summary = line.get('summary')
+    batch = time.perf_counter() - started
+    server.shutdown()
+
+    print(f"{args.buildings} buildings ({summary['unique']} unique), "
+          f"upstream latency {args.latency * 1000:.0f} ms")
+    print(f"{'sequential':<28} {sequential:7.2f} s  {args.buildings / sequential:7.1f} buildings/s  "
+          f"upstream calls={sequential_calls}")
+    print(f"{'batch, concurrency ' + str(args.concurrency):<28} {batch:7.2f} s  "
+          f"{args.buildings / batch:7.1f} buildings/s  upstream calls={server.request_count}  "
+          f"first result after {first_line * 1000:.0f} ms")
+
+
+def bench_surrogate(args):
+    """Trafność i opóźnienie modelu zastępczego na odłożonych wynikach"""
+    proxy = CieploApiProxy({'CIEPLO_SURROGATE_ENABLED': 'false'})
+    if args.observations:
+        records = [(r['payload'], r['result']) for r in load_payloads(args.observations)]
+        source = args.observations
+    else:
+        rng = random.Random(5)
+        records = []
+        for form in synthetic_form_payloads(args.count, seed=9):
+            form['powierzchnia'] = rng.randint(60, 320)
+            form['kodPocztowy'] = f"{rng.randint(0, 99):02d}-{rng.randint(0, 999):03d}"
+            payload = proxy._prepare_heating_payload(form)
+            records.append((payload, proxy._process_heating_result(synthetic_response(payload, rng))))
+        source = 'synthetic'
+
+    random.Random(1).shuffle(records)
+    split = int(len(records) * 0.8)
+    model = HeatDemandSurrogate(min_samples=args.min_samples)
+    for payload, result in records[:split]:
+        model.observe(payload, result)
+
+    errors = {'mocObliczona': [], 'zapotrzebowanieRoczne': [], 'wspolczynnikEU': []}
+    latencies, misses = [], 0
+    for payload, result in records[split:]:
+        started = time.perf_counter()
+        estimate = model.estimate(payload)
+        latencies.append(time.perf_counter() - started)
+        if estimate is None:
+            misses += 1
+            continue
+        for field, values in errors.items():
+            if result.get(field):
+                values.append(abs(estimate[field] - result[field]) / abs(result[field]))
+
+    held_out = len(records) - split
+    print(f"{source}: trained on {split}, evaluated on {held_out} held-out results, "
+          f"{model.stats()['cells']} grid cells")
+    print(f"coverage: {(held_out - misses) / held_out:.1%}")
+    for field, values in errors.items():
+        values.sort()
+        print(f"{field:<24} MAPE={statistics.mean(values):6.2%}  "
+              f"p90 error={values[int(len(values) * 0.9)]:6.2%}")
+    _summary('estimate latency', latencies)
+
+
+def bench_zones(args):
+    """Budowa i mapowanie indeksu stref oraz czas pojedynczego odczytu"""
+    path = os.path.join(tempfile.mkdtemp(), 'postcode_zones.bin')
+    started = time.perf_counter()
+    build_index(path)
+    build_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    index = PostcodeZoneIndex(path)
+    open_time = time.perf_counter() - started
+
+    rng = random.Random(3)
+    codes = [f"{rng.randint(0, 99):02d}-{rng.randint(0, 999):03d}" for _ in range(args.lookups)]
+    started = time.perf_counter()
+    for code in codes:
+        index.lookup(code)
+    per_lookup = (time.perf_counter() - started) / len(codes)
+
+    print(f"index {os.path.getsize(path)} bytes: build {build_time * 1000:.1f} ms, "
+          f"open+mmap {open_time * 1000:.3f} ms")
+    print(f"lookup: {per_lookup * 1e6:.2f} µs/op over {len(codes)} random postcodes")
+    print(f"34-500 -> {index.lookup('34-500')}  00-950 -> {index.lookup('00-950')}")
+
+
+def bench_load(args):
+    """Test obciążeniowy proxy na zastępniku z rozkładem opóźnień, błędami i slow-drip"""
+    recordings = load_recordings(args.recordings) if args.recordings else {}
+    server, base_url = start_stub_server(
+        recordings=recordings, latency=args.latency, error_rate=args.error_rate,
+        drip_rate=args.drip_rate, seed=42
+    )
+    proxy = CieploApiProxy({'CIEPLO_BASE_URL': base_url})
+    forms = synthetic_form_payloads(args.forms, seed=21)
+    samples, outcomes = [], Counter()
+    lock = threading.Lock()
+    deadline = time.monotonic() + args.duration
+
+    def client(seed):
+        rng = random.Random(seed)
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            result = proxy.calculate_heating_demand(rng.choice(forms))
+            elapsed = time.perf_counter() - started
+            with lock:
+                samples.append(elapsed)
+                outcomes[result.get('error_type') or
+                         ('estimated' if result.get('estimated') else result['status'])] += 1
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(args.clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    server.shutdown()
+
+    print(f"{args.clients} clients x {args.duration} s, {len(forms)} distinct forms, "
+          f"stub latency {server.latency}, error rate {args.error_rate}, drip rate {args.drip_rate}")
+    print(f"throughput: {len(samples) / args.duration:.1f} req/s  outcomes={dict(outcomes)}")
+    _summary('proxy latency', samples)
+    print(f"stub: {server.stats()['counts']}")
+    metrics = proxy.get_metrics()
+    print(f"cache hit rate={metrics['cache']['hit_rate']}  circuit={metrics['circuit']['state']}  "
+          f"coalesced={metrics['coalescing']['coalesced_waits']}  timeout={metrics['upstream']['timeout']} s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarki proxy cieplo.app')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    pool = sub.add_parser('pool', help='zimne vs ponownie użyte połączenie HTTP')
+    pool.add_argument('--requests', type=int, default=200)
+    pool.add_argument('--connect-latency', type=float, default=0.03,
+                      help='koszt nowego połączenia w stubie w sekundach (uzgadnianie TCP + TLS)')
+    pool.add_argument('--base-url', help='zamiast stubu: prawdziwy endpoint, np. https://api.cieplo.app')
+    pool.set_defaults(func=bench_pool)
+
+    hitrate = sub.add_parser('hitrate', help='trafienia cache na nagranych payloadach')
+    hitrate.add_argument('--payloads', help='JSONL z formularzami (opcjonalne pole ts w sekundach)')
+    hitrate.add_argument('--count', type=int, default=5000)
+    hitrate.add_argument('--hours', type=float, default=72)
+    hitrate.add_argument('--ttl', type=int, default=86400)
+    hitrate.set_defaults(func=bench_hitrate)
+
+    cache = sub.add_parser('cache', help='mikrobenchmark starego i nowego cache')
+    cache.add_argument('--entries', type=int, default=10000)
+    cache.add_argument('--ops', type=int, default=2000)
+    cache.set_defaults(func=bench_cache)
+
+    restart = sub.add_parser('restart', help='p50 po restarcie workera')
+    restart.add_argument('--requests', type=int, default=200)
+    restart.add_argument('--latency', type=float, default=0.08)
+    restart.set_defaults(func=bench_restart)
+
+    coalesce = sub.add_parser('coalesce', help='łączenie identycznych zapytań w locie')
+    coalesce.add_argument('--clients', type=int, default=50)
+    coalesce.add_argument('--latency', type=float, default=0.5)
+    coalesce.set_defaults(func=bench_coalesce)
+
+    swr = sub.add_parser('swr', help='stale-while-revalidate przy wolnym upstream')
+    swr.add_argument('--keys', type=int, default=20)
+    swr.add_argument('--ttl', type=int, default=1)
+    swr.add_argument('--latency', type=float, default=1.0)
+    swr.add_argument('--duration', type=float, default=5.0)
+    swr.set_defaults(func=bench_swr)
+
+    breaker = sub.add_parser('breaker', help='bezpiecznik i adaptacyjny timeout')
+    breaker.add_argument('--latency', type=float, default=0.02)
+    breaker.add_argument('--hang', type=float, default=5.0)
+    breaker.set_defaults(func=bench_breaker)
+
+    batch = sub.add_parser('batch', help='przepustowość /calculate-batch')
+    batch.add_argument('--buildings', type=int, default=100)
+    batch.add_argument('--latency', type=float, default=0.2)
+    batch.add_argument('--concurrency', type=int, default=8)
+    batch.set_defaults(func=bench_batch)
+
+    surrogate = sub.add_parser('surrogate', help='trafność modelu zastępczego')
+    surrogate.add_argument('--observations', help='JSONL {payload, result} (CIEPLO_SURROGATE_PATH)')
+    surrogate.add_argument('--count', type=int, default=5000)
+    surrogate.add_argument('--min-samples', type=int, default=3)
+    surrogate.set_defaults(func=bench_surrogate)
+
+    zones = sub.add_parser('zones', help='indeks kod pocztowy -> strefa klimatyczna')
+    zones.add_argument('--lookups', type=int, default=100000)
+    zones.set_defaults(func=bench_zones)
+
+    load = sub.add_parser('load', help='test obciążeniowy na zastępniku cieplo.app')
+    load.add_argument('--recordings', help='JSONL z nagraniami (CIEPLO_RECORD_PATH)')
+    load.add_argument('--latency', default='lognormal:0.3:0.6')
+    load.add_argument('--error-rate', type=float, default=0.02)
+    load.add_argument('--drip-rate', type=float, default=0.01)
+    load.add_argument('--clients', type=int, default=16)
+    load.add_argument('--forms', type=int, default=500)
+    load.add_argument('--duration', type=float, default=10.0)
+    load.set_defaults(func=bench_load)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
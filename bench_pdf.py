@@ -0,0 +1,1422 @@
+#!/usr/bin/env python3
+"""
+Benchmarki analizy PDF
+Syntetyczne projekty budowlane generowane bez zależności (surowy PDF 1.4)
+
+Użycie:
+    python bench_pdf.py extract [--pages 120 --workers 1,2,4,8]
+    python bench_pdf.py rank [--projects 200]
+    python bench_pdf.py rules [--projects 500 --llm-latency 4.0]
+    python bench_pdf.py memory [--pages 200]
+    python bench_pdf.py stream [--runs 30 --tokens-per-second 250]
+    python bench_pdf.py cascade [--documents 200]
+    python bench_pdf.py ratelimit [--documents 60 --threads 8 --rpm 30]
+    python bench_pdf.py mapreduce [--documents 30 --pages 60 --tpm 6000]
+    python bench_pdf.py lazy [--pages 200]
+    python bench_pdf.py sandbox [--bomb-mb 768 --deadline 5 --cpu 3 --memory 512]
+    python bench_pdf.py neardup [--uploads 120 --designs 10 --catalog-share 0.8]
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import random
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from types import SimpleNamespace
+
+from PyPDF2 import PdfReader
+
+from page_ranking import select_relevant_text, split_pages
+from pdf_extract import ParallelExtractor, extract_pages_sequential
+from pdf_upload import UploadRejected, inspect_pdf, spool_upload
+from resilience import TokenBucketLimiter
+from rule_extractor import extract_fields, is_sufficient
+
+_PROJECT_LINES = [
+    "PROJEKT ARCHITEKTONICZNO-BUDOWLANY",
+    "Budynek mieszkalny jednorodzinny, parterowy z poddaszem uzytkowym",
+    "Powierzchnia uzytkowa: {area} m2",
+    "Powierzchnia zabudowy: {footprint} m2",
+    "Kubatura: {volume} m3",
+    "Wskaznik EU: {eu} kWh/(m2 rok)",
+    "Wskaznik EP: {ep} kWh/(m2 rok)",
+    "Lokalizacja: {city}, dzialka nr {plot}",
+    "Projektowa temperatura zewnetrzna: {temp} C",
+    "Projektowe obciazenie cieplne: {power} kW",
+    "Sciany zewnetrzne: U = 0,20 W/(m2 K), styropian grafitowy 20 cm",
+    "Dach: U = 0,15 W/(m2 K), welna mineralna 30 cm",
+    "Okna: U = 0,9 W/(m2 K), pakiet trzyszybowy",
+    "Wentylacja mechaniczna z odzyskiem ciepla",
+]
+
+_FILLER = [
+    "Rzut parteru, skala 1:50",
+    "Przekroj A-A, skala 1:50",
+    "Elewacja poludniowa",
+    "Zestawienie stolarki okiennej",
+    "Konstrukcja stropu gestozebrowego",
+    "Detal ocieplenia cokolu",
+    "Opis techniczny instalacji sanitarnych",
+]
+
+
+def _escape(text):
+    return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+
+def _page_stream(rng, lines, drawing_ops):
+    ops = ["BT /F1 9 Tf 11 TL 40 800 Td"]
+    ops.extend(f"({_escape(line)}) Tj T*" for line in lines)
+    ops.append("ET")
+    # Rysunek: linie i prostokąty jak w rzutach - parsowane, ale bez tekstu
+    ops.append("0.3 w")
+    for _ in range(drawing_ops):
+        x, y = rng.uniform(30, 560), rng.uniform(30, 700)
+        if rng.random() < 0.7:
+            ops.append(f"{x:.1f} {y:.1f} m {x + rng.uniform(-80, 80):.1f} {y + rng.uniform(-80, 80):.1f} l S")
+        else:
+            ops.append(f"{x:.1f} {y:.1f} {rng.uniform(5, 60):.1f} {rng.uniform(5, 60):.1f} re S")
+    return "\n".join(ops)
+
+
+def synthetic_project_pdf(pages=40, seed=2025, drawing_ops=600, text_pages=3, cover_note=None):
+    """Projekt: kilka stron opisu z danymi, reszta to rysunki z podpisami
+
+    cover_note: dodatkowa linia na pierwszej stronie - ten sam projekt gotowy
+    wydany innemu klientowi (pozostałe strony bez zmian)
+    """
+    rng = random.Random(seed)
+    area = rng.randint(90, 260)
+    values = {
+        'area': area, 'footprint': int(area * 0.7), 'volume': int(area * 2.8),
+        'eu': rng.randint(35, 110), 'ep': rng.randint(50, 140),
+        'city': rng.choice(['Krakow', 'Poznan', 'Gdansk', 'Lublin', 'Bialystok']),
+        'plot': rng.randint(1, 999), 'temp': rng.choice([-16, -18, -20, -22, -24]),
+        'power': round(area * 0.05, 1)
+    }
+
+    streams = []
+    for number in range(pages):
+        if number < text_pages:
+            lines = [line.format(**values) for line in _PROJECT_LINES]
+            if number == 0 and cover_note:
+                lines.insert(1, cover_note)
+            streams.append(_page_stream(rng, lines, drawing_ops // 10))
+        else:
+            lines = [rng.choice(_FILLER), f"Arkusz {number + 1}"]
+            streams.append(_page_stream(rng, lines, drawing_ops))
+
+    return _pdf_document(streams)
+
+
+def _pdf_document(streams):
+    """Surowy PDF 1.4: jedna strona na strumień treści, wspólny font Helvetica"""
+    pages = len(streams)
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>"]
+    font_id = 3 + 2 * pages
+    kids = " ".join(f"{3 + 2 * i} 0 R" for i in range(pages))
+    objects.append(f"<< /Type /Pages /Kids [{kids}] /Count {pages} >>")
+    for i, stream in enumerate(streams):
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Contents {4 + 2 * i} 0 R"
+                       f" /Resources << /Font << /F1 {font_id} 0 R >> >> >>")
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+    objects.append("<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n{body}\nendobj\n".encode('latin-1')
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    out += b"".join(f"{offset:010d} 00000 n \n".encode() for offset in offsets)
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return bytes(out)
+
+
+def text_pdf(pdf_text):
+    """PDF z tekstem w formacie extract_text_from_pdf - strona po stronie, linia po linii"""
+    rng = random.Random(0)
+    return _pdf_document([_page_stream(rng, text.split('\n'), 0) for _, text in split_pages(pdf_text)])
+
+
+def synthetic_scanned_pdf(pages=20, seed=2025, image_kb=400):
+    """Skan: każda strona to jeden obraz, brak fontów i warstwy tekstowej"""
+    rng = random.Random(seed)
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>"]
+    kids = " ".join(f"{3 + 3 * i} 0 R" for i in range(pages))
+    objects.append(f"<< /Type /Pages /Kids [{kids}] /Count {pages} >>")
+    bodies = []
+    for i in range(pages):
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Contents {4 + 3 * i} 0 R"
+                       f" /Resources << /XObject << /Im0 {5 + 3 * i} 0 R >> >> >>")
+        objects.append("<< /Length 31 >>\nstream\nq 595 0 0 842 0 0 cm /Im0 Do Q\nendstream")
+        image = rng.randbytes(image_kb * 1024)
+        objects.append(None)
+        bodies.append(image)
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    images = iter(bodies)
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        if body is None:
+            image = next(images)
+            out += (f"{number} 0 obj\n<< /Type /XObject /Subtype /Image /Width 1240 /Height 1754"
+                    f" /ColorSpace /DeviceGray /BitsPerComponent 8 /Filter /DCTDecode /Length {len(image)} >>"
+                    f"\nstream\n").encode('latin-1')
+            out += image + b"\nendstream\nendobj\n"
+        else:
+            out += f"{number} 0 obj\n{body}\nendobj\n".encode('latin-1')
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    out += b"".join(f"{offset:010d} 00000 n \n".encode() for offset in offsets)
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return bytes(out)
+
+
+_DESCRIPTION_SENTENCES = [
+    "Fundamenty zaprojektowano jako lawy zelbetowe z betonu C20/25 zbrojone stala B500SP.",
+    "Sciany nosne wykonac z bloczkow silikatowych grubosci 18 cm na zaprawie cienkowarstwowej.",
+    "Strop gestozebrowy typu Teriva, wysokosc konstrukcyjna 24 cm, wieniec obwodowy zelbetowy.",
+    "Wiezba dachowa drewniana, krokwie 8x20 cm w rozstawie co 90 cm, drewno klasy C24.",
+    "Instalacja elektryczna: moc przylaczeniowa {elec} kW, zabezpieczenie przedlicznikowe 25 A.",
+    "Odprowadzenie wod opadowych do gruntu na terenie dzialki, rynny PCV fi 125 mm.",
+    "Posadzki na gruncie: plyta betonowa 10 cm, izolacja przeciwwilgociowa z folii PE.",
+    "Schody wewnetrzne zelbetowe plytowe, wykonczenie okladzina z drewna debowego.",
+    "Tynki wewnetrzne gipsowe maszynowe kat. III, w lazienkach tynki cementowo-wapienne.",
+    "Stolarka drzwiowa wewnetrzna plytowa, drzwi zewnetrzne stalowe ocieplane.",
+    "Ochrona przeciwpozarowa: budynek zaliczony do kategorii ZL IV, klasa odpornosci D.",
+    "Zaopatrzenie w wode z sieci wodociagowej, przylacze PE fi 40 mm o dlugosci {pipe} m.",
+    "Kanalizacja sanitarna grawitacyjna do sieci gminnej, studnia rewizyjna fi 425 mm.",
+]
+
+_ROOMS = ["Wiatrolap", "Hol", "Salon", "Kuchnia", "Spizarnia", "Lazienka", "Sypialnia",
+          "Gabinet", "Garderoba", "Kotlownia", "Garaz", "Pokoj"]
+
+
+def synthetic_project_text(seed, pages=24):
+    """Tekst projektu w formacie extract_text_from_pdf; charakterystyka energetyczna na końcu"""
+    rng = random.Random(seed)
+    area = round(rng.uniform(90, 260), 1)
+    eu = round(rng.uniform(35, 110), 1)
+    truth = {
+        'powierzchnia_uzytkowa': f"{area:.1f}".replace('.', ','),
+        'wskaznik_eu': f"{eu:.1f}".replace('.', ','),
+        'zapotrzebowanie_cieplo': str(int(area * eu)),
+        'moc_grzewcza': f"{area * 0.055:.1f}".replace('.', ','),
+        'temperatura_projektowa': str(rng.choice([-16, -18, -20, -22, -24]))
+    }
+
+    texts = [
+        "PROJEKT ARCHITEKTONICZNO-BUDOWLANY\nBudynek mieszkalny jednorodzinny\n"
+        f"Lokalizacja: {rng.choice(['Krakow', 'Poznan', 'Lublin', 'Olsztyn'])}, dzialka nr {rng.randint(1, 999)}\n"
+        "Inwestor: osoba prywatna\nBranza: architektura"
+    ]
+    certificate_at = pages - rng.randint(2, 4)
+    for number in range(1, pages):
+        if number == certificate_at:
+            texts.append("\n".join([
+                "CHARAKTERYSTYKA ENERGETYCZNA BUDYNKU",
+                f"Powierzchnia uzytkowa ogrzewana Af = {truth['powierzchnia_uzytkowa']} m2",
+                f"Wskaznik rocznego zapotrzebowania na energie uzytkowa EU = {truth['wskaznik_eu']} kWh/(m2 rok)",
+                f"Wskaznik EP = {rng.randint(50, 140)} kWh/(m2 rok)",
+                f"Zapotrzebowanie na cieplo do ogrzewania: {truth['zapotrzebowanie_cieplo']} kWh/rok",
+                f"Projektowe obciazenie cieplne budynku: {truth['moc_grzewcza']} kW",
+                f"Projektowa temperatura zewnetrzna: {truth['temperatura_projektowa']} C, strefa klimatyczna III",
+                "Wspolczynnik przenikania ciepla scian U = 0,20 W/(m2 K)",
+            ]))
+        elif number % 5 == 2:
+            rows = [f"{i + 1}. {rng.choice(_ROOMS)} {rng.uniform(3, 35):.2f} m2 posadzka {rng.choice(['panele', 'plytki'])}"
+                    for i in range(rng.randint(10, 18))]
+            texts.append("ZESTAWIENIE POMIESZCZEN\n" + "\n".join(rows))
+        elif number > certificate_at:
+            texts.append(f"Rysunek: {rng.choice(['Rzut dachu', 'Elewacja wschodnia', 'Przekroj B-B'])}\nskala 1:100")
+        else:
+            sentences = [rng.choice(_DESCRIPTION_SENTENCES).format(elec=rng.randint(11, 22), pipe=rng.randint(8, 40))
+                         for _ in range(rng.randint(18, 30))]
+            texts.append("OPIS TECHNICZNY\n" + "\n".join(sentences))
+
+    pdf_text = "".join(f"\n--- Strona {i + 1} ---\n{text}\n" for i, text in enumerate(texts))
+    return pdf_text, truth
+
+
+def bench_rank(args):
+    """Trafienie pól w tekście dla LLM: ucięcie do budżetu vs wybór stron wg istotności"""
+    hits = {'truncate': 0, 'ranked': 0}
+    chars = {'truncate': [], 'ranked': []}
+    quality = {'truncate': 0, 'ranked': 0}
+    latencies = []
+    fields_total = 0
+
+    for seed in range(args.projects):
+        pdf_text, truth = synthetic_project_text(seed, pages=args.pages)
+        started = time.perf_counter()
+        ranked, _ = select_relevant_text(pdf_text, args.budget)
+        latencies.append(time.perf_counter() - started)
+        candidates = {'truncate': pdf_text[:args.budget], 'ranked': ranked}
+
+        fields_total += len(truth)
+        for name, text in candidates.items():
+            found = sum(1 for value in truth.values() if value in text)
+            hits[name] += found
+            chars[name].append(len(text))
+            # Wystarczy do calculate_heating_requirements: moc albo powierzchnia + EU
+            if truth['moc_grzewcza'] in text or (truth['powierzchnia_uzytkowa'] in text
+                                                 and truth['wskaznik_eu'] in text):
+                quality[name] += 1
+
+    sizes = [len(synthetic_project_text(seed, pages=args.pages)[0]) for seed in range(min(args.projects, 20))]
+    print(f"{args.projects} synthetic projects x {args.pages} pages "
+          f"(~{statistics.mean(sizes) / 1000:.0f}k chars each), budget {args.budget} chars")
+    for name in ('truncate', 'ranked'):
+        print(f"{name:<10} field hit rate={hits[name] / fields_total:6.1%}  "
+              f"enough for sizing={quality[name] / args.projects:6.1%}  "
+              f"chars sent={statistics.mean(chars[name]):7.0f} (~{statistics.mean(chars[name]) / 4:.0f} tokens)")
+    latencies.sort()
+    print(f"ranking latency p50={latencies[len(latencies) // 2] * 1000:.2f} ms  "
+          f"p95={latencies[int(len(latencies) * 0.95) - 1] * 1000:.2f} ms")
+
+
+# Różne zapisy tych samych wartości spotykane w projektach (wartości w jednostkach found_data)
+_AREA_FORMS = [
+    "Powierzchnia użytkowa: {v} m²",
+    "Powierzchnia uzytkowa ogrzewana Af = {v} m2",
+    "Pow. użytk. {v} m2",
+    "Powierzchnia użytkowa budynku wynosi {v} m^2",
+]
+_EU_FORMS = [
+    "Wskaźnik EU = {v} kWh/(m²·rok)",
+    "Wskaznik rocznego zapotrzebowania na energie uzytkowa EU = {v} kWh/(m2 rok)",
+    "EU [kWh/(m2·rok)]: {v}",
+    "Zapotrzebowanie na energię użytkową {v} kWh/m2a",
+]
+_DEMAND_FORMS = [
+    ("Zapotrzebowanie na ciepło: {v} kWh/rok", 1.0),
+    ("Zapotrzebowanie na energię do ogrzewania {v} MWh/rok", 0.001),
+    ("Zapotrzebowanie na ciepło Q = {v} GJ/rok", 0.0036),
+]
+_POWER_FORMS = [
+    ("Projektowe obciążenie cieplne budynku: {v} kW", 1.0),
+    ("Moc grzewcza instalacji {v} kW", 1.0),
+    ("Projektowa moc cieplna: {v} W", 1000.0),
+    ("Φ HL = {v} kW", 1.0),
+]
+_TEMP_FORMS = [
+    "Projektowa temperatura zewnętrzna: {v} °C",
+    "Temperatura obliczeniowa zewnętrzna θe = {v}°C",
+    "θe = {v} C",
+]
+
+# Zapisy z liczbą, która nie jest wartością pola: (tekst, pole, oczekiwana wartość)
+_TRICKY_FORMS = [
+    ("Powierzchnia użytkowa wg PN-ISO 9836:1997 wynosi 145,2 m2", 'powierzchnia_uzytkowa', 145.2),
+    ("Powierzchnia użytkowa mieszkania nr 14 – 62 m2", 'powierzchnia_uzytkowa', 62.0),
+    ("Wskaźnik EU dla budynku referencyjnego wg WT 2021: 70; EU = 55 kWh/(m2·rok)", 'wskaznik_eu', 55.0),
+    ("Powierzchnia użytkowa: 120\nPowierzchnia zabudowy: 95 m2", 'powierzchnia_uzytkowa', 120.0),
+    ("Wskaźnik EU: 85 kWh/(m2·rok), EP 140 kWh/(m2·rok)", 'wskaznik_eu', 85.0),
+]
+# Same liczby bez jednostek - podpowiedź dla LLM, nie powód do pominięcia wywołania
+_BARE_ONLY = "Powierzchnia użytkowa 150\nWskaźnik EU 60\nProjektowa temperatura zewnętrzna -20"
+
+
+def _pl(value, decimals):
+    return f"{value:.{decimals}f}".replace('.', ',')
+
+
+def synthetic_rule_project(seed, pages=8):
+    """Projekt z losowym zapisem wartości; część projektów bez charakterystyki energetycznej"""
+    rng = random.Random(seed)
+    truth = dict.fromkeys(('powierzchnia_uzytkowa', 'wskaznik_eu', 'zapotrzebowanie_cieplo',
+                           'moc_grzewcza', 'temperatura_projektowa'))
+    lines = []
+    variant = rng.random()
+    if variant < 0.55 or variant >= 0.85:
+        truth['powierzchnia_uzytkowa'] = round(rng.uniform(90, 260), 1)
+        lines.append(rng.choice(_AREA_FORMS).format(v=_pl(truth['powierzchnia_uzytkowa'], 1)))
+    if variant < 0.55:
+        truth['wskaznik_eu'] = round(rng.uniform(35, 110), 1)
+        lines.append(rng.choice(_EU_FORMS).format(v=_pl(truth['wskaznik_eu'], 1)))
+        demand = round(truth['powierzchnia_uzytkowa'] * truth['wskaznik_eu'])
+        form, factor = rng.choice(_DEMAND_FORMS)
+        truth['zapotrzebowanie_cieplo'] = demand
+        lines.append(form.format(v=_pl(demand * factor, 2 if factor < 1 else 0)))
+    if variant < 0.3 or 0.55 <= variant < 0.7:
+        power = round(rng.uniform(4, 14), 1)
+        form, factor = rng.choice(_POWER_FORMS)
+        truth['moc_grzewcza'] = power
+        lines.append(form.format(v=_pl(power * factor, 0 if factor > 1 else 1)))
+    if rng.random() < 0.7:
+        truth['temperatura_projektowa'] = rng.choice([-16, -18, -20, -22, -24])
+        lines.append(rng.choice(_TEMP_FORMS).format(v=f"−{-truth['temperatura_projektowa']}"
+                                                    if rng.random() < 0.3 else truth['temperatura_projektowa']))
+
+    texts = [
+        "PROJEKT ARCHITEKTONICZNO-BUDOWLANY\nBudynek mieszkalny jednorodzinny\n"
+        f"Lokalizacja: {rng.choice(['Kraków', 'Poznań', 'Lublin', 'Olsztyn'])}, działka nr {rng.randint(1, 999)}"
+    ]
+    for number in range(1, pages):
+        if number == pages - 2 and lines:
+            texts.append("CHARAKTERYSTYKA ENERGETYCZNA BUDYNKU\n" + "\n".join(lines))
+        elif number % 3 == 1:
+            rows = [f"{i + 1}. {rng.choice(_ROOMS)} {_pl(rng.uniform(3, 35), 2)} m2"
+                    for i in range(rng.randint(8, 14))]
+            texts.append("ZESTAWIENIE POMIESZCZEN\n" + "\n".join(rows))
+        else:
+            sentences = [rng.choice(_DESCRIPTION_SENTENCES).format(elec=rng.randint(11, 22), pipe=rng.randint(8, 40))
+                         for _ in range(rng.randint(10, 20))]
+            texts.append("OPIS TECHNICZNY\n" + "\n".join(sentences))
+
+    pdf_text = "".join(f"\n--- Strona {i + 1} ---\n{text}\n" for i, text in enumerate(texts))
+    return pdf_text, truth
+
+
+def bench_rules(args):
+    """Odczyt regułami: odsetek analiz bez LLM, poprawność wartości i zaoszczędzony czas"""
+    skipped = 0
+    correct = wrong = missed = 0
+    latencies = []
+    total_with_rules = total_llm_only = 0.0
+
+    for seed in range(args.projects):
+        pdf_text, truth = synthetic_rule_project(seed, pages=args.pages)
+        started = time.perf_counter()
+        confirmed = set()
+        found = extract_fields(pdf_text, confirmed)
+        sufficient = is_sufficient(found, confirmed)
+        elapsed = time.perf_counter() - started
+        latencies.append(elapsed)
+
+        skipped += sufficient
+        total_with_rules += elapsed + (0 if sufficient else args.llm_latency)
+        total_llm_only += args.llm_latency
+
+        for field, expected in truth.items():
+            value = found.get(field)
+            if expected is None:
+                wrong += value is not None  # wartość wymyślona przez reguły
+            elif value is None:
+                missed += 1
+            elif abs(value - expected) <= max(0.011, abs(expected) * 0.005):
+                correct += 1
+            else:
+                wrong += 1
+                if args.verbose:
+                    print(f"seed {seed}: {field} expected {expected}, got {value}")
+
+    latencies.sort()
+    print(f"{args.projects} synthetic projects, {len(_AREA_FORMS) + len(_EU_FORMS) + len(_DEMAND_FORMS)}"
+          f"+{len(_POWER_FORMS) + len(_TEMP_FORMS)} value phrasings, simulated LLM call {args.llm_latency:.1f} s")
+    print(f"LLM skipped: {skipped}/{args.projects} ({skipped / args.projects:.1%})")
+    print(f"values: correct={correct} missed={missed} wrong={wrong} "
+          f"(precision {correct / max(1, correct + wrong):.1%})")
+    print(f"rule latency p50={latencies[len(latencies) // 2] * 1000:.2f} ms  "
+          f"p95={latencies[int(len(latencies) * 0.95) - 1] * 1000:.2f} ms")
+    print(f"mean analysis time: LLM only {total_llm_only / args.projects:.2f} s -> "
+          f"rules first {total_with_rules / args.projects:.2f} s "
+          f"(saved {1 - total_with_rules / total_llm_only:.1%})")
+
+    tricky = 0
+    for text, field, expected in _TRICKY_FORMS:
+        value = extract_fields(text)[field]
+        tricky += value == expected
+        if value != expected:
+            print(f"  {text!r}: {field} expected {expected}, got {value}")
+    confirmed = set()
+    bare = extract_fields(_BARE_ONLY, confirmed)
+    print(f"tricky phrasings read correctly: {tricky}/{len(_TRICKY_FORMS)}; "
+          f"bare numbers only -> LLM skipped: {is_sufficient(bare, confirmed)} "
+          f"(values {bare['powierzchnia_uzytkowa']}, {bare['wskaznik_eu']} passed to the LLM as hints)")
+
+
+def _rss_kb():
+    """(VmRSS, VmHWM) bieżącego procesu w KiB"""
+    values = {}
+    with open('/proc/self/status') as status:
+        for line in status:
+            if line.startswith(('VmRSS:', 'VmHWM:')):
+                values[line.split(':')[0]] = int(line.split()[1])
+    return values['VmRSS'], values['VmHWM']
+
+
+def _memory_child(args):
+    """Jedna ścieżka w świeżym procesie: wynik, czas i przyrost szczytowego RSS"""
+    baseline, _ = _rss_kb()
+    started = time.perf_counter()
+    outcome = 'ok'
+    with open(args.file, 'rb') as upload_stream:
+        if args.child == 'legacy':
+            # Dotychczas: cały plik w pamięci, hash, pełne parsowanie, ekstrakcja
+            data = upload_stream.read()
+            hashlib.sha256(data).hexdigest()
+            try:
+                pages = extract_pages_sequential(PdfReader(BytesIO(data)))
+                if not any(text and text.strip() for _, text, _ in pages):
+                    outcome = 'insufficient_text'
+            except Exception:
+                outcome = 'parse_error'
+        else:
+            try:
+                with spool_upload(upload_stream, args.max_bytes) as upload:
+                    inspect_pdf(upload, args.max_pages)
+                    pages = extract_pages_sequential(PdfReader(upload.stream()))
+                    upload.release_pages()
+            except UploadRejected as e:
+                outcome = e.error_type
+    elapsed = time.perf_counter() - started
+    _, peak = _rss_kb()
+    print(json.dumps({'seconds': elapsed, 'peak_kb': peak - baseline, 'outcome': outcome}))
+
+
+def bench_memory(args):
+    """Szczytowy RSS i czas odrzucenia: plik w pamięci vs zapis na dysk + mmap + kontrola struktury"""
+    documents = {
+        'project': synthetic_project_pdf(args.pages, drawing_ops=args.drawing_ops),
+        'scanned': synthetic_scanned_pdf(args.scan_pages),
+        'too_many_pages': synthetic_project_pdf(args.max_pages + 50, drawing_ops=10),
+        'not_pdf': random.Random(1).randbytes(8 * 1024 * 1024),
+    }
+    print(f"max_bytes={args.max_bytes // (1024 * 1024)} MiB  max_pages={args.max_pages}")
+    with tempfile.TemporaryDirectory() as directory:
+        for name, data in documents.items():
+            path = os.path.join(directory, f"{name}.pdf")
+            with open(path, 'wb') as out:
+                out.write(data)
+            row = []
+            for mode in ('legacy', 'spooled'):
+                output = subprocess.run(
+                    [sys.executable, __file__, 'memory', '--child', mode, '--file', path,
+                     '--max-bytes', str(args.max_bytes), '--max-pages', str(args.max_pages)],
+                    capture_output=True, text=True, check=True).stdout
+                result = json.loads(output.strip().splitlines()[-1])
+                row.append(f"{mode}: {result['outcome']:<17} {result['seconds'] * 1000:8.1f} ms  "
+                           f"peak +{result['peak_kb'] / 1024:6.1f} MiB")
+            print(f"{name:<15} {len(data) / (1024 * 1024):5.1f} MiB | " + " | ".join(row))
+
+
+class _FakeStream:
+    """Strumień tokenów w tempie modelu (zegar względny, bez dryfu usypiania)"""
+
+    def __init__(self, tokens, ttft, tokens_per_second, scale, usage=None):
+        self.tokens = tokens
+        self.usage = usage
+        self.ttft = ttft
+        self.rate = tokens_per_second
+        self.scale = scale
+        self.generated = 0
+
+    def __iter__(self):
+        started = time.monotonic()
+        for index, token in enumerate(self.tokens):
+            delay = started + (self.ttft + index / self.rate) * self.scale - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            self.generated += 1
+            last = index == len(self.tokens) - 1
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=token))],
+                                  usage=self.usage if last else None)
+
+    def close(self):
+        pass
+
+
+class _FakeGroq:
+    """Model w stylu Groq: bez JSON mode część odpowiedzi ma komentarz i ``` wokół obiektu"""
+
+    def __init__(self, args, seed):
+        self.args = args
+        self.rng = random.Random(seed)
+        self.streams = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def _response(self, json_mode):
+        pdf_text, truth = synthetic_project_text(self.rng.randint(0, 10 ** 6), pages=4)
+        analysis = {
+            "found_data": {
+                "powierzchnia_uzytkowa": float(truth['powierzchnia_uzytkowa'].replace(',', '.')),
+                "wskaznik_eu": float(truth['wskaznik_eu'].replace(',', '.')),
+                "lokalizacja": "Kraków",
+                "zapotrzebowanie_cieplo": int(truth['zapotrzebowanie_cieplo']),
+                "moc_grzewcza": float(truth['moc_grzewcza'].replace(',', '.')),
+                "temperatura_projektowa": int(truth['temperatura_projektowa']),
+                "rodzaj_budynku": "dom jednorodzinny",
+                "standard_energetyczny": "energooszczędny"
+            },
+            "analysis_summary": "Dom jednorodzinny, dane z charakterystyki energetycznej budynku.",
+            "data_quality": "good",
+            "recommended_calculation_method": "direct_power",
+            "confidence_level": 0.85,
+            "notes": "Moc grzewcza podana w projekcie; zalecana weryfikacja strefy klimatycznej."
+        }
+        text = json.dumps(analysis, ensure_ascii=False, indent=4)
+        if not json_mode and self.rng.random() < self.args.prose_rate:
+            text = (f"Oto analiza projektu w formacie JSON:\n```json\n{text}\n```\n\n"
+                    + "Uwagi: wartości odczytano z charakterystyki energetycznej budynku. " * 6)
+        return text
+
+    def create(self, stream=False, response_format=None, **request):
+        text = self._response(json_mode=response_format is not None)
+        tokens = [text[i:i + 4] for i in range(0, len(text), 4)]
+        fake = _FakeStream(tokens, self.args.ttft, self.args.tokens_per_second, self.args.scale)
+        self.streams.append(fake)
+        if stream:
+            return fake
+        for _ in fake:
+            pass
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=text))])
+
+
+def bench_stream(args):
+    """Czas do pierwszego pola i całkowity: pełna odpowiedź + json.loads vs strumień JSON mode"""
+    logging.disable(logging.ERROR)  # analizy zastępcze są liczone, nie logowane
+    os.environ.setdefault('PDF_CACHE_ENABLED', 'false')
+    os.environ.setdefault('PDF_EXTRACT_WORKERS', '1')
+    os.environ.setdefault('PDF_SANDBOX', 'false')
+    os.environ.setdefault('PDF_GROQ_RPM', '0')  # symulowany model bez limitów zapytań
+    import pdf_analyzer as analyzer_module
+    from llm_stream import parse_analysis
+
+    def legacy_parse(text):
+        # Dotychczas: json.loads całej odpowiedzi, komentarz wokół JSON = analiza zastępcza
+        try:
+            return json.loads(text.strip())
+        except ValueError:
+            return None
+
+    modes = [
+        ('before', False, False, legacy_parse),
+        ('json mode', False, True, parse_analysis),
+        ('stream', True, False, parse_analysis),
+        ('stream+json', True, True, parse_analysis),
+    ]
+    print(f"simulated model: first token {args.ttft:.2f} s, {args.tokens_per_second:.0f} tokens/s, "
+          f"{args.prose_rate:.0%} of non-JSON-mode answers wrapped in prose, {args.runs} runs per mode")
+    for name, stream, json_mode, parse in modes:
+        analyzer_module.parse_analysis = parse
+        analyzer = analyzer_module.PDFAIAnalyzer(api_key=None)
+        analyzer.client = _FakeGroq(args, seed=7)
+        analyzer._initialized = True
+        analyzer.stream_responses = stream
+        analyzer.json_mode = json_mode
+
+        first_fields, totals, fallbacks = [], [], 0
+        for _ in range(args.runs):
+            arrived = []
+            started = time.monotonic()
+            result = analyzer.analyze_construction_project(
+                "tekst projektu", on_field=lambda field, value: arrived.append(time.monotonic()))
+            total = (time.monotonic() - started) / args.scale
+            fallbacks += analyzer._is_fallback(result)
+            totals.append(total)
+            # Bez strumienia pierwsze pole jest znane dopiero po całej odpowiedzi
+            first_fields.append((arrived[0] - started) / args.scale if arrived else total)
+        generated = sum(fake.generated for fake in analyzer.client.streams)
+        print(f"{name:<12} first field p50={statistics.median(first_fields):5.2f} s  "
+              f"total mean={statistics.mean(totals):5.2f} s  fallbacks={fallbacks}/{args.runs}  "
+              f"tokens generated={generated / args.runs:5.0f}/run")
+    analyzer_module.parse_analysis = parse_analysis
+
+
+# Model: (czas do pierwszego tokenu s, prefill tokenów/s, generowanie tokenów/s, $/1M wejście, $/1M wyjście)
+_CASCADE_MODELS = {
+    'llama-3.1-8b-instant': (0.12, 20000, 750, 0.05, 0.08),
+    'llama-3.3-70b-versatile': (0.35, 6000, 250, 0.59, 0.79),
+}
+
+# Jakość odpowiedzi (poprawna, błędna wartość, brak danych) wg modelu i trudności dokumentu
+_CASCADE_BEHAVIOUR = {
+    ('llama-3.1-8b-instant', 'easy'): (0.92, 0.05),
+    ('llama-3.1-8b-instant', 'hard'): (0.55, 0.20),
+    ('llama-3.3-70b-versatile', 'easy'): (0.97, 0.03),
+    ('llama-3.3-70b-versatile', 'hard'): (0.97, 0.03),
+}
+
+
+class _CascadeFakeGroq:
+    """Modele 8B i 70B: tempo, koszt i trafność zależne od modelu i trudności dokumentu"""
+
+    def __init__(self, scale):
+        self.scale = scale
+        self.document = None
+        self.spend = 0.0
+        self.tokens = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, model, messages, stream=False, response_format=None, **request):
+        seed, difficulty, truth = self.document
+        ttft, prefill, rate, price_in, price_out = _CASCADE_MODELS[model]
+        correct, wrong = _CASCADE_BEHAVIOUR[(model, difficulty)]
+        rng = random.Random(f"{seed}:{model}")  # ta sama odpowiedź w każdej konfiguracji
+
+        found = dict(truth)
+        roll = rng.random()
+        if roll < correct:
+            confidence, quality = rng.uniform(0.8, 0.95), 'good'
+        elif roll < correct + wrong:
+            found['moc_grzewcza'] = round(truth['moc_grzewcza'] * rng.choice([0.6, 1.4, 1.8]), 1)
+            confidence, quality = rng.uniform(0.5, 0.85), 'good'
+        else:
+            found['moc_grzewcza'] = found['wskaznik_eu'] = None
+            confidence, quality = rng.uniform(0.4, 0.7), 'partial'
+        text = json.dumps({
+            "found_data": found,
+            "analysis_summary": "Dom jednorodzinny, dane z charakterystyki energetycznej.",
+            "data_quality": quality,
+            "recommended_calculation_method": "direct_power" if found['moc_grzewcza'] else "zordon_formula",
+            "confidence_level": round(confidence, 2),
+            "notes": ""
+        }, ensure_ascii=False, indent=2)
+
+        prompt_tokens = sum(len(message['content']) for message in messages) // 4
+        tokens = [text[i:i + 4] for i in range(0, len(text), 4)]
+        fake = _FakeStream(tokens, ttft + prompt_tokens / prefill, rate, self.scale)
+        self.tokens += prompt_tokens + len(tokens)
+        self.spend += (prompt_tokens * price_in + len(tokens) * price_out) / 1e6
+        if stream:
+            return fake
+        for _ in fake:
+            pass
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=text))])
+
+
+def _cascade_document(seed):
+    """(tekst, trudność, prawdziwe found_data): sama charakterystyka albo pełny projekt"""
+    pdf_text, truth = synthetic_project_text(seed, pages=24)
+    values = {
+        'powierzchnia_uzytkowa': float(truth['powierzchnia_uzytkowa'].replace(',', '.')),
+        'wskaznik_eu': float(truth['wskaznik_eu'].replace(',', '.')),
+        'lokalizacja': 'Kraków',
+        'zapotrzebowanie_cieplo': int(truth['zapotrzebowanie_cieplo']),
+        'moc_grzewcza': float(truth['moc_grzewcza'].replace(',', '.')),
+        'temperatura_projektowa': int(truth['temperatura_projektowa']),
+        'rodzaj_budynku': 'dom jednorodzinny',
+        'standard_energetyczny': None
+    }
+    if random.Random(seed).random() < 0.5:
+        certificate = next(page for page in pdf_text.split('\n--- Strona ') if 'CHARAKTERYSTYKA' in page)
+        return f"\n--- Strona {certificate}", 'easy', values
+    return pdf_text, 'hard', values
+
+
+def bench_cascade(args):
+    """Tylko 70B vs kaskada 8B -> 70B: mediana czasu, tokeny, koszt i trafność mocy"""
+    logging.disable(logging.WARNING)
+    os.environ.setdefault('PDF_CACHE_ENABLED', 'false')
+    os.environ.setdefault('PDF_EXTRACT_WORKERS', '1')
+    os.environ.setdefault('PDF_SANDBOX', 'false')
+    os.environ.setdefault('PDF_GROQ_RPM', '0')  # symulowany model bez limitów zapytań
+    import pdf_analyzer as analyzer_module
+
+    documents = [_cascade_document(seed) for seed in range(args.documents)]
+    easy = sum(1 for _, difficulty, _ in documents if difficulty == 'easy')
+    print(f"{args.documents} documents ({easy} single-page certificates, {args.documents - easy} full projects), "
+          f"correct = calculated power within 3% of the project value")
+
+    configs = [(False, '70B only', '', 0.8)] + [(False, f"cascade >={threshold}", 'llama-3.1-8b-instant', threshold)
+                                                 for threshold in args.thresholds]
+    # Długie projekty we fragmentach (PDF_MAP_REDUCE) - osobno, bo każdy fragment to osobne wywołanie
+    configs += [(True, 'map-reduce 70B', '', 0.8), (True, 'map-reduce casc.', 'llama-3.1-8b-instant', 0.8)]
+    for map_reduce, name, cascade, threshold in configs:
+        if map_reduce and name == configs[len(configs) - 2][1]:
+            print("map-reduce on (full projects split into chunks):")
+        os.environ['PDF_MODEL_CASCADE'] = cascade
+        analyzer = analyzer_module.PDFAIAnalyzer(api_key=None)
+        analyzer.cascade_min_confidence = threshold
+        analyzer.map_reduce = map_reduce
+        analyzer.client = _CascadeFakeGroq(args.scale)
+        analyzer._initialized = True
+
+        latencies, correct, escalated = [], 0, 0
+        for seed, (pdf_text, difficulty, truth) in enumerate(documents):
+            analyzer.client.document = (seed, difficulty, truth)
+            before = sum(tier['escalated'] for tier in analyzer.extraction_stats()['tiers'].values())
+            started, cpu_started = time.monotonic(), time.process_time()
+            analysis = analyzer.analyze_construction_project(pdf_text)
+            # Czas modelu (uśpienie) w skali symulacji, praca CPU (ranking stron, parser) bez skalowania
+            cpu = time.process_time() - cpu_started
+            latencies.append(max(0.0, time.monotonic() - started - cpu) / args.scale + cpu)
+            power = analyzer.calculate_heating_requirements(analysis).get('calculated_power')
+            correct += bool(power) and abs(power - truth['moc_grzewcza']) <= truth['moc_grzewcza'] * 0.03
+            # Dokument eskalowany raz, niezależnie od liczby fragmentów
+            escalated += sum(tier['escalated'] for tier in analyzer.extraction_stats()['tiers'].values()) > before
+
+        tiers = analyzer.extraction_stats()['tiers']
+        large = tiers.get('llama-3.3-70b-versatile', {}).get('tokens', 0)
+        latencies.sort()
+        print(f"{name:<16} latency p50={statistics.median(latencies):5.2f} s  "
+              f"p90={latencies[int(len(latencies) * 0.9) - 1]:5.2f} s  "
+              f"tokens/doc={analyzer.client.tokens / args.documents:6.0f} (70B {large / args.documents:5.0f})  "
+              f"cost/1000 docs=${analyzer.client.spend / args.documents * 1000:5.2f}  "
+              f"escalated={escalated / args.documents:5.1%}  correct={correct / args.documents:6.1%}")
+
+
+class _LimitedFakeGroq:
+    """Groq z limitami RPM/TPM w oknie minutowym: 429 z Retry-After, rzadkie 503"""
+
+    def __init__(self, args):
+        self.args = args
+        self.minute = 60 * args.scale
+        self.lock = threading.Lock()
+        self.window_start = time.monotonic()
+        self.requests = self.tokens = 0
+        self.rate_limited = self.server_errors = self.accepted = 0
+        self.rng = random.Random(11)
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def _error(self, error_class, status, message, retry_after=None):
+        import httpx
+        headers = {'retry-after': f"{retry_after:.3f}"} if retry_after is not None else {}
+        response = httpx.Response(status, headers=headers,
+                                  request=httpx.Request('POST', 'https://api.groq.com/openai/v1/chat/completions'))
+        return error_class(message, response=response, body=None)
+
+    def create(self, model, messages, stream=False, response_format=None, **request):
+        import groq
+        prompt_tokens = sum(len(message['content']) for message in messages) // 4
+        text = json.dumps({
+            "found_data": {"powierzchnia_uzytkowa": 142.5, "wskaznik_eu": 68.0, "moc_grzewcza": 7.2},
+            "analysis_summary": "Dom jednorodzinny.",
+            "data_quality": "good",
+            "recommended_calculation_method": "direct_power",
+            "confidence_level": 0.9,
+            "notes": ""
+        }, ensure_ascii=False, indent=2)
+        chunks = [text[i:i + 4] for i in range(0, len(text), 4)]
+        with self.lock:
+            now = time.monotonic()
+            if now - self.window_start >= self.minute:
+                self.window_start, self.requests, self.tokens = now, 0, 0
+            if (self.requests + 1 > self.args.rpm or
+                    self.tokens + prompt_tokens + len(chunks) > self.args.tpm):
+                self.rate_limited += 1
+                raise self._error(groq.RateLimitError, 429, "Rate limit reached",
+                                  retry_after=self.window_start + self.minute - now)
+            if self.rng.random() < self.args.error_rate:
+                self.server_errors += 1
+                raise self._error(groq.InternalServerError, 503, "Service unavailable")
+            self.requests += 1
+            self.tokens += prompt_tokens + len(chunks)
+            self.accepted += 1
+        fake = _FakeStream(chunks, 0.3 + prompt_tokens / 6000, 250, self.args.scale,
+                           usage=SimpleNamespace(total_tokens=prompt_tokens + len(chunks)))
+        if stream:
+            return fake
+        for _ in fake:
+            pass
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=text))])
+
+
+def bench_ratelimit(args):
+    """Równoległe analizy przy limitach Groq: bez ponowień, same ponowienia, limiter + ponowienia"""
+    logging.disable(logging.ERROR)
+    os.environ.setdefault('PDF_CACHE_ENABLED', 'false')
+    os.environ.setdefault('PDF_EXTRACT_WORKERS', '1')
+    os.environ.setdefault('PDF_SANDBOX', 'false')
+    os.environ['PDF_MODEL_CASCADE'] = ''
+    import pdf_analyzer as analyzer_module
+
+    texts = [synthetic_project_text(seed, pages=8)[0] for seed in range(args.documents)]
+    print(f"{args.documents} documents, {args.threads} threads, server limits {args.rpm} requests and "
+          f"{args.tpm} tokens per minute, {args.error_rate:.0%} transient 503 (times in model seconds)")
+
+    configs = [('no retries', 0, 0), ('retries only', 0, args.retries), ('limiter', args.rpm, args.retries)]
+    for name, limiter_rpm, retries in configs:
+        with tempfile.TemporaryDirectory() as tmp:
+            os.environ['PDF_GROQ_RPM'] = '0'
+            analyzer = analyzer_module.PDFAIAnalyzer(api_key=None)
+            if limiter_rpm:
+                # Minuta w skali symulacji - pojemność kubełków bez zmian
+                analyzer.limiter = TokenBucketLimiter(os.path.join(tmp, 'limiter.json'), limiter_rpm, args.tpm,
+                                                      max_concurrency=args.concurrency, period=60 * args.scale)
+            analyzer.client = _LimitedFakeGroq(args)
+            analyzer._initialized = True
+            analyzer.max_retries = retries
+            analyzer.queue_timeout = args.deadline * args.scale
+            analyzer.backoff_base = 0.5 * args.scale
+            analyzer.backoff_cap = 20 * args.scale
+
+            def analyze(text):
+                started = time.monotonic()
+                result = analyzer.analyze_construction_project(text)
+                return analyzer._is_fallback(result), (time.monotonic() - started) / args.scale
+
+            started = time.monotonic()
+            with ThreadPoolExecutor(args.threads) as pool:
+                results = list(pool.map(analyze, texts))
+            elapsed = (time.monotonic() - started) / args.scale
+
+        fallbacks = sum(failed for failed, _ in results)
+        latencies = sorted(latency for _, latency in results)
+        stats = analyzer.extraction_stats()
+        line = (f"{name:<13} fallbacks={fallbacks:3d}/{args.documents}  "
+                f"429 served={analyzer.client.rate_limited:3d}  retries={stats['llm_retries']:3d}  "
+                f"done/min={(args.documents - fallbacks) / elapsed * 60:5.1f}  "
+                f"latency p50={statistics.median(latencies):5.1f} s p95={latencies[int(len(latencies) * 0.95) - 1]:5.1f} s")
+        if analyzer.limiter:
+            limiter = analyzer.rate_limit_stats()
+            waits = limiter['wait_seconds']
+            line += (f"  queue wait p50={(waits['p50'] or 0) / args.scale:5.1f} s "
+                     f"p95={(waits['p95'] or 0) / args.scale:5.1f} s  max queue={limiter['max_queue_depth']}")
+        print(line)
+
+
+def _scattered_project_text(seed, pages):
+    """Długi projekt: każda wartość z charakterystyki na innej, losowej stronie opisu"""
+    pdf_text, truth = synthetic_project_text(seed, pages=pages)
+    rng = random.Random(seed)
+    texts = [text for _, text in split_pages(pdf_text)]
+    certificate = next(i for i, text in enumerate(texts) if text.startswith('CHARAKTERYSTYKA'))
+    lines = [line for line in texts[certificate].split('\n')[1:7] if not line.startswith('Wskaznik EP')]
+    texts[certificate] = "CHARAKTERYSTYKA ENERGETYCZNA BUDYNKU\nZalacznik - patrz opis techniczny."
+    descriptions = [i for i, text in enumerate(texts) if text.startswith('OPIS TECHNICZNY')]
+    for line, page in zip(lines, rng.sample(descriptions, len(lines))):
+        sentences = texts[page].split('\n')
+        sentences.insert(rng.randint(1, len(sentences)), line)
+        texts[page] = '\n'.join(sentences)
+    location = re.search(r'Lokalizacja: (\w+)', texts[0]).group(1)
+    pdf_text = "".join(f"\n--- Strona {i + 1} ---\n{text}\n" for i, text in enumerate(texts))
+    return pdf_text, dict(truth, lokalizacja=location)
+
+
+class _ReadingFakeGroq:
+    """Model, który znajduje tylko wartości obecne w przesłanym tekście (+ rzadkie pomyłki jednostek)"""
+
+    def __init__(self, args):
+        self.args = args
+        self.lock = threading.Lock()
+        self.tokens = 0
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, model, messages, stream=False, response_format=None, **request):
+        prompt = messages[-1]['content']
+        text = prompt.split('\n', 3)[-1].split('\nZADANIE:')[0]
+        found = extract_fields(text)
+        location = re.search(r'Lokalizacja: (\w+)', text)
+        found['lokalizacja'] = location.group(1) if location else None
+        rng = random.Random(hashlib.sha256(text.encode()).hexdigest())
+        if found['moc_grzewcza'] and rng.random() < self.args.unit_slip_rate:
+            found['moc_grzewcza'] = round(found['moc_grzewcza'] * 1000)  # W zamiast kW
+        known = sum(1 for value in found.values() if value is not None)
+        reply = json.dumps({
+            "found_data": found,
+            "analysis_summary": "Analiza projektu.",
+            "data_quality": "good" if is_sufficient(found) else ("partial" if known else "insufficient"),
+            "recommended_calculation_method": "direct_power" if found['moc_grzewcza'] else "zordon_formula",
+            "confidence_level": 0.9 if known >= 2 else (0.7 if known else 0.3),
+            "notes": ""
+        }, ensure_ascii=False, indent=2)
+        ttft, prefill, rate, _, _ = _CASCADE_MODELS['llama-3.3-70b-versatile']
+        prompt_tokens = sum(len(message['content']) for message in messages) // 4
+        chunks = [reply[i:i + 4] for i in range(0, len(reply), 4)]
+        with self.lock:
+            self.tokens += prompt_tokens + len(chunks)
+            self.calls += 1
+        fake = _FakeStream(chunks, ttft + prompt_tokens / prefill, rate, self.args.scale)
+        if stream:
+            return fake
+        for _ in fake:
+            pass
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=reply))])
+
+
+def bench_mapreduce(args):
+    """Długie projekty: jedno wywołanie na wybranych stronach vs fragmenty analizowane równolegle"""
+    logging.disable(logging.WARNING)
+    os.environ.setdefault('PDF_CACHE_ENABLED', 'false')
+    os.environ.setdefault('PDF_EXTRACT_WORKERS', '1')
+    os.environ.setdefault('PDF_SANDBOX', 'false')
+    os.environ['PDF_GROQ_RPM'] = '0'  # limiter tworzony niżej, w skali czasu symulacji
+    os.environ['PDF_MODEL_CASCADE'] = ''
+    import pdf_analyzer as analyzer_module
+
+    documents = [_scattered_project_text(seed, args.pages) for seed in range(args.documents)]
+    mean_length = statistics.mean(len(text) for text, _ in documents)
+    fields = ('powierzchnia_uzytkowa', 'wskaznik_eu', 'zapotrzebowanie_cieplo', 'moc_grzewcza',
+              'temperatura_projektowa', 'lokalizacja')
+    print(f"{args.documents} projects of {args.pages} pages ({mean_length / 1000:.0f}k characters), "
+          f"each value on a different page; recall over {len(fields)} fields")
+    print(f"limiter: {args.rpm:.0f} requests and {args.tpm:.0f} tokens per minute, queue timeout "
+          f"{args.deadline:.0f} s" if args.rpm else "limiter: off")
+    print(f"shipped default: PDF_MAP_REDUCE={os.environ.get('PDF_MAP_REDUCE', 'false')} (the single call row)")
+
+    configs = [('single call', False, 0)] + [(f"map-reduce <={chunks}", True, chunks) for chunks in args.max_chunks]
+    for name, map_reduce, max_chunks in configs:
+        analyzer = analyzer_module.PDFAIAnalyzer(api_key=None)
+        analyzer.client = _ReadingFakeGroq(args)
+        analyzer._initialized = True
+        analyzer.map_reduce = map_reduce
+        analyzer.map_max_chunks = max_chunks
+        analyzer.map_concurrency = args.concurrency or max_chunks
+        tmp = tempfile.mkdtemp()
+        if args.rpm:
+            # Minuta w skali symulacji - pojemność kubełków bez zmian
+            analyzer.limiter = TokenBucketLimiter(os.path.join(tmp, 'limiter.json'), args.rpm, args.tpm,
+                                                  max_concurrency=max(6, analyzer.map_concurrency),
+                                                  period=60 * args.scale)
+        analyzer.queue_timeout = args.deadline * args.scale
+
+        latencies, hits, fallbacks = [], 0, 0
+        for pdf_text, truth in documents:
+            started, cpu_started = time.monotonic(), time.process_time()
+            result = analyzer.analyze_construction_project(pdf_text)
+            fallbacks += analyzer._is_fallback(result)
+            found = result['found_data']
+            cpu = time.process_time() - cpu_started
+            latencies.append(max(0.0, time.monotonic() - started - cpu) / args.scale + cpu)
+            for field in fields:
+                expected = truth[field]
+                if field == 'lokalizacja':
+                    hits += found.get(field) == expected
+                elif found.get(field) is not None:
+                    hits += abs(float(found[field]) - float(expected.replace(',', '.'))) < 0.01
+        stats = analyzer.extraction_stats()
+        print(f"{name:<15} latency p50={statistics.median(latencies):5.2f} s  max={max(latencies):5.2f} s  "
+              f"calls/doc={analyzer.client.calls / args.documents:4.1f}  "
+              f"tokens/doc={analyzer.client.tokens / args.documents:6.0f}  "
+              f"recall={hits / (len(fields) * args.documents):6.1%}  "
+              f"unit fixes={stats['map_unit_corrections']}  conflicts={stats['map_conflicts']}")
+        if analyzer.limiter:
+            print(f"{'':<15} limiter timeouts={stats['llm_queue_timeouts']}  "
+                  f"chunks retried={stats['map_chunks_rate_limited']}  "
+                  f"single-call fallbacks={stats['map_budget_single_calls']}  "
+                  f"failed chunks={stats['map_chunks_failed']}  fallback analyses={fallbacks}")
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def bench_lazy(args):
+    """Ekstrakcja wszystkich stron + konkatenacja vs leniwy potok z wczesnym stopem i cache stron"""
+    logging.disable(logging.WARNING)
+    os.environ.setdefault('PDF_CACHE_ENABLED', 'false')
+    os.environ['PDF_EXTRACT_WORKERS'] = '1'
+    os.environ.setdefault('PDF_SANDBOX', 'false')  # ekstrakcja w procesie - izolację mierzy `sandbox`
+    import pdf_analyzer as analyzer_module
+    from rule_extractor import FieldDetector
+
+    first = synthetic_project_pdf(args.pages, drawing_ops=args.drawing_ops, cover_note="Egzemplarz dla: Klient A")
+    second = synthetic_project_pdf(args.pages, drawing_ops=args.drawing_ops, cover_note="Egzemplarz dla: Klient B")
+    print(f"synthetic project: {args.pages} pages, {len(first) / 1024:.0f} KiB, data on page 1; "
+          f"second upload = same template, different cover")
+
+    def legacy(pdf_bytes):
+        # Dotychczas: wszystkie strony, potem tekst sklejany przez +=
+        text_content = ""
+        for page_num, page_text, error in extract_pages_sequential(PdfReader(BytesIO(pdf_bytes))):
+            if not error and page_text.strip():
+                text_content += f"\n--- Strona {page_num + 1} ---\n{page_text}\n"
+        return text_content
+
+    def measure(run):
+        started = time.perf_counter()
+        text = run()
+        elapsed = time.perf_counter() - started
+        tracemalloc.start()
+        run()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return elapsed, peak, text
+
+    def analyzer(early_stop, page_cache):
+        os.environ['PDF_PAGE_CACHE_MAX_BYTES'] = str(32 * 1024 * 1024 if page_cache else 0)
+        instance = analyzer_module.PDFAIAnalyzer(api_key=None)
+        instance.client, instance._initialized = object(), True
+        instance.early_stop = early_stop
+        return instance
+
+    plain, stopping, cached = analyzer(False, False), analyzer(True, False), analyzer(False, True)
+    cached.extract_text_from_pdf(BytesIO(first))  # pierwszy klient: strony trafiają do cache
+    warm = cached.page_cache_stats()
+    legacy(first)  # rozgrzewka: importy i pierwsze parsowanie poza pomiarem
+
+    rows = [
+        ('before', lambda: legacy(second)),
+        ('lazy, all pages', lambda: plain.extract_text_from_pdf(BytesIO(second))),
+        ('early stop', lambda: stopping.extract_text_from_pdf(BytesIO(second), FieldDetector())),
+        ('page cache', lambda: cached.extract_text_from_pdf(BytesIO(second))),
+    ]
+    for name, run in rows:
+        elapsed, peak, text = measure(run)
+        pages = text.count('--- Strona ')
+        print(f"{name:<16} {elapsed * 1000:7.1f} ms  peak python memory={peak / 1024 / 1024:6.1f} MiB  "
+              f"pages in text={pages:4d}  characters={len(text):7d}")
+    stats = cached.page_cache_stats()
+    hits, misses = stats['hits'] - warm['hits'], stats['misses'] - warm['misses']
+    print(f"page cache on the second upload (timed + traced run): {hits} hits, {misses} misses")
+
+
+def _catalog_design(seed, pages):
+    """Projekt gotowy z katalogu: bez mocy i EU w tekście (charakterystyka jako skan) - reguły nie wystarczają"""
+    pdf_text, _ = synthetic_project_text(seed, pages=pages)
+    texts = [text for _, text in split_pages(pdf_text)]
+    for i, text in enumerate(texts):
+        texts[i] = "\n".join(line for line in text.split("\n")
+                             if not line.startswith(("Wskaznik rocznego", "Projektowe obciazenie")))
+    return texts
+
+
+def _client_copy(texts, rng, adapted_page=False):
+    """Egzemplarz dla klienta: inna strona tytułowa (inwestor, działka, data), opcjonalnie adaptacja jednej strony"""
+    texts = list(texts)
+    cover = [line for line in texts[0].split("\n") if not line.startswith(("Lokalizacja", "Inwestor"))]
+    cover[1:1] = [
+        f"Lokalizacja: {rng.choice(['Krakow', 'Poznan', 'Lublin', 'Olsztyn', 'Rzeszow', 'Opole'])}, "
+        f"dzialka nr {rng.randint(1, 999)}",
+        f"Inwestor: {rng.choice(['Jan', 'Anna', 'Piotr', 'Ewa'])} {rng.choice(['Nowak', 'Kowalski', 'Wisniewska'])}",
+        f"Egzemplarz nr {rng.randint(1, 9999)}, data wydania {rng.randint(1, 28)}.{rng.randint(1, 12):02d}.2025",
+    ]
+    texts[0] = "\n".join(cover)
+    if adapted_page:
+        page = rng.randrange(1, len(texts))
+        texts[page] += "\nADAPTACJA: zmiana usytuowania budynku na dzialce, bez zmian konstrukcyjnych"
+        if rng.random() < 0.5:
+            # Nowa wartość bez jednostki - reguły jej nie potwierdzą, analiza nie może być przejęta
+            texts[page] += f"\nPowierzchnia uzytkowa po adaptacji: {_pl(rng.uniform(90, 250), 1)}"
+    return "".join(f"\n--- Strona {i + 1} ---\n{text}\n" for i, text in enumerate(texts))
+
+
+def bench_neardup(args):
+    """Projekty gotowe od wielu klientów: każda analiza przez LLM vs ponowne użycie analizy niemal identycznego"""
+    logging.disable(logging.WARNING)
+    os.environ['PDF_CACHE_ENABLED'] = 'false'  # inne pliki - cache wg SHA-256 i tak nie trafia
+    os.environ.setdefault('PDF_EXTRACT_WORKERS', '1')
+    os.environ.setdefault('PDF_SANDBOX', 'false')
+    os.environ.setdefault('PDF_GROQ_RPM', '0')
+    os.environ['PDF_MODEL_CASCADE'] = ''
+    import pdf_analyzer as analyzer_module
+    from near_duplicates import NearDuplicateIndex
+
+    rng = random.Random(args.seed)
+    designs = [_catalog_design(1000 + number, args.pages) for number in range(args.designs)]
+    uploads = []
+    for number in range(args.uploads):
+        if rng.random() < args.catalog_share:
+            uploads.append(('catalog', _client_copy(rng.choice(designs), rng, rng.random() < args.adapted_share)))
+        else:
+            uploads.append(('unique', _client_copy(_catalog_design(5000 + number, args.pages), rng)))
+    pdfs = [(kind, text_pdf(text)) for kind, text in uploads]
+    catalog = sum(1 for kind, _ in uploads if kind == 'catalog')
+    print(f"{args.uploads} uploads of {args.pages}-page projects: {catalog} copies of {args.designs} catalog designs "
+          f"(other cover, investor, plot; {args.adapted_share:.0%} with one adapted page), "
+          f"{args.uploads - catalog} unique projects")
+
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for name, near_duplicates in (('LLM for every upload', False), ('near-duplicate reuse', True)):
+            analyzer = analyzer_module.PDFAIAnalyzer(api_key=None)
+            analyzer.client = _ReadingFakeGroq(SimpleNamespace(unit_slip_rate=0.0, scale=args.scale))
+            analyzer._initialized = True
+            analyzer.near_duplicates = (NearDuplicateIndex(os.path.join(directory, 'index.sqlite3'),
+                                                           threshold=args.threshold)
+                                        if near_duplicates else None)
+            latencies, found, methods, overhead = [], [], [], []
+            for kind, pdf in pdfs:
+                started, cpu_started = time.monotonic(), time.process_time()
+                result = analyzer.process_pdf_file(BytesIO(pdf))
+                cpu = time.process_time() - cpu_started
+                latencies.append(max(0.0, time.monotonic() - started - cpu) / args.scale + cpu)
+                analysis = result['analysis']
+                found.append(analysis['found_data'])
+                methods.append((kind, analysis.get('extraction_method')))
+            results[name] = found
+            reused = [kind for kind, method in methods if method == 'near_duplicate']
+            stats = analyzer.extraction_stats()
+            print(f"{name:<21} LLM calls={analyzer.client.calls:4d}  reused={len(reused):4d} "
+                  f"(catalog {reused.count('catalog')}, unique {reused.count('unique')})  "
+                  f"latency p50={statistics.median(latencies):5.2f} s  mean={statistics.mean(latencies):5.2f} s  "
+                  f"rejected={stats['near_dup_rejected']}  conflicts={stats.get('near_dup_conflicts')}  "
+                  f"fields from changed pages={stats['near_dup_fields_from_changed_pages']}")
+            if near_duplicates:
+                index = analyzer.near_duplicate_stats()
+                print(f"{'':<21} index entries={index['entries']}  lookups={index['lookups']}  "
+                      f"candidates checked={index['candidates']}")
+
+    # Zgodność: czy ponownie użyte found_data = to, co przeczytałby model z tego egzemplarza
+    plain, reused = results['LLM for every upload'], results['near-duplicate reuse']
+    fields = [field for field in plain[0] if field not in ('rodzaj_budynku', 'standard_energetyczny')]
+    agree = sum(1 for a, b in zip(plain, reused) for field in fields if a.get(field) == b.get(field))
+    print(f"found_data agreement with a fresh analysis: {agree / (len(fields) * len(plain)):.1%} "
+          f"({len(fields)} fields)")
+
+
+def _single_page_pdf(content: bytes) -> bytes:
+    """Jednostronicowy PDF z podanym strumieniem treści (FlateDecode)"""
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Contents 4 0 R"
+        b" /Resources << /Font << /F1 5 0 R >> >> >>",
+        b"<< /Length %d /Filter /FlateDecode >>\nstream\n%s\nendstream" % (len(content), content),
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    out += b"".join(f"{offset:010d} 00000 n \n".encode() for offset in offsets)
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return bytes(out)
+
+
+def flate_bomb_pdf(megabytes):
+    """Bomba dekompresji: strumień treści rozpakowuje się do `megabytes` MiB spacji"""
+    compressor = zlib.compressobj(9)
+    parts = [compressor.compress(b"BT /F1 9 Tf 40 800 Td (Projekt budowlany) Tj ET\n")]
+    block = b" " * (1024 * 1024)
+    parts.extend(compressor.compress(block) for _ in range(megabytes))
+    parts.append(compressor.flush())
+    return _single_page_pdf(b"".join(parts))
+
+
+def cpu_heavy_pdf(operations):
+    """Strumień treści z milionami operatorów tekstu - mało bajtów, dużo parsowania"""
+    content = b"BT /F1 9 Tf 40 800 Td\n" + b"(x) Tj 1 0 Td\n" * operations + b"ET"
+    return _single_page_pdf(zlib.compress(content, 9))
+
+
+def _sandbox_child(args):
+    """Dotychczasowa ekstrakcja w procesie (wątek żądania - bez limitu czasu strony)"""
+    try:
+        with open(args.file, 'rb') as upload_stream, spool_upload(upload_stream, 64 * 1024 * 1024) as upload:
+            pages = extract_pages_sequential(PdfReader(upload.stream()))
+        outcome = f"ok, {sum(len(text or '') for _, text, _ in pages)} chars"
+    except MemoryError:
+        outcome = 'MemoryError'
+    print(json.dumps({'outcome': outcome}))
+
+
+def _run_before(path, timeout):
+    """(wynik, czas, szczytowy RSS w MiB) procesu z ekstrakcją; po `timeout` s proces jest zabijany"""
+    started = time.perf_counter()
+    child = subprocess.Popen([sys.executable, __file__, 'sandbox', '--child', '--file', path],
+                             stdout=subprocess.PIPE, text=True)
+    peak = 0
+    while child.poll() is None and time.perf_counter() - started < timeout:
+        try:
+            with open(f'/proc/{child.pid}/status') as status:
+                for line in status:
+                    if line.startswith('VmHWM:'):
+                        peak = max(peak, int(line.split()[1]))
+        except OSError:
+            pass
+        time.sleep(0.05)
+    elapsed = time.perf_counter() - started
+    if child.poll() is None:
+        child.kill()
+        child.wait()
+        return f"still running after {timeout:.0f} s - killed by the bench", elapsed, peak / 1024
+    output = child.stdout.read().strip().splitlines()
+    outcome = json.loads(output[-1])['outcome'] if output else f"died (exit code {child.returncode})"
+    return outcome, elapsed, peak / 1024
+
+
+def bench_sandbox(args):
+    """Złośliwe PDF: ekstrakcja w procesie workera vs procesy odczytu z limitami CPU, pamięci i czasu"""
+    logging.disable(logging.WARNING)
+    os.environ.setdefault('PDF_CACHE_ENABLED', 'false')
+    os.environ.update(PDF_SANDBOX='true', PDF_SANDBOX_WORKERS=str(args.workers),
+                      PDF_SANDBOX_DEADLINE=str(args.deadline), PDF_SANDBOX_CPU_SECONDS=str(args.cpu),
+                      PDF_SANDBOX_MEMORY_MB=str(args.memory), PDF_SANDBOX_MAX_JOBS=str(args.max_jobs))
+    import pdf_analyzer as analyzer_module
+
+    documents = [
+        ('project', synthetic_project_pdf(args.pages)),
+        ('flate bomb', flate_bomb_pdf(args.bomb_mb)),
+        ('cpu heavy', cpu_heavy_pdf(args.operations)),
+    ]
+    with tempfile.TemporaryDirectory() as directory:
+        paths = {}
+        for name, data in documents:
+            paths[name] = os.path.join(directory, f"{name.replace(' ', '_')}.pdf")
+            with open(paths[name], 'wb') as out:
+                out.write(data)
+            print(f"{name:<11} {len(data) / 1024:8.0f} KiB")
+
+        print(f"\nbefore: PyPDF2 inside the request thread (cut off by the bench after {args.before_timeout:.0f} s)")
+        for name, _ in documents:
+            outcome, elapsed, peak = _run_before(paths[name], args.before_timeout)
+            print(f"  {name:<11} {elapsed:6.2f} s  peak RSS {peak:7.1f} MiB  {outcome}")
+
+        analyzer = analyzer_module.PDFAIAnalyzer(api_key=None)
+        analyzer.client, analyzer._initialized = object(), True
+        print(f"\nsandbox: {args.workers} workers, deadline {args.deadline:.0f} s, CPU {args.cpu:.0f} s, "
+              f"address space {args.memory} MiB")
+
+        def run(name):
+            started = time.perf_counter()
+            with open(paths[name], 'rb') as upload_stream:
+                result = analyzer.process_pdf_file(upload_stream)
+            outcome = result.get('error_type') or result['analysis'].get('extraction_method')
+            print(f"  {name:<11} {time.perf_counter() - started:6.2f} s  {outcome}")
+
+        analyzer.sandbox._pool()  # procesy startują przed pomiarem
+        for name in ('project', 'flate bomb', 'cpu heavy', 'project'):
+            run(name)
+        # Bez limitu CPU zostaje limit czasu ściennego
+        analyzer.sandbox.cpu_seconds = 0
+        print("  (CPU limit off)")
+        run('cpu heavy')
+        run('project')
+        _, parent_peak = _rss_kb()
+        stats = analyzer.sandbox_stats()
+        print(f"\nparent peak RSS {parent_peak / 1024:.1f} MiB")
+        print("sandbox stats: " + ", ".join(f"{key}={stats[key]}" for key in (
+            'documents', 'kills', 'timeouts', 'cpu_limit_kills', 'memory_limit_kills', 'crashes',
+            'recycled_after_failure', 'recycled_after_max_jobs', 'started', 'idle')))
+        analyzer.sandbox.shutdown()
+
+
+def bench_extract(args):
+    """Ekstrakcja sekwencyjna vs pula procesów przy rosnącej liczbie rdzeni"""
+    pdf_bytes = synthetic_project_pdf(args.pages, drawing_ops=args.drawing_ops)
+    page_count = len(PdfReader(BytesIO(pdf_bytes)).pages)
+    print(f"synthetic project: {page_count} pages, {len(pdf_bytes) / 1024:.0f} KiB, "
+          f"{os.cpu_count()} CPUs available")
+
+    def timed(fn):
+        samples = []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            result = fn()
+            samples.append(time.perf_counter() - started)
+        return statistics.median(samples), result
+
+    baseline, reference = timed(lambda: extract_pages_sequential(PdfReader(BytesIO(pdf_bytes))))
+    print(f"{'sequential':<14} {baseline * 1000:9.1f} ms")
+
+    for workers in [int(w) for w in args.workers.split(',')]:
+        extractor = ParallelExtractor(workers, page_timeout=args.page_timeout)
+        extractor.extract(pdf_bytes, page_count)  # rozgrzewka: start procesów puli
+        elapsed, pages = timed(lambda: extractor.extract(pdf_bytes, page_count))
+        extractor.shutdown()
+        same = [text for _, text, _ in pages] == [text for _, text, _ in reference]
+        failed = sum(1 for _, _, error in pages if error)
+        print(f"{f'{workers} workers':<14} {elapsed * 1000:9.1f} ms  speedup x{baseline / elapsed:4.2f}  "
+              f"identical={same} failed_pages={failed}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarki analizy PDF')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    extract = sub.add_parser('extract', help='równoległa ekstrakcja tekstu stron')
+    extract.add_argument('--pages', type=int, default=120)
+    extract.add_argument('--drawing-ops', type=int, default=600)
+    extract.add_argument('--workers', default='1,2,4,8')
+    extract.add_argument('--page-timeout', type=float, default=10.0)
+    extract.add_argument('--repeat', type=int, default=3)
+    extract.set_defaults(func=bench_extract)
+
+    rank = sub.add_parser('rank', help='wybór stron wg istotności vs ucięcie tekstu')
+    rank.add_argument('--projects', type=int, default=200)
+    rank.add_argument('--pages', type=int, default=24)
+    rank.add_argument('--budget', type=int, default=12000)
+    rank.set_defaults(func=bench_rank)
+
+    rules = sub.add_parser('rules', help='odczyt regułami przed LLM: odsetek pominiętych wywołań')
+    rules.add_argument('--projects', type=int, default=500)
+    rules.add_argument('--pages', type=int, default=8)
+    rules.add_argument('--llm-latency', type=float, default=4.0, help='czas wywołania Groq w sekundach')
+    rules.add_argument('--verbose', action='store_true')
+    rules.set_defaults(func=bench_rules)
+
+    memory = sub.add_parser('memory', help='szczytowy RSS i wczesne odrzucanie przesłanych plików')
+    memory.add_argument('--pages', type=int, default=200)
+    memory.add_argument('--drawing-ops', type=int, default=600)
+    memory.add_argument('--scan-pages', type=int, default=30)
+    memory.add_argument('--max-bytes', type=int, default=16 * 1024 * 1024)
+    memory.add_argument('--max-pages', type=int, default=300)
+    memory.add_argument('--child', choices=['legacy', 'spooled'], help=argparse.SUPPRESS)
+    memory.add_argument('--file', help=argparse.SUPPRESS)
+    memory.set_defaults(func=lambda args: _memory_child(args) if args.child else bench_memory(args))
+
+    stream = sub.add_parser('stream', help='strumieniowanie odpowiedzi LLM: czas do pierwszego pola')
+    stream.add_argument('--runs', type=int, default=30)
+    stream.add_argument('--ttft', type=float, default=0.35, help='czas do pierwszego tokenu w sekundach')
+    stream.add_argument('--tokens-per-second', type=float, default=250.0)
+    stream.add_argument('--prose-rate', type=float, default=0.3, help='odsetek odpowiedzi z komentarzem wokół JSON')
+    stream.add_argument('--scale', type=float, default=0.1, help='skala czasu symulacji (wyniki w sekundach modelu)')
+    stream.set_defaults(func=bench_stream)
+
+    cascade = sub.add_parser('cascade', help='kaskada modeli: tańszy model, eskalacja do 70B')
+    cascade.add_argument('--documents', type=int, default=200)
+    cascade.add_argument('--thresholds', type=lambda value: [float(v) for v in value.split(',')],
+                         default=[0.7, 0.8, 0.9], help='progi confidence_level, np. 0.7,0.8,0.9')
+    cascade.add_argument('--scale', type=float, default=0.02, help='skala czasu symulacji')
+    cascade.set_defaults(func=bench_cascade)
+
+    ratelimit = sub.add_parser('ratelimit', help='limiter zapytań Groq: 429, ponowienia i czas w kolejce')
+    ratelimit.add_argument('--documents', type=int, default=60)
+    ratelimit.add_argument('--threads', type=int, default=8)
+    ratelimit.add_argument('--rpm', type=int, default=30, help='limit zapytań na minutę po stronie serwera')
+    ratelimit.add_argument('--tpm', type=int, default=60000, help='limit tokenów na minutę po stronie serwera')
+    ratelimit.add_argument('--concurrency', type=int, default=4, help='PDF_GROQ_MAX_CONCURRENCY')
+    ratelimit.add_argument('--retries', type=int, default=3)
+    ratelimit.add_argument('--deadline', type=float, default=180, help='PDF_GROQ_QUEUE_TIMEOUT w sekundach modelu')
+    ratelimit.add_argument('--error-rate', type=float, default=0.03, help='odsetek przejściowych błędów 503')
+    ratelimit.add_argument('--scale', type=float, default=0.05, help='skala czasu symulacji')
+    ratelimit.set_defaults(func=bench_ratelimit)
+
+    mapreduce = sub.add_parser('mapreduce', help='długie projekty: analiza fragmentów równolegle i scalanie pól')
+    mapreduce.add_argument('--documents', type=int, default=30)
+    mapreduce.add_argument('--pages', type=int, default=60)
+    mapreduce.add_argument('--max-chunks', type=lambda value: [int(v) for v in value.split(',')],
+                           default=[6, 12], help='PDF_MAP_MAX_CHUNKS, np. 6,12')
+    mapreduce.add_argument('--concurrency', type=int, default=0, help='PDF_MAP_CONCURRENCY (0 = tyle, ile fragmentów)')
+    mapreduce.add_argument('--unit-slip-rate', type=float, default=0.1, help='odsetek mocy podanej w W zamiast kW')
+    mapreduce.add_argument('--scale', type=float, default=0.05, help='skala czasu symulacji')
+    mapreduce.add_argument('--rpm', type=float, default=30, help='PDF_GROQ_RPM limitera (0 = bez limitera)')
+    mapreduce.add_argument('--tpm', type=float, default=6000, help='PDF_GROQ_TPM limitera')
+    mapreduce.add_argument('--deadline', type=float, default=60, help='PDF_GROQ_QUEUE_TIMEOUT w sekundach')
+    mapreduce.set_defaults(func=bench_mapreduce)
+
+    lazy = sub.add_parser('lazy', help='leniwa ekstrakcja stron: wczesny stop i cache tekstu stron')
+    lazy.add_argument('--pages', type=int, default=200)
+    lazy.add_argument('--drawing-ops', type=int, default=600, help='operacje rysunku na stronę')
+    lazy.set_defaults(func=bench_lazy)
+
+    sandbox = sub.add_parser('sandbox', help='złośliwe PDF: limity CPU, pamięci i czasu procesów odczytu')
+    sandbox.add_argument('--pages', type=int, default=40)
+    sandbox.add_argument('--bomb-mb', type=int, default=768, help='rozmiar rozpakowanego strumienia bomby w MiB')
+    sandbox.add_argument('--operations', type=int, default=2000000, help='operatory tekstu w stronie "cpu heavy"')
+    sandbox.add_argument('--workers', type=int, default=2, help='PDF_SANDBOX_WORKERS')
+    sandbox.add_argument('--deadline', type=float, default=5, help='PDF_SANDBOX_DEADLINE (produkcyjnie 30)')
+    sandbox.add_argument('--cpu', type=float, default=3, help='PDF_SANDBOX_CPU_SECONDS (produkcyjnie 20)')
+    sandbox.add_argument('--memory', type=int, default=512, help='PDF_SANDBOX_MEMORY_MB (produkcyjnie 1024)')
+    sandbox.add_argument('--max-jobs', type=int, default=100, help='PDF_SANDBOX_MAX_JOBS')
+    sandbox.add_argument('--before-timeout', type=float, default=60, help='po ilu sekundach przerwać ścieżkę bez izolacji')
+    sandbox.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    sandbox.add_argument('--file', help=argparse.SUPPRESS)
+    sandbox.set_defaults(func=lambda args: _sandbox_child(args) if args.child else bench_sandbox(args))
+
+    neardup = sub.add_parser('neardup', help='projekty gotowe: ponowne użycie analizy niemal identycznego PDF')
+    neardup.add_argument('--uploads', type=int, default=120)
+    neardup.add_argument('--designs', type=int, default=10, help='liczba projektów katalogowych')
+    neardup.add_argument('--catalog-share', type=float, default=0.8, help='odsetek przesłań z katalogu')
+    neardup.add_argument('--adapted-share', type=float, default=0.2, help='odsetek egzemplarzy z adaptacją jednej strony')
+    neardup.add_argument('--pages', type=int, default=24)
+    neardup.add_argument('--threshold', type=float, default=0.9, help='PDF_NEAR_DUP_THRESHOLD')
+    neardup.add_argument('--seed', type=int, default=2025)
+    neardup.add_argument('--scale', type=float, default=0.02, help='skala czasu symulacji')
+    neardup.set_defaults(func=bench_neardup)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
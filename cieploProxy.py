@@ -5,68 +5,509 @@ Serwis proxy dla zewnętrznego API cieplo.app
 """
 
 import requests
+import hashlib
 import json
 import logging
+import os
+import re
+import tempfile
+import threading
 import time
-from flask import Flask, request, jsonify
-from typing import Dict, Any, Optional
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from flask import Flask, Response, request, jsonify, stream_with_context
+from requests.adapters import HTTPAdapter
+from typing import Dict, Any, Iterator, List, Optional, Mapping, Tuple
+
+import postcode_zones
+from heat_surrogate import HeatDemandSurrogate
+from resilience import CircuitBreaker, IntervalGate, LatencyWindow, SingleFlight, SingleFlightTimeout
+from result_cache import SQLiteCache, TTLCache
 
 # Konfiguracja loggingu
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+CACHE_KEY_VERSION = 'v2'
+
+# "0123", "-007" - ale nie "0", "0.5", "0,75"
+_LEADING_ZERO_RE = re.compile(r'^[-+]?0\d')
+
+
+def _canonical_value(value: Any) -> Any:
+    """Sprowadź wartość do postaci kanonicznej (120, 120.0 i "120.0" -> 120)
+
+    Napisy z zerem wiodącym ("01234", "007") zostają napisami - to
+    identyfikatory i kody, nie liczby, a "01234" i "1234" to różne zapytania.
+    """
+    if isinstance(value, bool) or value is None:
+        return value
+    if isinstance(value, str):
+        text = value.strip()
+        if _LEADING_ZERO_RE.match(text):
+            return text
+        try:
+            value = float(text.replace(',', '.'))
+        except ValueError:
+            return text.lower()
+    if isinstance(value, (int, float)):
+        number = float(value)
+        if number != number or number in (float('inf'), float('-inf')):
+            return str(number)
+        if number.is_integer():
+            return int(number)
+        return round(number, 6)
+    if isinstance(value, dict):
+        return {str(k): _canonical_value(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_canonical_value(v) for v in value]
+    return str(value)
+
+
+def canonical_cache_key(payload: Dict[str, Any]) -> str:
+    """Klucz cache: SHA-256 kanonicznego JSON całego payloadu cieplo.app"""
+    canonical = json.dumps(
+        _canonical_value(payload),
+        sort_keys=True,
+        separators=(',', ':'),
+        ensure_ascii=False
+    )
+    digest = hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+    return f"{CACHE_KEY_VERSION}:{digest}"
+
+
 class CieploApiProxy:
     """Proxy dla API cieplo.app z cachingiem i error handlingiem"""
+
+    # Dane testowe głębokiej próby health
+    PROBE_DATA = {
+        'powierzchnia': 100,
+        'kodPocztowy': '00-000',
+        'typBudynku': 'dom'
+    }
     
-    def __init__(self):
-        self.base_url = "https://api.cieplo.app"
+    def __init__(self, config: Optional[Mapping[str, Any]] = None):
+        self.config = config or {}
+        # Adres upstream - lokalny zastępnik: cieplo_stub_server.py
+        self.base_url = self._setting('CIEPLO_BASE_URL', "https://api.cieplo.app").rstrip('/')
         self.timeout = 30
-        self.cache = {}  # Prosty cache w pamięci
-        self.cache_ttl = 300  # 5 minut
+        # Klucz obejmuje cały payload, więc TTL może być długi (domyślnie 24 h)
+        self.cache_ttl = self._setting('CIEPLO_CACHE_TTL', 86400, int)
+        # Po miękkim TTL wpis jest serwowany od razu i odświeżany w tle
+        self.cache_soft_ttl = min(self.cache_ttl, self._setting('CIEPLO_CACHE_SOFT_TTL', 21600, int))
+        self.cache = self._create_cache()
+
+        # Ograniczona pula odświeżania w tle (stale-while-revalidate)
+        self.refresh_workers = self._setting('CIEPLO_REFRESH_WORKERS', 2, int)
+        self.refresh_queue_limit = self._setting('CIEPLO_REFRESH_QUEUE', 32, int)
+        self._refresh_executor = None
+        self._refresh_pid = None
+        self._refreshing = set()
+        self._refresh_lock = threading.Lock()
+
+        # Indeks kod pocztowy -> strefa klimatyczna (mmap, współdzielony przez workery)
+        self.postcode_index = postcode_zones.get_index(self._setting('CIEPLO_POSTCODE_INDEX', None))
+
+        # Lokalny model zastępczy - szacunek gdy cieplo.app jest niedostępne lub wolne
+        self.surrogate = None
+        if self._setting('CIEPLO_SURROGATE_ENABLED', 'true').lower() in ('1', 'true', 'yes'):
+            self.surrogate = HeatDemandSurrogate(
+                path=self._setting('CIEPLO_SURROGATE_PATH', None),
+                min_samples=self._setting('CIEPLO_SURROGATE_MIN_SAMPLES', 3, int)
+            )
+
+        # Nagrywanie par zapytanie/odpowiedź dla cieplo_stub_server.py
+        self.record_path = self._setting('CIEPLO_RECORD_PATH', None)
+        self._record_lock = threading.Lock()
+
+        # Wycena osiedli: wiele budynków w jednym zapytaniu
+        self.batch_max_items = self._setting('CIEPLO_BATCH_MAX_ITEMS', 500, int)
+        self.batch_concurrency = self._setting('CIEPLO_BATCH_CONCURRENCY', 8, int)
+
+        self._metrics = Counter()
+        self._metrics_lock = threading.Lock()
+
+        # Pula połączeń keep-alive - jedna sesja na proces workera
+        self.pool_size = self._setting('CIEPLO_POOL_SIZE', 10, int)
+        self._session = None
+        self._session_pid = None
+        self._session_lock = threading.Lock()
+
+        # Łączenie identycznych zapytań w locie (klucz = klucz cache)
+        self.single_flight = SingleFlight()
+        self.coalesce_timeout = self._setting('CIEPLO_COALESCE_TIMEOUT', self.timeout + 5, float)
+
+        # Bezpiecznik i adaptacyjny timeout (percentyl czasów odpowiedzi x mnożnik)
+        self.breaker = CircuitBreaker(
+            failure_threshold=self._setting('CIEPLO_BREAKER_FAILURES', 5, int),
+            recovery_timeout=self._setting('CIEPLO_BREAKER_RECOVERY', 30, float)
+        )
+        self.latency = LatencyWindow(self._setting('CIEPLO_LATENCY_WINDOW', 200, int))
+        self.timeout_min = self._setting('CIEPLO_TIMEOUT_MIN', 3, float)
+        self.timeout_percentile = self._setting('CIEPLO_TIMEOUT_PERCENTILE', 99, float)
+        self.timeout_multiplier = self._setting('CIEPLO_TIMEOUT_MULTIPLIER', 3, float)
+
+        # Health z pasywnych statystyk; głęboka próba najwyżej raz na interwał (wszystkie workery)
+        self.health_window = self._setting('CIEPLO_HEALTH_WINDOW', 300, float)
+        self.health_max_error_rate = self._setting('CIEPLO_HEALTH_MAX_ERROR_RATE', 0.5, float)
+        self.probe_gate = IntervalGate(
+            self._setting('CIEPLO_PROBE_STATE_PATH',
+                          os.path.join(tempfile.gettempdir(), 'wycena2025_cieplo_probe.json')),
+            self._setting('CIEPLO_PROBE_INTERVAL', 60, float)
+        )
         
-        logger.info("CieploApiProxy initialized")
+        logger.info(f"CieploApiProxy initialized (pool size: {self.pool_size})")
+
+    def _setting(self, name: str, default: Any, cast=str) -> Any:
+        """Odczytaj ustawienie z konfiguracji aplikacji lub zmiennej środowiskowej"""
+        value = self.config.get(name)
+        if value is None:
+            value = os.environ.get(name)
+        if value is None:
+            return default
+        return cast(value)
+
+    def _create_cache(self):
+        """Cache w pamięci procesu albo współdzielony plik SQLite (CIEPLO_CACHE_BACKEND)"""
+        backend = self._setting('CIEPLO_CACHE_BACKEND', 'memory').lower()
+        max_entries = self._setting('CIEPLO_CACHE_MAX_ENTRIES', 1000, int)
+        max_bytes = self._setting('CIEPLO_CACHE_MAX_BYTES', 8 * 1024 * 1024, int)
+
+        if backend == 'sqlite':
+            default_path = os.path.join(tempfile.gettempdir(), 'wycena2025_cieplo_cache.sqlite3')
+            path = self._setting('CIEPLO_CACHE_PATH', default_path)
+            try:
+                return SQLiteCache(path, ttl=self.cache_ttl, max_entries=max_entries, max_bytes=max_bytes)
+            except Exception as e:
+                logger.warning(f"SQLite cache unavailable ({e}), falling back to memory cache")
+
+        return TTLCache(
+            ttl=self.cache_ttl,
+            max_entries=max_entries,
+            max_bytes=max_bytes
+        )
+
+    def _get_session(self) -> requests.Session:
+        """Zwróć sesję HTTP z pulą połączeń dla bieżącego procesu"""
+        pid = os.getpid()
+        if self._session is None or self._session_pid != pid:
+            with self._session_lock:
+                # Po forku (gunicorn) każdy worker buduje własną pulę
+                if self._session is None or self._session_pid != pid:
+                    session = requests.Session()
+                    adapter = HTTPAdapter(
+                        pool_connections=1,
+                        pool_maxsize=self.pool_size,
+                        max_retries=0
+                    )
+                    session.mount('https://', adapter)
+                    session.mount('http://', adapter)
+                    session.headers.update({
+                        'Content-Type': 'application/json',
+                        'User-Agent': 'WYCENA-2025/1.0',
+                        'Connection': 'keep-alive'
+                    })
+                    self._session = session
+                    self._session_pid = pid
+                    logger.info(f"Created pooled cieplo.app session for worker {pid}")
+        return self._session
+
+    def get_connection_stats(self) -> Dict[str, Any]:
+        """Liczniki połączeń puli (nowe vs ponownie użyte)"""
+        stats = {
+            'worker_pid': os.getpid(),
+            'pool_size': self.pool_size,
+            'connections_opened': 0,
+            'requests_sent': 0,
+            'connections_reused': 0
+        }
+        session = self._session
+        if session is None or self._session_pid != os.getpid():
+            return stats
+
+        adapter = session.get_adapter(self.base_url)
+        pools = adapter.poolmanager.pools
+        for pool_key in list(pools.keys()):
+            pool = pools.get(pool_key)
+            if pool is None:
+                continue
+            stats['connections_opened'] += pool.num_connections
+            stats['requests_sent'] += pool.num_requests
+
+        stats['connections_reused'] = max(0, stats['requests_sent'] - stats['connections_opened'])
+        return stats
+
+    def current_timeout(self) -> float:
+        """Timeout odczytu: percentyl udanych wywołań x mnożnik, w granicach [min, timeout]"""
+        if len(self.latency) < 20:
+            return float(self.timeout)
+        observed = self.latency.percentile(self.timeout_percentile)
+        if observed is None:
+            return float(self.timeout)
+        return round(min(self.timeout, max(self.timeout_min, observed * self.timeout_multiplier)), 3)
+
+    def _estimate(self, payload: Dict[str, Any], exact_pending: bool = True) -> Optional[Dict[str, Any]]:
+        """Szacunek modelu zastępczego (nie trafia do cache - dokładny wynik go zastąpi)
+
+        exact_pending: czy dokładny wynik jest właśnie pobierany w tle - przy
+        otwartym bezpieczniku nie jest, klient nie powinien na niego czekać
+        """
+        if self.surrogate is None:
+            return None
+        estimate = self.surrogate.estimate(payload)
+        if estimate:
+            self._incr('estimates_served')
+            estimate['exact_pending'] = exact_pending
+        return estimate
+
+    def _circuit_open_result(self) -> Dict[str, Any]:
+        """Szybka odmowa przy otwartym bezpieczniku - kształt `errors` zna frontend (callCieplo)"""
+        retry_after = self.breaker.retry_after()
+        message = f'Serwis cieplo.app jest chwilowo niedostępny. Spróbuj ponownie za {retry_after} s.'
+        return {
+            'status': 'error',
+            'error': message,
+            'error_type': 'circuit_open',
+            'errors': {'cieplo.app': message},
+            'retry_after': retry_after,
+            'mocObliczona': None
+        }
+
+    def get_health(self) -> Dict[str, Any]:
+        """Stan upstream z ruchu produkcyjnego - bez żadnego wywołania cieplo.app"""
+        upstream = self.latency.summary(self.health_window)
+        circuit = self.breaker.stats()
+
+        if circuit['state'] == CircuitBreaker.OPEN:
+            status = 'unhealthy'
+        elif upstream['samples'] and upstream['error_rate'] > self.health_max_error_rate:
+            status = 'degraded'
+        else:
+            status = 'healthy'
+
+        return {
+            'status': status,
+            'service': 'cieplo.app proxy',
+            'upstream': upstream,
+            'circuit': circuit,
+            'timeout': self.current_timeout(),
+            'cache_size': len(self.cache),
+            'connections': self.get_connection_stats()
+        }
+
+    def probe_upstream(self) -> Dict[str, Any]:
+        """Głęboka próba: jedno prawdziwe wywołanie na interwał dla całego hosta"""
+        def probe():
+            started = time.monotonic()
+            try:
+                self._post_upstream(self._prepare_heating_payload(self.PROBE_DATA), self.current_timeout())
+                return {'ok': True, 'latency': round(time.monotonic() - started, 4), 'at': time.time()}
+            except Exception as e:
+                return {'ok': False, 'error': str(e), 'at': time.time()}
+
+        result, executed = self.probe_gate.run(probe)
+        return dict(result, fresh=executed)
+
+    def _incr(self, name: str, amount: int = 1) -> None:
+        with self._metrics_lock:
+            self._metrics[name] += amount
+
+    def get_climate(self, postcode: Any) -> Optional[Dict[str, Any]]:
+        """Strefa PN-EN 12831, temperatura projektowa i średnia dla kodu pocztowego"""
+        if self.postcode_index is None:
+            return None
+        return self.postcode_index.lookup(postcode)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Metryki proxy dla /api/cieplo/metrics"""
+        with self._metrics_lock:
+            counters = dict(self._metrics)
+        with self._refresh_lock:
+            refreshing = len(self._refreshing)
+        return {
+            'cache': self.cache.stats(),
+            'connections': self.get_connection_stats(),
+            'coalescing': self.single_flight.stats(),
+            'circuit': self.breaker.stats(),
+            'upstream': dict(
+                self.latency.summary(),
+                timeout=self.current_timeout(),
+                timeout_max=self.timeout
+            ),
+            'surrogate': dict(
+                self.surrogate.stats() if self.surrogate else {'enabled': False},
+                estimates_served=counters.get('estimates_served', 0)
+            ),
+            'batch': {
+                'requests': counters.get('batch_requests', 0),
+                'items': counters.get('batch_items', 0),
+                'concurrency': self.batch_concurrency,
+                'max_items': self.batch_max_items
+            },
+            'refresh': {
+                'in_progress': refreshing,
+                'workers': self.refresh_workers,
+                'queue_limit': self.refresh_queue_limit,
+                'soft_ttl': self.cache_soft_ttl,
+                'hard_ttl': self.cache_ttl,
+                'stale_served': counters.get('stale_served', 0),
+                'scheduled': counters.get('refresh_scheduled', 0),
+                'dropped': counters.get('refresh_dropped', 0),
+                'completed': counters.get('refresh_completed', 0),
+                'failed': counters.get('refresh_failed', 0)
+            }
+        }
     
-    def calculate_heating_demand(self, data: Dict[str, Any]) -> Dict[str, Any]:
+    def calculate_heating_demand(self, data: Dict[str, Any], provisional: bool = False) -> Dict[str, Any]:
         """
         Oblicz zapotrzebowanie na ciepło
         
         Args:
             data: Dane budynku (powierzchnia, lokalizacja, itp.)
+            provisional: Przy braku w cache zwróć od razu szacunek modelu
+                zastępczego, a dokładny wynik pobierz w tle do cache
             
         Returns:
             Dict z wynikami obliczeń
         """
-        cache_key = self._generate_cache_key(data)
+        # Przygotuj payload dla cieplo.app - z niego powstaje klucz cache
+        payload = self._prepare_heating_payload(data)
+        cache_key = self._generate_cache_key(payload)
         
-        # Sprawdź cache
-        cached_result = self._get_from_cache(cache_key)
+        # Sprawdź cache - nieświeży wpis zwracamy od razu i odświeżamy w tle
+        cached_result, stale = self._lookup_cache(cache_key)
         if cached_result:
+            if stale:
+                self._incr('stale_served')
+                self._schedule_refresh(cache_key, payload)
             logger.info("Returning cached result for heating calculation")
             return cached_result
+
+        if provisional:
+            estimate = self._estimate(payload)
+            if estimate:
+                self._schedule_refresh(cache_key, payload)
+                return estimate
         
+        # Identyczne równoległe zapytania czekają na jedno wywołanie upstream
         try:
-            # Przygotuj payload dla cieplo.app
-            payload = self._prepare_heating_payload(data)
-            
-            # Wywołaj API
-            response = requests.post(
-                f"{self.base_url}/calculate",
-                json=payload,
-                timeout=self.timeout,
-                headers={
-                    'Content-Type': 'application/json',
-                    'User-Agent': 'WYCENA-2025/1.0'
-                }
+            result, shared = self.single_flight.do(
+                cache_key,
+                lambda: self._fetch_and_cache(cache_key, payload),
+                timeout=self.coalesce_timeout
             )
-            
-            response.raise_for_status()
-            result = response.json()
+            if shared:
+                logger.info("Returning result of coalesced in-flight heating calculation")
+            return result
+        except SingleFlightTimeout as e:
+            logger.error(f"Coalesced heating calculation timed out: {e}")
+            return {
+                'status': 'error',
+                'error': 'Przekroczono czas oczekiwania na wynik z API',
+                'mocObliczona': None
+            }
+
+    def calculate_batch(self, items: List[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """
+        Oblicz zapotrzebowanie dla wielu budynków - wyniki w kolejności ukończenia
+        
+        Identyczne budynki (ten sam klucz cache) liczone są raz, trafienia
+        cache zwracane od razu, a braki idą do cieplo.app równolegle
+        (najwyżej `batch_concurrency` naraz).
+        
+        Yields:
+            {'index': i, 'result': {...}} dla każdej pozycji, na końcu {'summary': {...}}
+        """
+        started = time.monotonic()
+        groups: Dict[str, List[int]] = {}
+        first_form: Dict[str, Dict[str, Any]] = {}
+        payloads: Dict[str, Dict[str, Any]] = {}
+        for index, form in enumerate(items):
+            payload = self._prepare_heating_payload(form)
+            key = self._generate_cache_key(payload)
+            groups.setdefault(key, []).append(index)
+            first_form.setdefault(key, form)
+            payloads.setdefault(key, payload)
+
+        summary = Counter(items=len(items), unique=len(groups))
+        misses = []
+        for key, indexes in groups.items():
+            cached_result, stale = self._lookup_cache(key)
+            if cached_result:
+                summary['cache_hits'] += 1
+                if stale:
+                    # Jak w calculate_heating_demand: wpis od razu, odświeżenie w tle
+                    summary['stale'] += 1
+                    self._incr('stale_served')
+                    self._schedule_refresh(key, payloads[key])
+                for index in indexes:
+                    yield {'index': index, 'result': cached_result}
+            else:
+                misses.append(key)
+
+        summary['upstream'] = len(misses)
+        self._incr('batch_requests')
+        self._incr('batch_items', len(items))
+
+        if misses:
+            executor = ThreadPoolExecutor(
+                max_workers=min(self.batch_concurrency, len(misses)),
+                thread_name_prefix='cieplo-batch'
+            )
+            try:
+                futures = {
+                    executor.submit(self.calculate_heating_demand, first_form[key]): key
+                    for key in misses
+                }
+                for future in as_completed(futures):
+                    key = futures[future]
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        logger.error(f"Batch heating calculation failed: {e}")
+                        result = {
+                            'status': 'error',
+                            'error': f'Nieoczekiwany błąd: {str(e)}',
+                            'mocObliczona': None
+                        }
+                    if result.get('status') != 'success':
+                        summary['errors'] += 1
+                    for index in groups[key]:
+                        yield {'index': index, 'result': result}
+            finally:
+                # Klient mógł się rozłączyć - nie kończymy zbędnych wywołań
+                executor.shutdown(wait=False, cancel_futures=True)
+
+        summary['duration'] = round(time.monotonic() - started, 3)
+        yield {'summary': dict(summary)}
+
+    def _fetch_and_cache(self, cache_key: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Wywołaj cieplo.app i zapisz wynik w cache"""
+        # Inne zapytanie mogło właśnie zakończyć to samo obliczenie
+        cached_result, stale = self._lookup_cache(cache_key)
+        if cached_result and not stale:
+            return cached_result
+
+        if not self.breaker.allow():
+            logger.warning("cieplo.app circuit open - failing fast")
+            estimate = self._estimate(payload, exact_pending=False)
+            if estimate:
+                estimate['retry_after'] = self.breaker.retry_after()
+                return estimate
+            return self._circuit_open_result()
+
+        try:
+            result = self._post_upstream(payload, self.current_timeout())
+            if self.record_path:
+                self._record(cache_key, payload, result)
             
             # Przetwórz wynik
             processed_result = self._process_heating_result(result)
             
             # Zapisz w cache
             self._save_to_cache(cache_key, processed_result)
+            if self.surrogate is not None:
+                self.surrogate.observe(payload, processed_result)
             
             logger.info(f"Heating calculation completed: {processed_result.get('mocObliczona')} kW")
             return processed_result
@@ -85,6 +526,38 @@ class CieploApiProxy:
                 'error': f'Nieoczekiwany błąd: {str(e)}',
                 'mocObliczona': None
             }
+
+    def _record(self, cache_key: str, payload: Dict[str, Any], response: Dict[str, Any]) -> None:
+        """Dopisz parę zapytanie/odpowiedź do pliku nagrań (JSONL)"""
+        line = json.dumps({'key': cache_key, 'payload': payload, 'response': response}, ensure_ascii=False)
+        try:
+            with self._record_lock, open(self.record_path, 'a', encoding='utf-8') as f:
+                f.write(line + '\n')
+        except OSError as e:
+            logger.warning(f"Could not record cieplo.app response: {e}")
+
+    def _post_upstream(self, payload: Dict[str, Any], read_timeout: float) -> Dict[str, Any]:
+        """POST do cieplo.app; wynik zasila okno opóźnień i bezpiecznik"""
+        started = time.monotonic()
+        upstream_ok = False
+        try:
+            # Wywołaj API (połączenie z puli keep-alive)
+            response = self._get_session().post(
+                f"{self.base_url}/calculate",
+                json=payload,
+                timeout=(min(read_timeout, self.timeout_min), read_timeout)
+            )
+
+            # Błędy 4xx to problem danych, nie awaria upstream
+            upstream_ok = response.status_code < 500
+            response.raise_for_status()
+            return response.json()
+        finally:
+            self.latency.record(time.monotonic() - started, upstream_ok)
+            if upstream_ok:
+                self.breaker.record_success()
+            else:
+                self.breaker.record_failure()
     
     def _prepare_heating_payload(self, data: Dict[str, Any]) -> Dict[str, Any]:
         """Przygotuj dane dla API cieplo.app"""
@@ -117,45 +590,74 @@ class CieploApiProxy:
             }
         }
     
-    def _generate_cache_key(self, data: Dict[str, Any]) -> str:
-        """Generuj klucz cache na podstawie danych"""
-        # Użyj kluczowych parametrów do cache key
-        key_params = [
-            str(data.get('powierzchnia', 0)),
-            str(data.get('kodPocztowy', '')),
-            str(data.get('typBudynku', '')),
-            str(data.get('kondygnacje', 1))
-        ]
-        return "_".join(key_params)
+    def _generate_cache_key(self, payload: Dict[str, Any]) -> str:
+        """Generuj klucz cache z pełnego payloadu (_prepare_heating_payload)"""
+        return canonical_cache_key(payload)
     
     def _get_from_cache(self, key: str) -> Optional[Dict[str, Any]]:
-        """Pobierz z cache jeśli aktualny"""
-        if key in self.cache:
-            cached_data, timestamp = self.cache[key]
-            if (timestamp + self.cache_ttl) > time.time():
-                return cached_data
-            else:
-                # Usuń przestarzały cache
-                del self.cache[key]
-        return None
+        """Pobierz z cache jeśli aktualny (wygasłe wpisy usuwa sam cache)"""
+        return self.cache.get(key)
+
+    def _lookup_cache(self, key: str) -> Tuple[Optional[Dict[str, Any]], bool]:
+        """Zwróć (wynik, czy_nieświeży) - nieświeży = starszy niż miękki TTL"""
+        entry = self.cache.get_entry(key)
+        if entry is None:
+            return None, False
+        value, age = entry
+        return value, age > self.cache_soft_ttl
+
+    def _get_refresh_executor(self) -> ThreadPoolExecutor:
+        """Pula odświeżania tworzona leniwie w każdym procesie workera"""
+        pid = os.getpid()
+        if self._refresh_executor is None or self._refresh_pid != pid:
+            self._refresh_executor = ThreadPoolExecutor(
+                max_workers=self.refresh_workers,
+                thread_name_prefix='cieplo-refresh'
+            )
+            self._refresh_pid = pid
+            self._refreshing = set()
+        return self._refresh_executor
+
+    def _schedule_refresh(self, cache_key: str, payload: Dict[str, Any]) -> None:
+        """Zleć jedno odświeżenie wpisu w tle (bez burzy odświeżeń)"""
+        with self._refresh_lock:
+            executor = self._get_refresh_executor()
+            if cache_key in self._refreshing:
+                return
+            if len(self._refreshing) >= self.refresh_queue_limit:
+                self._incr('refresh_dropped')
+                return
+            self._refreshing.add(cache_key)
+
+        self._incr('refresh_scheduled')
+        executor.submit(self._refresh, cache_key, payload)
+
+    def _refresh(self, cache_key: str, payload: Dict[str, Any]) -> None:
+        try:
+            result, _ = self.single_flight.do(
+                cache_key,
+                lambda: self._fetch_and_cache(cache_key, payload),
+                timeout=self.coalesce_timeout
+            )
+            # Przy błędzie (także szacunku przy otwartym bezpieczniku) nieświeży wpis zostaje do twardego TTL
+            exact = result.get('status') == 'success' and not result.get('estimated')
+            self._incr('refresh_completed' if exact else 'refresh_failed')
+        except Exception as e:
+            logger.warning(f"Background refresh of cieplo.app result failed: {e}")
+            self._incr('refresh_failed')
+        finally:
+            with self._refresh_lock:
+                self._refreshing.discard(cache_key)
     
     def _save_to_cache(self, key: str, data: Dict[str, Any]) -> None:
-        """Zapisz do cache z timestampem"""
-        import time
-        self.cache[key] = (data, time.time())
-        
-        # Ogranicz rozmiar cache (maksymalnie 100 wpisów)
-        if len(self.cache) > 100:
-            # Usuń najstarsze wpisy
-            sorted_cache = sorted(self.cache.items(), key=lambda x: x[1][1])
-            for key_to_remove, _ in sorted_cache[:20]:  # Usuń 20 najstarszych
-                del self.cache[key_to_remove]
+        """Zapisz do cache (LRU z limitem wpisów i bajtów)"""
+        self.cache.put(key, data)
 
 # Flask endpoints dla integracji
 def create_cieplo_api_routes(app: Flask):
     """Dodaj endpointy API do aplikacji Flask"""
     
-    proxy = CieploApiProxy()
+    proxy = CieploApiProxy(app.config)
     
     @app.route('/api/cieplo/calculate', methods=['POST'])
     def calculate_heating():
@@ -169,7 +671,10 @@ def create_cieplo_api_routes(app: Flask):
                     'error': 'Brak danych w request'
                 }), 400
             
-            result = proxy.calculate_heating_demand(data)
+            provisional = request.args.get('provisional') in ('1', 'true')
+            result = proxy.calculate_heating_demand(data, provisional=provisional)
+            if result.get('error_type') == 'circuit_open':
+                return jsonify(result), 503, {'Retry-After': str(result['retry_after'])}
             return jsonify(result)
             
         except Exception as e:
@@ -179,31 +684,65 @@ def create_cieplo_api_routes(app: Flask):
                 'error': str(e)
             }), 500
     
+    @app.route('/api/cieplo/calculate-batch', methods=['POST'])
+    def calculate_heating_batch():
+        """Obliczenia dla wielu budynków - wyniki strumieniowo jako NDJSON"""
+        data = request.get_json(silent=True)
+        items = data.get('items') if isinstance(data, dict) else data
+
+        if not isinstance(items, list) or not items:
+            return jsonify({
+                'status': 'error',
+                'error': 'Oczekiwano niepustej listy budynków'
+            }), 400
+
+        if len(items) > proxy.batch_max_items:
+            return jsonify({
+                'status': 'error',
+                'error': f'Za dużo budynków w jednym zapytaniu (maksymalnie {proxy.batch_max_items})'
+            }), 413
+
+        if not all(isinstance(item, dict) for item in items):
+            return jsonify({
+                'status': 'error',
+                'error': 'Każdy element listy musi być obiektem z danymi budynku'
+            }), 400
+
+        def generate():
+            for line in proxy.calculate_batch(items):
+                yield json.dumps(line, ensure_ascii=False) + '\n'
+
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+    @app.route('/api/cieplo/climate/<postcode>', methods=['GET'])
+    def cieplo_climate(postcode):
+        """Strefa klimatyczna i temperatura projektowa dla kodu pocztowego (bez cieplo.app)"""
+        climate = proxy.get_climate(postcode)
+        if climate is None:
+            return jsonify({
+                'status': 'error',
+                'error': f'Nieznany kod pocztowy: {postcode}',
+                'error_type': 'unknown_postcode'
+            }), 404
+
+        return jsonify(dict(climate, status='success', postcode=postcode))
+
+    @app.route('/api/cieplo/metrics', methods=['GET'])
+    def cieplo_metrics():
+        """Metryki proxy: cache, pula połączeń, łączenie zapytań"""
+        return jsonify(proxy.get_metrics())
+
     @app.route('/api/cieplo/health', methods=['GET'])
     def cieplo_health():
-        """Health check dla cieplo.app proxy"""
+        """Health check dla cieplo.app proxy (pasywny; ?deep=1 - próba z limitem)"""
         try:
-            # Test prostego zapytania
-            test_data = {
-                'powierzchnia': 100,
-                'kodPocztowy': '00-000',
-                'typBudynku': 'dom'
-            }
-            
-            result = proxy.calculate_heating_demand(test_data)
-            
-            if result.get('status') == 'success':
-                return jsonify({
-                    'status': 'healthy',
-                    'service': 'cieplo.app proxy',
-                    'cache_size': len(proxy.cache)
-                })
-            else:
-                return jsonify({
-                    'status': 'unhealthy',
-                    'service': 'cieplo.app proxy', 
-                    'error': result.get('error')
-                }), 503
+            health = proxy.get_health()
+            if request.args.get('deep') in ('1', 'true'):
+                health['probe'] = proxy.probe_upstream()
+                if not health['probe']['ok']:
+                    health['status'] = 'unhealthy'
+
+            return jsonify(health), 503 if health['status'] == 'unhealthy' else 200
                 
         except Exception as e:
             return jsonify({
@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+"""
+cieplo.app stand-in server
+Lokalny zastępnik api.cieplo.app do testów obciążeniowych i benchmarków proxy
+
+Odtwarza nagrane pary zapytanie/odpowiedź (CIEPLO_RECORD_PATH proxy) po tym
+samym kluczu co CieploApiProxy, a dla nieznanych payloadów syntetyzuje
+deterministyczną odpowiedź. Opóźnienia, koszt zestawienia
+połączenia, błędy i "kapanie" odpowiedzi (slow-drip) są konfigurowalne.
+
+Użycie:
+    python cieplo_stub_server.py --port 5055 --recordings nagrania.jsonl \\
+        --latency lognormal:0.3:0.5 --error-rate 0.05 --drip-rate 0.1
+    CIEPLO_BASE_URL=http://127.0.0.1:5055 python main.py
+"""
+import argparse
+import itertools
+import json
+import logging
+import math
+import random
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional, Tuple
+
+from cieploProxy import canonical_cache_key
+from heat_surrogate import climate_zone
+from postcode_zones import ZONE_CLIMATE
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_RESPONSE = {
+    'power_demand': 8.4,
+    'annual_demand': 14200,
+    'eu_factor': 92,
+    'night_temp': 16,
+    'day_temp': 20,
+    'heat_losses': {'walls': 3.1, 'windows': 2.2, 'roof': 1.4},
+    'internal_gains': 0.6,
+    'solar_gains': 0.9
+}
+
+
+def synthetic_response(payload: Dict[str, Any], rng: Optional[random.Random] = None) -> Dict[str, Any]:
+    """Deterministyczna (z opcjonalnym szumem) odpowiedź w formacie cieplo.app"""
+    design_temp = ZONE_CLIMATE.get(climate_zone(payload.get('location')), (-20,))[0]
+    factors = (
+        {'dobre': 0.7, 'standard': 1.0, 'slabe': 1.4}.get(str(payload.get('insulation')).lower(), 1.0),
+        {'trzyszybowe': 0.85, 'standard': 1.0, 'stare': 1.25}.get(str(payload.get('windows')).lower(), 1.0),
+        {'recuperation': 0.75, 'mechanical': 0.9, 'natural': 1.0}.get(str(payload.get('ventilation')).lower(), 1.0)
+    )
+    try:
+        area = float(str(payload.get('surface_area')).replace(',', '.'))
+    except (TypeError, ValueError):
+        area = 100.0
+    area = area if area > 0 else 100.0
+
+    specific = 45.0 * (20 - design_temp) / 40 * (1 + 20 / area)
+    for factor in factors:
+        specific *= factor
+    if rng is not None:
+        specific *= rng.uniform(0.97, 1.03)
+
+    power = round(specific * area / 1000, 2)
+    annual = round(power * 1850)
+    return dict(SAMPLE_RESPONSE, power_demand=power, annual_demand=annual,
+                eu_factor=round(annual / area, 1))
+
+
+class LatencyModel:
+    """Rozkład opóźnień: '0.2', 'fixed:0.2', 'uniform:0.1:0.5',
+    'normal:0.3:0.05', 'lognormal:<mediana>:<sigma>'"""
+
+    def __init__(self, kind: str = 'fixed', params: Tuple[float, ...] = (0.0,)):
+        self.kind = kind
+        self.params = params
+
+    @classmethod
+    def parse(cls, spec: Any) -> 'LatencyModel':
+        if isinstance(spec, cls):
+            return spec
+        if isinstance(spec, (int, float)):
+            return cls('fixed', (float(spec),))
+        parts = str(spec).split(':')
+        if len(parts) == 1:
+            return cls('fixed', (float(parts[0]),))
+        kind, params = parts[0], tuple(float(p) for p in parts[1:])
+        expected = {'fixed': 1, 'uniform': 2, 'normal': 2, 'lognormal': 2}
+        if kind not in expected or len(params) != expected[kind]:
+            raise ValueError(f"Invalid latency spec: {spec}")
+        return cls(kind, params)
+
+    def sample(self, rng: random.Random) -> float:
+        if self.kind == 'uniform':
+            return rng.uniform(*self.params)
+        if self.kind == 'normal':
+            return max(0.0, rng.gauss(*self.params))
+        if self.kind == 'lognormal':
+            median, sigma = self.params
+            return rng.lognormvariate(math.log(median), sigma) if median > 0 else 0.0
+        return self.params[0]
+
+    def __str__(self) -> str:
+        return ':'.join([self.kind] + [str(p) for p in self.params])
+
+
+def load_recordings(path: str) -> Dict[str, Dict[str, Any]]:
+    """Nagrania JSONL {key?, payload, response} -> słownik klucz -> odpowiedź"""
+    recordings = {}
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            key = record.get('key') or canonical_cache_key(record['payload'])
+            recordings[key] = record['response']
+    return recordings
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        # Nowe połączenie: opóźnienie zestawienia (TCP + TLS) przed pierwszą odpowiedzią
+        self.server.count('connections')
+        if self.server.connect_latency > 0:
+            time.sleep(self.server.connect_latency)
+
+    def do_GET(self):
+        if self.path.rstrip('/') == '/__stats':
+            self._send_json(200, self.server.stats())
+        else:
+            self._send_json(404, {'error': 'not found'})
+
+    def do_POST(self):
+        server = self.server
+        length = int(self.headers.get('Content-Length', 0))
+        raw = self.rfile.read(length)
+        rng = server.rng()
+        server.count('requests')
+
+        if self.path.rstrip('/') != '/calculate':
+            server.count('not_found')
+            self._send_json(404, {'error': 'not found'})
+            return
+
+        try:
+            payload = json.loads(raw or b'{}')
+        except ValueError:
+            server.count('bad_request')
+            self._send_json(400, {'error': 'invalid JSON'})
+            return
+
+        time.sleep(server.latency.sample(rng))
+
+        if rng.random() < server.error_rate:
+            server.count('injected_error')
+            self._send_json(503, {'error': 'stub injected error'})
+            return
+
+        key = canonical_cache_key(payload)
+        response = server.recordings.get(key)
+        if response is not None:
+            server.count('replayed')
+        elif server.unknown == 'synthesize':
+            server.count('synthesized')
+            response = synthetic_response(payload)
+        else:
+            server.count('unknown')
+            self._send_json(404, {'error': 'no recording for payload', 'key': key})
+            return
+
+        drip = rng.random() < server.drip_rate
+        if drip:
+            server.count('dripped')
+        self._send_json(200, response, drip=drip)
+
+    def _send_json(self, status: int, data: Dict[str, Any], drip: bool = False) -> None:
+        body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if not drip:
+            self.wfile.write(body)
+            return
+        # Slow-drip: odpowiedź w małych kawałkach z przerwami
+        chunk = max(1, self.server.drip_chunk)
+        for start in range(0, len(body), chunk):
+            self.wfile.write(body[start:start + chunk])
+            self.wfile.flush()
+            time.sleep(self.server.drip_interval)
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+
+class CieploStubServer(ThreadingHTTPServer):
+    """Wielowątkowy serwer HTTP/1.1 (keep-alive) udający api.cieplo.app"""
+
+    daemon_threads = True
+
+    def __init__(self, address=('127.0.0.1', 0), recordings: Optional[Dict[str, Any]] = None,
+                 latency: Any = 0.0, error_rate: float = 0.0, drip_rate: float = 0.0,
+                 drip_chunk: int = 16, drip_interval: float = 0.05,
+                 unknown: str = 'synthesize', seed: Optional[int] = None,
+                 connect_latency: float = 0.0):
+        super().__init__(address, _StubHandler)
+        self.recordings = recordings or {}
+        self.latency = LatencyModel.parse(latency)
+        self.error_rate = error_rate
+        self.drip_rate = drip_rate
+        self.drip_chunk = drip_chunk
+        self.drip_interval = drip_interval
+        self.unknown = unknown
+        self.connect_latency = connect_latency
+        self._seed = seed
+        self._local = threading.local()
+        self._streams = itertools.count()  # kolejny numer generatora - identyfikatory wątków nie są powtarzalne
+        self._counts = Counter()
+        self._count_lock = threading.Lock()
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def request_count(self) -> int:
+        with self._count_lock:
+            return self._counts['requests']
+
+    def reset_stats(self) -> None:
+        with self._count_lock:
+            self._counts.clear()
+
+    def rng(self) -> random.Random:
+        """Generator losowy na wątek (powtarzalny przy podanym seed - numerowany w kolejności pierwszego użycia)"""
+        rng = getattr(self._local, 'rng', None)
+        if rng is None:
+            with self._count_lock:
+                stream = next(self._streams)
+            seed = None if self._seed is None else self._seed * 1000003 + stream
+            rng = self._local.rng = random.Random(seed)
+        return rng
+
+    def count(self, name: str) -> None:
+        with self._count_lock:
+            self._counts[name] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._count_lock:
+            counts = dict(self._counts)
+        return {
+            'counts': counts,
+            'recordings': len(self.recordings),
+            'latency': str(self.latency),
+            'error_rate': self.error_rate,
+            'drip_rate': self.drip_rate
+        }
+
+
+def start_stub_server(**kwargs) -> Tuple[CieploStubServer, str]:
+    """Uruchom serwer w wątku tła i zwróć (server, base_url)"""
+    server = CieploStubServer(**kwargs)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, server.base_url
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Lokalny zastępnik api.cieplo.app')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5055)
+    parser.add_argument('--recordings', help='JSONL z nagraniami (CIEPLO_RECORD_PATH)')
+    parser.add_argument('--latency', default='0', help="np. 0.2, uniform:0.1:0.5, lognormal:0.3:0.5")
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--drip-rate', type=float, default=0.0)
+    parser.add_argument('--drip-chunk', type=int, default=16)
+    parser.add_argument('--drip-interval', type=float, default=0.05)
+    parser.add_argument('--unknown', choices=['synthesize', '404'], default='synthesize')
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--connect-latency', type=float, default=0.0,
+                        help='sekundy zestawienia nowego połączenia (np. 0.03 = uzgadnianie TLS z odległym hostem)')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    recordings = load_recordings(args.recordings) if args.recordings else {}
+    server = CieploStubServer(
+        (args.host, args.port), recordings=recordings, latency=args.latency,
+        error_rate=args.error_rate, drip_rate=args.drip_rate, drip_chunk=args.drip_chunk,
+        drip_interval=args.drip_interval, unknown=args.unknown, seed=args.seed,
+        connect_latency=args.connect_latency
+    )
+    logger.info(f"cieplo.app stand-in on {server.base_url} "
+                f"({len(recordings)} recordings, latency {server.latency})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
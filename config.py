@@ -31,7 +31,40 @@ class Config:
     # Application Settings
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file upload
     UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), '../uploads')
+
+    # PDF analysis (PDF_*), Groq limits and PDF jobs are read by pdf_analyzer / pdf_jobs /
+    # routes_api from the environment - the analyzer is created at import, before the app.
+    # Settings and defaults are listed in README-WYCENA2025.md (Environment Variables).
     
+    # cieplo.app proxy
+    CIEPLO_BASE_URL = os.environ.get("CIEPLO_BASE_URL", "https://api.cieplo.app")  # or a cieplo_stub_server.py instance
+    CIEPLO_RECORD_PATH = os.environ.get("CIEPLO_RECORD_PATH")  # JSONL of request/response pairs for the stand-in server
+    CIEPLO_POOL_SIZE = int(os.environ.get("CIEPLO_POOL_SIZE", 10))  # keep-alive connections per worker
+    CIEPLO_CACHE_TTL = int(os.environ.get("CIEPLO_CACHE_TTL", 86400))  # seconds, full-payload cache key
+    CIEPLO_CACHE_MAX_ENTRIES = int(os.environ.get("CIEPLO_CACHE_MAX_ENTRIES", 1000))
+    CIEPLO_CACHE_MAX_BYTES = int(os.environ.get("CIEPLO_CACHE_MAX_BYTES", 8 * 1024 * 1024))
+    CIEPLO_CACHE_BACKEND = os.environ.get("CIEPLO_CACHE_BACKEND", "memory")  # memory | sqlite (shared by workers)
+    CIEPLO_CACHE_PATH = os.environ.get("CIEPLO_CACHE_PATH")  # SQLite file, defaults to the temp dir
+    CIEPLO_CACHE_SOFT_TTL = int(os.environ.get("CIEPLO_CACHE_SOFT_TTL", 21600))  # serve stale + refresh in background after this
+    CIEPLO_REFRESH_WORKERS = int(os.environ.get("CIEPLO_REFRESH_WORKERS", 2))
+    CIEPLO_REFRESH_QUEUE = int(os.environ.get("CIEPLO_REFRESH_QUEUE", 32))  # max pending background refreshes
+    CIEPLO_COALESCE_TIMEOUT = float(os.environ.get("CIEPLO_COALESCE_TIMEOUT", 35))  # max wait on an identical in-flight call
+    CIEPLO_BREAKER_FAILURES = int(os.environ.get("CIEPLO_BREAKER_FAILURES", 5))  # consecutive failures that open the circuit
+    CIEPLO_BREAKER_RECOVERY = float(os.environ.get("CIEPLO_BREAKER_RECOVERY", 30))  # seconds open before a half-open trial
+    CIEPLO_TIMEOUT_MIN = float(os.environ.get("CIEPLO_TIMEOUT_MIN", 3))  # floor of the adaptive read timeout
+    CIEPLO_TIMEOUT_PERCENTILE = float(os.environ.get("CIEPLO_TIMEOUT_PERCENTILE", 99))
+    CIEPLO_TIMEOUT_MULTIPLIER = float(os.environ.get("CIEPLO_TIMEOUT_MULTIPLIER", 3))
+    CIEPLO_SURROGATE_ENABLED = os.environ.get("CIEPLO_SURROGATE_ENABLED", "true")  # local estimate when upstream is down
+    CIEPLO_SURROGATE_PATH = os.environ.get("CIEPLO_SURROGATE_PATH")  # JSONL of received results, survives restarts
+    CIEPLO_SURROGATE_MIN_SAMPLES = int(os.environ.get("CIEPLO_SURROGATE_MIN_SAMPLES", 3))
+    CIEPLO_POSTCODE_INDEX = os.environ.get("CIEPLO_POSTCODE_INDEX")  # binary postcode -> climate zone index, built if missing
+    CIEPLO_BATCH_MAX_ITEMS = int(os.environ.get("CIEPLO_BATCH_MAX_ITEMS", 500))  # buildings per /calculate-batch request
+    CIEPLO_BATCH_CONCURRENCY = int(os.environ.get("CIEPLO_BATCH_CONCURRENCY", 8))  # parallel upstream calls per batch
+    CIEPLO_HEALTH_WINDOW = float(os.environ.get("CIEPLO_HEALTH_WINDOW", 300))  # seconds of upstream stats behind /health
+    CIEPLO_HEALTH_MAX_ERROR_RATE = float(os.environ.get("CIEPLO_HEALTH_MAX_ERROR_RATE", 0.5))  # above this: degraded
+    CIEPLO_PROBE_INTERVAL = float(os.environ.get("CIEPLO_PROBE_INTERVAL", 60))  # min seconds between deep probes per host
+    CIEPLO_PROBE_STATE_PATH = os.environ.get("CIEPLO_PROBE_STATE_PATH")  # shared probe state file, defaults to the temp dir
+
     # Logging
     LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO")
     
@@ -2,7 +2,11 @@
 bind = "0.0.0.0:5000"
 workers = 1
 timeout = 90
-worker_class = "sync"
+# Threads: polling/SSE for PDF jobs and static assets are not blocked by a running analysis.
+# At most PDF_JOB_SSE_MAX_STREAMS (4) threads hold event streams, so the other
+# threads stay free for polling, health and calculator requests.
+worker_class = "gthread"
+threads = 8
 
 def on_starting(server):
     import signal
@@ -0,0 +1,157 @@
+"""
+Incremental JSON parsing of streamed LLM responses
+Members of the analysis object are decoded as soon as their value is closed,
+so found_data fields can be reported while the model is still generating and
+the stream can be cut once every schema key has arrived. Text before the
+first '{' and after the closing '}' is ignored.
+"""
+import json
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Top-level keys of the analysis schema (see PDFAIAnalyzer._build_analysis_prompt)
+SCHEMA_KEYS = (
+    'found_data',
+    'analysis_summary',
+    'data_quality',
+    'recommended_calculation_method',
+    'confidence_level',
+    'notes'
+)
+
+_WHITESPACE = ' \t\r\n'
+
+
+class _Frame:
+    """Open object or array; for objects the member currently being read"""
+    __slots__ = ('kind', 'key', 'value_start')
+
+    def __init__(self, kind: str):
+        self.kind = kind
+        self.key: Optional[str] = None
+        self.value_start: Optional[int] = None
+
+
+class StreamingAnalysisParser:
+    """Feed response chunks, get (field, value) pairs of found_data as they complete
+
+    `result` holds the top-level members decoded so far; `complete` turns
+    true when the object is closed or all SCHEMA_KEYS are present.
+    """
+
+    def __init__(self, schema_keys: Tuple[str, ...] = SCHEMA_KEYS):
+        self.schema_keys = schema_keys
+        self.result: Dict[str, Any] = {}
+        self.found_data: Dict[str, Any] = {}
+        self.closed = False
+        self._text = ''
+        self._pos = 0
+        self._frames: List[_Frame] = []
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._string_is_key = False
+        self._events: List[Tuple[str, Any]] = []
+
+    @property
+    def received(self) -> int:
+        """Characters of response text consumed so far"""
+        return len(self._text)
+
+    @property
+    def complete(self) -> bool:
+        return self.closed or all(key in self.result for key in self.schema_keys)
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        """Consume a chunk; returns found_data members completed by it"""
+        if self.closed or not chunk:
+            return []
+        self._text += chunk
+        text = self._text
+        frames = self._frames
+
+        for i in range(self._pos, len(text)):
+            c = text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == '\\':
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                    self._string_closed(i)
+                continue
+
+            if not frames:
+                # Prose before the JSON object
+                if c == '{':
+                    frames.append(_Frame('object'))
+                continue
+
+            frame = frames[-1]
+            if c in _WHITESPACE or c == ':':
+                continue
+            if c == '"':
+                self._in_string = True
+                self._string_start = i
+                self._string_is_key = frame.kind == 'object' and frame.key is None
+                if not self._string_is_key and frame.kind == 'object' and frame.value_start is None:
+                    frame.value_start = i
+            elif c in '{[':
+                if frame.kind == 'object' and frame.key is not None and frame.value_start is None:
+                    frame.value_start = i
+                frames.append(_Frame('object' if c == '{' else 'array'))
+            elif c in '}]':
+                self._complete_member(frame, i)
+                frames.pop()
+                if not frames:
+                    self.closed = True
+                    self._pos = i + 1
+                    break
+                parent = frames[-1]
+                if parent.value_start is not None:
+                    self._complete_member(parent, i + 1)
+            elif c == ',':
+                self._complete_member(frame, i)
+            elif frame.kind == 'object' and frame.key is not None and frame.value_start is None:
+                frame.value_start = i  # number, true, false, null
+        else:
+            self._pos = len(text)
+
+        events, self._events = self._events, []
+        return events
+
+    def _string_closed(self, end: int) -> None:
+        frame = self._frames[-1]
+        raw = self._text[self._string_start:end + 1]
+        if self._string_is_key:
+            frame.key = json.loads(raw)
+        elif frame.kind == 'object' and frame.value_start is not None:
+            self._complete_member(frame, end + 1)
+
+    def _complete_member(self, frame: _Frame, end: int) -> None:
+        if frame.kind != 'object' or frame.key is None or frame.value_start is None:
+            return
+        key, raw = frame.key, self._text[frame.value_start:end].strip()
+        frame.key = frame.value_start = None
+        try:
+            value = json.loads(raw)
+        except ValueError:
+            logger.debug(f"Skipping undecodable member {key!r}: {raw[:80]!r}")
+            return
+
+        depth = len(self._frames)
+        if frame is self._frames[0]:
+            self.result[key] = value
+        elif depth == 2 and frame is self._frames[1] and self._frames[0].key == 'found_data':
+            self.found_data[key] = value
+            self._events.append((key, value))
+
+
+def parse_analysis(text: str) -> Optional[Dict[str, Any]]:
+    """Whole-response variant: the first JSON object in `text`, prose around it ignored"""
+    parser = StreamingAnalysisParser()
+    parser.feed(text)
+    return parser.result or None
@@ -0,0 +1,254 @@
+"""
+Near-duplicate detection of project documents
+Catalog house designs ("projekt gotowy") arrive from many clients with another
+cover page, issue date or metadata, so file hashes never match. The extracted
+text is fingerprinted with MinHash over word shingles and kept in a SQLite
+index with LSH banding; an upload similar enough to an indexed document reuses
+its analysis once the pages that differ have been checked.
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import struct
+import threading
+import time
+from typing import Any, Dict, List, NamedTuple, Optional
+
+from page_ranking import PAGE_MARKER, split_pages
+
+logger = logging.getLogger(__name__)
+
+SHINGLE_WORDS = 5
+NUM_PERM = 64
+BANDS = 16  # 4 rows per band: candidates from ~0.5 similarity, ~1.0 recall at 0.9
+
+_EMPTY = 1 << 63
+_VALUE_BITS = 58  # 64-bit shingle hash = 6 bits of bin + 58 bits of value
+_ROWS = NUM_PERM // BANDS
+_SIGNATURE = struct.Struct(f'<{NUM_PERM}Q')
+_WORD_RE = re.compile(r'\w+')
+
+
+class Fingerprint(NamedTuple):
+    signature: List[int]
+    pages: Dict[int, str]  # page number -> digest of its normalised text
+
+
+class Match(NamedTuple):
+    similarity: float
+    sha256: str
+    pages: Dict[int, str]
+    analysis: Dict[str, Any]
+    age: float
+
+
+def _words(text: str) -> List[str]:
+    return _WORD_RE.findall(text.lower())
+
+
+def _hash64(data: str) -> int:
+    return int.from_bytes(hashlib.blake2b(data.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+def minhash(text: str) -> List[int]:
+    """MinHash signature of the word shingles of `text` (page markers ignored)
+
+    One-permutation variant: each shingle hash lands in one of NUM_PERM bins
+    and the bin keeps its minimum - one hash per shingle instead of NUM_PERM,
+    so a 300-page project stays in the tens of milliseconds. Empty bins
+    borrow the next filled bin to the right (tagged with the distance).
+    """
+    words = _words(PAGE_MARKER.sub(' ', text))
+    signature = [_EMPTY] * NUM_PERM
+    for i in range(max(1, len(words) - SHINGLE_WORDS + 1)):
+        digest = _hash64(' '.join(words[i:i + SHINGLE_WORDS]))
+        slot, value = digest % NUM_PERM, digest >> (64 - _VALUE_BITS)
+        if value < signature[slot]:
+            signature[slot] = value
+    if any(value != _EMPTY for value in signature):
+        original = list(signature)
+        for slot in range(NUM_PERM):
+            if original[slot] == _EMPTY:
+                distance = next(d for d in range(1, NUM_PERM) if original[(slot + d) % NUM_PERM] != _EMPTY)
+                signature[slot] = original[(slot + distance) % NUM_PERM] | (distance << _VALUE_BITS)
+    return signature
+
+
+def similarity(first: List[int], second: List[int]) -> float:
+    """Estimated Jaccard similarity of the shingle sets"""
+    return sum(1 for a, b in zip(first, second) if a == b) / NUM_PERM
+
+
+def fingerprint(pdf_text: str) -> Fingerprint:
+    """Signature of extract_text_from_pdf output plus a digest per page"""
+    pages = {number: hashlib.blake2b(' '.join(_words(text)).encode('utf-8'), digest_size=12).hexdigest()
+             for number, text in split_pages(pdf_text)}
+    return Fingerprint(minhash(pdf_text), pages)
+
+
+def changed_pages(current: Fingerprint, indexed_pages: Dict[int, str]) -> List[int]:
+    """Pages of `current` whose text appears nowhere in the indexed document
+
+    Compared by content, not position - an added or removed cover page does
+    not mark every following page as changed.
+    """
+    known = set(indexed_pages.values())
+    return [number for number, digest in current.pages.items() if digest not in known]
+
+
+def _buckets(signature: List[int]) -> List[int]:
+    """LSH bucket per band (signed 64-bit - SQLite INTEGER)"""
+    buckets = []
+    for band in range(BANDS):
+        rows = struct.pack(f'<{_ROWS}Q', *signature[band * _ROWS:(band + 1) * _ROWS])
+        buckets.append(int.from_bytes(hashlib.blake2b(rows, digest_size=8).digest(), 'big', signed=True))
+    return buckets
+
+
+class NearDuplicateIndex:
+    """MinHash signatures of analysed documents in a SQLite file (WAL) shared by workers
+
+    Candidates come from LSH band buckets; the best one at or above
+    `threshold` estimated similarity is returned. Entries older than `ttl`
+    are ignored and purged with the least recently matched ones over
+    `max_entries`.
+    """
+
+    def __init__(self, path: str, threshold: float = 0.9, ttl: float = 30 * 86400,
+                 max_entries: Optional[int] = 5000, timeout: float = 5.0):
+        self.path = path
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._counters = {'lookups': 0, 'hits': 0, 'misses': 0, 'candidates': 0, 'added': 0}
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = self._connect()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS documents ("
+            " id INTEGER PRIMARY KEY,"
+            " namespace TEXT NOT NULL,"
+            " sha256 TEXT NOT NULL,"
+            " signature BLOB NOT NULL,"
+            " pages TEXT NOT NULL,"
+            " analysis TEXT NOT NULL,"
+            " stored_at REAL NOT NULL,"
+            " accessed_at REAL NOT NULL,"
+            " UNIQUE (namespace, sha256))"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS bands ("
+            " band INTEGER NOT NULL,"
+            " bucket INTEGER NOT NULL,"
+            " document INTEGER NOT NULL,"
+            " PRIMARY KEY (band, bucket, document)) WITHOUT ROWID"
+        )
+        logger.info(f"Near-duplicate index ready: {path}")
+
+    def _connect(self) -> sqlite3.Connection:
+        """One connection per thread (and per process - recreated after fork)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _count(self, **increments: int) -> None:
+        with self._lock:
+            for name, value in increments.items():
+                self._counters[name] += value
+
+    def find(self, namespace: str, current: Fingerprint) -> Optional[Match]:
+        """Most similar indexed document of the namespace, None below the threshold"""
+        now = time.time()
+        buckets = _buckets(current.signature)
+        params: List[Any] = [namespace, now - self.ttl]
+        for band, bucket in enumerate(buckets):
+            params.extend((band, bucket))
+        try:
+            conn = self._connect()
+            rows = conn.execute(
+                "SELECT id, sha256, signature, pages, analysis, stored_at FROM documents"
+                " WHERE namespace = ? AND stored_at > ? AND id IN (SELECT document FROM bands WHERE "
+                + " OR ".join(["(band = ? AND bucket = ?)"] * BANDS) + ")",
+                params
+            ).fetchall()
+            best = None
+            for row in rows:
+                score = similarity(current.signature, list(_SIGNATURE.unpack(row[2])))
+                if score >= self.threshold and (best is None or score > best[0]):
+                    best = (score, row)
+            self._count(lookups=1, candidates=len(rows), hits=int(best is not None), misses=int(best is None))
+            if best is None:
+                return None
+
+            score, (document, sha256, _, pages, analysis, stored_at) = best
+            conn.execute("UPDATE documents SET accessed_at = ? WHERE id = ?", (now, document))
+            return Match(score, sha256, {int(number): digest for number, digest in json.loads(pages).items()},
+                         json.loads(analysis), now - stored_at)
+        except sqlite3.Error as e:
+            # A broken index only costs the LLM call it would have saved
+            logger.warning(f"Near-duplicate lookup failed: {e}")
+            self._count(lookups=1, misses=1)
+            return None
+
+    def add(self, namespace: str, sha256: str, current: Fingerprint, analysis: Dict[str, Any]) -> None:
+        now = time.time()
+        try:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute("DELETE FROM bands WHERE document IN "
+                             "(SELECT id FROM documents WHERE namespace = ? AND sha256 = ?)", (namespace, sha256))
+                document = conn.execute(
+                    "INSERT OR REPLACE INTO documents"
+                    " (namespace, sha256, signature, pages, analysis, stored_at, accessed_at)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (namespace, sha256, _SIGNATURE.pack(*current.signature), json.dumps(current.pages),
+                     json.dumps(analysis, ensure_ascii=False), now, now)
+                ).lastrowid
+                conn.executemany("INSERT OR IGNORE INTO bands (band, bucket, document) VALUES (?, ?, ?)",
+                                 [(band, bucket, document) for band, bucket in enumerate(_buckets(current.signature))])
+                self._purge(conn, now)
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            self._count(added=1)
+        except sqlite3.Error as e:
+            logger.warning(f"Near-duplicate index write failed: {e}")
+
+    def _purge(self, conn: sqlite3.Connection, now: float) -> None:
+        """Drop expired documents and the least recently matched over the limit, with their bands"""
+        removed = conn.execute("DELETE FROM documents WHERE stored_at <= ?", (now - self.ttl,)).rowcount
+        if self.max_entries:
+            removed += conn.execute(
+                "DELETE FROM documents WHERE id IN ("
+                " SELECT id FROM documents ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            ).rowcount
+        if removed > 0:
+            conn.execute("DELETE FROM bands WHERE document NOT IN (SELECT id FROM documents)")
+
+    def __len__(self) -> int:
+        try:
+            return self._connect().execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+        except sqlite3.Error:
+            return 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters of this process + size of the shared index"""
+        with self._lock:
+            stats = dict(self._counters)
+        stats['hit_rate'] = round(stats['hits'] / stats['lookups'], 4) if stats['lookups'] else None
+        stats.update(path=self.path, entries=len(self), threshold=self.threshold, max_entries=self.max_entries)
+        return stats
@@ -0,0 +1,179 @@
+"""
+Page relevance ranking
+Scores extracted PDF pages for the heat pump sizing fields and packs the
+best pages into the LLM text budget instead of cutting the text blindly
+"""
+import math
+import re
+from typing import List, Tuple
+
+PAGE_MARKER = re.compile(r'\n--- Strona (\d+) ---\n')
+
+# Start of a section heading line: "3.2 Instalacja c.o.", "CHARAKTERYSTYKA ENERGETYCZNA"
+_HEADING_RE = re.compile(r'\n(?=\d+(?:\.\d+)*\.?[ \t]+[A-ZĄĆĘŁŃÓŚŹŻ]|[A-ZĄĆĘŁŃÓŚŹŻ][A-ZĄĆĘŁŃÓŚŹŻ0-9 ,.\-]{5,}\n)')
+
+# Field keywords (weight, pattern) matched against lower-cased text - Polish,
+# with and without diacritics
+_FIELD_PATTERNS = {
+    'powierzchnia_uzytkowa': (4.0, r'powierzchni[aąe]\s+u[żz]ytkow'),
+    'wskaznik_eu': (5.0, r'\beu\b|energi[iae]\s+u[żz]ytkow'),
+    'wskaznik_ep': (2.0, r'\bep\b|energi[iae]\s+pierwotn'),
+    'zapotrzebowanie_cieplo': (4.0, r'zapotrzebowani[ea]\s+na\s+(?:ciep[łl]o|energi)'),
+    'moc_grzewcza': (4.0, r'moc\s+(?:grzewcz|ciepln)|obci[ąa][żz]eni[ea]\s+ciepln'),
+    'temperatura_projektowa': (3.0, r'(?:projektow|obliczeniow)\w*\s+temperatur\w*\s+zewn'
+                                     r'|temperatur\w*\s+(?:projektow|obliczeniow)\w*\s+zewn'),
+    'charakterystyka': (5.0, r'charakterystyk[aiy]\s+energetyczn|[śs]wiadectw[oa]\s+energetyczn'),
+    'strefa': (2.0, r'stref[aąy]\s+klimatyczn'),
+    'przegrody': (1.5, r'wsp[óo][łl]czynnik\w*\s+przenikani|\bu\s*=\s*\d'),
+    'lokalizacja': (1.5, r'lokalizacj|miejscowo[śs][ćc]|dzia[łl]k[ai]\s+nr'),
+    'standard': (1.5, r'energooszcz[ęe]dn|pasywn|wt\s*20(?:17|21)'),
+    'rodzaj_budynku': (1.0, r'budyn\w*\s+mieszkaln|jednorodzinn'),
+}
+
+_FIELD_RES = [(name, weight, re.compile(pattern))
+              for name, (weight, pattern) in _FIELD_PATTERNS.items()]
+
+# Numbers with the units of the target fields (lower-cased text)
+_UNIT_RES = [
+    (4.0, re.compile(r'\d[\d.,]*\s?kwh\s*/\s*\(?\s*m\s*(?:2|²)\s*(?:[·*.x×]|\s)?\s*(?:rok|a)\b')),
+    (2.5, re.compile(r'\d[\d.,]*\s?kwh\s*/\s*(?:rok|a)\b')),
+    (2.5, re.compile(r'\d[\d.,]*\s*kw\b')),
+    (1.0, re.compile(r'\d[\d.,]*\s*m\s*(?:2|²)(?![\d/])')),
+    (1.0, re.compile(r'-\s?\d{2}\s*°?\s*c\b')),
+]
+
+_NUMBER_RE = re.compile(r'\d+(?:[.,]\d+)?')
+
+
+def split_pages(pdf_text: str) -> List[Tuple[int, str]]:
+    """Split extract_text_from_pdf output back into (page number, text)"""
+    parts = PAGE_MARKER.split(pdf_text)
+    pages = []
+    # parts: [preamble, number, text, number, text, ...]
+    for i in range(1, len(parts) - 1, 2):
+        pages.append((int(parts[i]), parts[i + 1].strip('\n')))
+    if not pages and pdf_text.strip():
+        pages.append((1, pdf_text))
+    return pages
+
+
+def score_page(text: str) -> float:
+    """Relevance of one page: distinct fields, unit-bearing numbers and table density"""
+    if not text.strip():
+        return 0.0
+
+    text = text.lower()
+    score = 0.0
+    fields = 0
+    for _, weight, pattern in _FIELD_RES:
+        hits = len(pattern.findall(text))
+        if hits:
+            fields += 1
+            # Diminishing returns - a repeated header must not outweigh a new field
+            score += weight * (1 + math.log(hits))
+
+    for weight, pattern in _UNIT_RES:
+        hits = len(pattern.findall(text))
+        if hits:
+            score += weight * (1 + math.log(hits))
+
+    # Tables: share of lines carrying two or more numbers
+    lines = [line for line in text.splitlines() if line.strip()]
+    if lines:
+        numeric = sum(1 for line in lines if len(_NUMBER_RE.findall(line)) >= 2)
+        score += 3.0 * numeric / len(lines)
+
+    # Pages that cover several target fields at once (energy certificate)
+    score *= 1 + 0.15 * max(0, fields - 1)
+    return score
+
+
+def _page_block(number: int, text: str) -> str:
+    return f"\n--- Strona {number} ---\n{text}\n"
+
+
+def select_relevant_text(pdf_text: str, budget: int) -> Tuple[str, List[int]]:
+    """Pack the highest scoring pages into `budget` characters, kept in document order
+
+    Returns (text, selected page numbers). A top page that does not fit on
+    its own is trimmed to the remaining budget.
+    """
+    if len(pdf_text) <= budget:
+        return pdf_text, [number for number, _ in split_pages(pdf_text)]
+
+    pages = split_pages(pdf_text)
+    ranked = sorted(pages, key=lambda page: score_page(page[1]), reverse=True)
+
+    selected = {}
+    remaining = budget
+    for number, text in ranked:
+        block_length = len(_page_block(number, text))
+        if block_length <= remaining:
+            selected[number] = text
+            remaining -= block_length
+        elif not selected and remaining > 200:
+            selected[number] = text[:remaining - 100]
+            remaining = 0
+        if remaining < 200:
+            break
+
+    blocks = [_page_block(number, selected[number]) for number, _ in pages if number in selected]
+    skipped = len(pages) - len(selected)
+    if skipped:
+        blocks.append(f"\n[POMINIĘTO {skipped} STRON O NISKIEJ ISTOTNOŚCI]")
+    return ''.join(blocks), sorted(selected)
+
+
+def _pack(pieces: List[str], size: int, separator: str) -> List[str]:
+    """Greedily join consecutive pieces into parts of at most `size` characters"""
+    parts: List[str] = []
+    current = ''
+    for piece in pieces:
+        joined = f"{current}{separator}{piece}" if current else piece
+        if len(joined) <= size:
+            current = joined
+            continue
+        if current:
+            parts.append(current)
+        current = piece
+    if current:
+        parts.append(current)
+    return parts
+
+
+def _split_long_page(text: str, size: int) -> List[str]:
+    """Page text over `size`: split at section headings, then paragraphs, lines, characters"""
+    parts = _pack(_HEADING_RE.split(text), size, '\n')
+    for separator in ('\n\n', '\n'):
+        parts = [part for piece in parts
+                 for part in (_pack(piece.split(separator), size, separator) if len(piece) > size else [piece])]
+    return [part[i:i + size] for part in parts for i in range(0, len(part), size)]
+
+
+def chunk_pages(pdf_text: str, chunk_size: int) -> List[Tuple[List[int], str]]:
+    """Split extracted text into chunks of whole pages for separate analysis
+
+    Returns (page numbers, text with page markers) per chunk, in document
+    order. A page that does not fit a chunk on its own is split at its
+    section headings.
+    """
+    chunks: List[Tuple[List[int], str]] = []
+    numbers: List[int] = []
+    blocks: List[str] = []
+    length = 0
+    for number, text in split_pages(pdf_text):
+        block = _page_block(number, text)
+        if length + len(block) > chunk_size and blocks:
+            chunks.append((numbers, ''.join(blocks)))
+            numbers, blocks, length = [], [], 0
+        if len(block) > chunk_size:
+            marker_length = len(block) - len(text)
+            for part in _split_long_page(text, chunk_size - marker_length):
+                chunks.append(([number], _page_block(number, part)))
+            continue
+        numbers.append(number)
+        blocks.append(block)
+        length += len(block)
+    if blocks:
+        chunks.append((numbers, ''.join(blocks)))
+    return chunks
@@ -161,18 +161,106 @@
             analyzeBtn.innerHTML = '<i class="fas fa-spinner fa-spin"></i> Analizowanie...';
         }
         
-        // Simulate progress
-        let progress = 0;
-        const progressInterval = setInterval(() => {
-            progress += Math.random() * 15;
-            if (progress > 90) progress = 90;
+        // Real progress from the analysis job stages
+        const stageTexts = {
+            queued: 'Oczekiwanie w kolejce...',
+            extracting: 'Odczytywanie tekstu z projektu...',
+            analysing: 'Analiza AI projektu...',
+            calculating: 'Obliczanie zapotrzebowania na ciepło...'
+        };
+
+        const fieldLabels = {
+            powierzchnia_uzytkowa: 'powierzchnia użytkowa',
+            wskaznik_eu: 'wskaźnik EU',
+            lokalizacja: 'lokalizacja',
+            zapotrzebowanie_cieplo: 'zapotrzebowanie na ciepło',
+            moc_grzewcza: 'moc grzewcza',
+            temperatura_projektowa: 'temperatura projektowa',
+            rodzaj_budynku: 'rodzaj budynku',
+            standard_energetyczny: 'standard energetyczny'
+        };
+
+        // A found_data value is known before the analysis finishes
+        function showField(field, value) {
+            if (progressText && value !== null && value !== undefined && fieldLabels[field]) {
+                progressText.textContent = `Odczytano: ${fieldLabels[field]} = ${value}`;
+            }
+        }
+
+        function showProgress(progress, stage) {
             if (progressFill) {
                 progressFill.style.width = progress + '%';
             }
             if (progressText) {
-                progressText.textContent = `Analizowanie projektu... ${Math.round(progress)}%`;
+                progressText.textContent = `${stageTexts[stage] || 'Analizowanie projektu...'} ${Math.round(progress)}%`;
             }
-        }, 200);
+        }
+
+        // Job events over SSE, polling when EventSource is unavailable or the stream drops
+        function waitForJob(job) {
+            return new Promise((resolve, reject) => {
+                const finish = (payload) => {
+                    if (payload.status === 'done') {
+                        resolve({ status: 'success', data: payload.data });
+                    } else {
+                        reject(new Error(payload.error || 'Błąd analizy PDF'));
+                    }
+                };
+
+                const poll = () => {
+                    fetch(job.status_url)
+                        .then(response => response.json())
+                        .then(payload => {
+                            if (payload.status === 'done' || payload.status === 'error') {
+                                finish(payload);
+                                return;
+                            }
+                            showProgress(payload.progress || 0, payload.stage);
+                            setTimeout(poll, 1000);
+                        })
+                        .catch(reject);
+                };
+
+                if (typeof window.EventSource !== 'function') {
+                    poll();
+                    return;
+                }
+
+                const source = new EventSource(job.events_url);
+                // The server ends each response after ~25 s; the browser reconnects on its own
+                // and resumes from Last-Event-ID. Polling only when it gives up or keeps failing.
+                let failures = 0;
+                Object.keys(stageTexts).forEach(stage => {
+                    source.addEventListener(stage, event => {
+                        failures = 0;
+                        const data = JSON.parse(event.data);
+                        showProgress(data.progress, data.stage);
+                    });
+                });
+                source.addEventListener('field', event => {
+                    failures = 0;
+                    const data = JSON.parse(event.data);
+                    showField(data.field, data.value);
+                });
+                source.addEventListener('result', event => {
+                    source.close();
+                    finish(JSON.parse(event.data));
+                });
+                source.onopen = () => {
+                    failures = 0;
+                };
+                source.onerror = () => {
+                    failures += 1;
+                    if (source.readyState === EventSource.CONNECTING && failures < 3) {
+                        return;
+                    }
+                    source.close();
+                    poll();
+                };
+            });
+        }
+
+        showProgress(0, 'queued');
         
         // Prepare form data
         const formData = new FormData();
@@ -186,7 +274,7 @@
             fileSize: formData.get('file')?.size
         });
         
-        fetch('/api/analyze-pdf', {
+        fetch('/api/analyze-pdf?async=1', {
             method: 'POST',
             body: formData
         })
@@ -207,8 +295,8 @@
             }
             return response.json();
         })
+        .then(data => data.status === 'accepted' ? waitForJob(data) : data)
         .then(data => {
-            clearInterval(progressInterval);
             if (progressFill) {
                 progressFill.style.width = '100%';
             }
@@ -242,7 +330,6 @@
             }
         })
         .catch(error => {
-            clearInterval(progressInterval);
             console.error('❌ AI analysis failed:', error);
             
             if (progressSection) {
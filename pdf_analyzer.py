@@ -3,12 +3,28 @@ Refactored PDF AI Analyzer Service
 Improved error handling, configuration, and maintainability
 """
 import os
-import json
 import logging
+import mmap
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Dict, Any, Optional, Union
+from typing import Callable, Dict, Any, Optional, Tuple, Union
 from io import BytesIO
 
+from analysis_merge import merge_analyses
+from llm_stream import StreamingAnalysisParser, parse_analysis
+from near_duplicates import Fingerprint, NearDuplicateIndex, changed_pages, fingerprint
+from page_ranking import chunk_pages, score_page, select_relevant_text, split_pages
+from pdf_extract import ParallelExtractor, iter_pages_sequential, page_content_key
+from pdf_sandbox import ExtractionLimitExceeded, SandboxPool
+from pdf_upload import PDFUpload, UploadRejected, inspect_pdf, spool_upload
+from resilience import RateLimitTimeout, TokenBucketLimiter, backoff_delay
+from result_cache import SQLiteCache, TTLCache
+from rule_extractor import (FIELD_RANGES, FOUND_DATA_FIELDS, FieldDetector, build_rule_analysis,
+                            extract_fields, is_sufficient, missing_fields)
+
 try:
     import PyPDF2
     from PyPDF2 import PdfReader
@@ -25,6 +41,24 @@ except ImportError:
 
 logger = logging.getLogger(__name__)
 
+# Bump when the prompt or result format changes - old cache entries stop matching
+PROMPT_VERSION = '3'
+
+# data_quality values in increasing order (cascade threshold)
+QUALITY_RANK = {'insufficient': 0, 'partial': 1, 'good': 2}
+
+# Error of an analysis the rate limiter did not let through in time
+RATE_LIMIT_ERROR = "Przekroczono limit zapytań do AI - spróbuj ponownie za chwilę"
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    """Retry-After of an API error response in seconds, None when absent"""
+    response = getattr(error, 'response', None)
+    try:
+        return float(response.headers.get('retry-after'))
+    except (AttributeError, TypeError, ValueError):
+        return None
+
 class PDFAnalyzerError(Exception):
     """Custom exception for PDF analyzer errors"""
     pass
@@ -36,15 +70,102 @@ class PDFAIAnalyzer:
         """Initialize the AI PDF analyzer"""
         self.api_key = api_key or os.environ.get('GROQ_API_KEY')
         self.model = model
+        # Model cascade: cheaper tiers tried first, `model` is the last resort
+        cheap_tiers = [name.strip() for name in
+                       os.environ.get('PDF_MODEL_CASCADE', 'llama-3.1-8b-instant').split(',') if name.strip()]
+        self.models = tuple(name for name in cheap_tiers if name != model) + (model,)
+        self.cascade_min_confidence = float(os.environ.get('PDF_CASCADE_MIN_CONFIDENCE', 0.8))
+        self.cascade_min_quality = os.environ.get('PDF_CASCADE_MIN_QUALITY', 'partial')
+        self.cascade_max_escalations = int(os.environ.get('PDF_CASCADE_MAX_ESCALATIONS', 1))
+        self.cascade_token_budget = int(os.environ.get('PDF_CASCADE_TOKEN_BUDGET', 16000))
         self.client = None
         self._initialized = False
+        self.cache = self._create_cache()
+        # Catalog house designs from many clients: analyses reused across near-identical text
+        self.near_duplicates = self._create_near_duplicate_index()
+        self.near_dup_max_changed = float(os.environ.get('PDF_NEAR_DUP_MAX_CHANGED_PAGES', 0.2))
+
+        # Large projects: pages extracted in a process pool
+        self.page_timeout = float(os.environ.get('PDF_PAGE_TIMEOUT', 10))
+        self.parallel_min_pages = int(os.environ.get('PDF_PARALLEL_MIN_PAGES', 16))
+        extract_workers = int(os.environ.get('PDF_EXTRACT_WORKERS', os.cpu_count() or 1))
+        # Untrusted PDFs parsed in sandboxed worker processes with CPU, memory and time limits;
+        # the per-page process pool is used only without the sandbox
+        self.sandbox = self._create_sandbox()
+        self.extractor = (ParallelExtractor(extract_workers, page_timeout=self.page_timeout)
+                          if extract_workers > 1 and self.sandbox is None else None)
+
+        # Pages extracted lazily: stop once the rules have what the calculation needs,
+        # page text reused across documents by page content hash
+        self.early_stop = os.environ.get('PDF_EARLY_STOP', 'true').lower() in ('1', 'true', 'yes')
+        page_cache_bytes = int(os.environ.get('PDF_PAGE_CACHE_MAX_BYTES', 32 * 1024 * 1024))
+        self.page_cache = (TTLCache(ttl=int(os.environ.get('PDF_PAGE_CACHE_TTL', 86400)),
+                                    max_entries=int(os.environ.get('PDF_PAGE_CACHE_MAX_ENTRIES', 20000)),
+                                    max_bytes=page_cache_bytes)
+                           if page_cache_bytes > 0 else None)
+
+        # Uploads: spooled to disk and pre-checked before PyPDF2 sees them
+        self.max_bytes = int(os.environ.get('PDF_MAX_BYTES', 16 * 1024 * 1024))
+        self.max_pages = int(os.environ.get('PDF_MAX_PAGES', 300))
+
+        # Rule-based fast path: the LLM is asked only for what the rules could not find
+        self.rules_enabled = os.environ.get('PDF_RULES_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+        # Streamed JSON-mode completions: fields reported as they arrive
+        self.stream_responses = os.environ.get('PDF_LLM_STREAM', 'true').lower() in ('1', 'true', 'yes')
+        self.json_mode = os.environ.get('PDF_LLM_JSON_MODE', 'true').lower() in ('1', 'true', 'yes')
+        # Long documents: analysed in chunks in parallel, results merged per field
+        # Off by default: at the free-tier 6000 TPM two chunks never fit the bucket at once
+        self.map_reduce = os.environ.get('PDF_MAP_REDUCE', 'false').lower() in ('1', 'true', 'yes')
+        self.map_chunk_chars = int(os.environ.get('PDF_MAP_CHUNK_CHARS', 12000))
+        self.map_max_chunks = int(os.environ.get('PDF_MAP_MAX_CHUNKS', 6))
+        self.map_concurrency = int(os.environ.get('PDF_MAP_CONCURRENCY', 6))
+        # Shared Groq rate limits (requests and prompt tokens per minute, per model)
+        self.limiter = self._create_limiter()
+        self.queue_timeout = float(os.environ.get('PDF_GROQ_QUEUE_TIMEOUT', 60))
+        self.max_retries = int(os.environ.get('PDF_GROQ_MAX_RETRIES', 3))
+        self.backoff_base = float(os.environ.get('PDF_GROQ_BACKOFF_BASE', 0.5))
+        self.backoff_cap = float(os.environ.get('PDF_GROQ_BACKOFF_CAP', 20))
+        self._stats_lock = threading.Lock()
+        self._extraction_stats = {
+            'documents': 0,
+            'llm_skipped': 0,
+            'llm_calls': 0,
+            'fields_from_rules': 0,
+            'fields_requested_from_llm': 0,
+            'llm_streamed': 0,
+            'llm_early_stops': 0,
+            'llm_seconds': 0.0,
+            'llm_first_field_seconds': 0.0,
+            'llm_retries': 0,
+            'llm_rate_limited': 0,
+            'llm_server_errors': 0,
+            'llm_queue_timeouts': 0,
+            'map_reduce_documents': 0,
+            'map_chunks': 0,
+            'map_chunks_failed': 0,
+            'map_chunks_dropped': 0,
+            'map_chunks_rate_limited': 0,
+            'map_budget_single_calls': 0,
+            'map_unit_corrections': 0,
+            'map_conflicts': 0,
+            'pages_extracted': 0,
+            'pages_skipped': 0,
+            'extraction_early_stops': 0,
+            'near_dup_hits': 0,
+            'near_dup_rejected': 0,
+            'near_dup_conflicts': 0,
+            'near_dup_fields_from_changed_pages': 0
+        }
+        self._tier_stats = {name: {'calls': 0, 'accepted': 0, 'escalated': 0, 'failed': 0,
+                                   'tokens': 0, 'seconds': 0.0}
+                            for name in self.models}
 
         # Try to initialize immediately if we have an API key
         if self.api_key:
             try:
                 self._validate_dependencies()
                 if Groq is not None:
-                    self.client = Groq(api_key=self.api_key)
+                    self.client = Groq(api_key=self.api_key, max_retries=0)  # retries go through the limiter
                     self._initialized = True
                     logger.info("PDF AI Analyzer initialized successfully in constructor")
             except Exception as e:
@@ -61,7 +182,7 @@ class PDFAIAnalyzer:
 
             if Groq is None:
                 raise PDFAnalyzerError("Groq module not available")
-            self.client = Groq(api_key=self.api_key)
+            self.client = Groq(api_key=self.api_key, max_retries=0)  # retries go through the limiter
             self._initialized = True
             logger.info("PDF AI Analyzer initialized successfully")
 
@@ -70,6 +191,162 @@ class PDFAIAnalyzer:
             # Don't raise - allow app to continue without PDF analysis
             self._initialized = False
 
+    def _create_cache(self) -> Optional[SQLiteCache]:
+        """Disk cache of analysis results keyed by file SHA-256, model and prompt version"""
+        if os.environ.get('PDF_CACHE_ENABLED', 'true').lower() not in ('1', 'true', 'yes'):
+            return None
+        path = os.environ.get('PDF_CACHE_PATH') or os.path.join(
+            tempfile.gettempdir(), 'wycena2025_pdf_cache.sqlite3')
+        try:
+            return SQLiteCache(
+                path,
+                ttl=int(os.environ.get('PDF_CACHE_TTL', 7 * 86400)),
+                max_entries=int(os.environ.get('PDF_CACHE_MAX_ENTRIES', 1000)),
+                max_bytes=int(os.environ.get('PDF_CACHE_MAX_BYTES', 64 * 1024 * 1024)),
+                purge_every=1  # few writes, enforce the limits on each one
+            )
+        except Exception as e:
+            logger.warning(f"PDF result cache disabled: {e}")
+            return None
+
+    def _create_near_duplicate_index(self) -> Optional[NearDuplicateIndex]:
+        """MinHash index of analysed documents, shared by workers like the result cache"""
+        if os.environ.get('PDF_NEAR_DUP', 'true').lower() not in ('1', 'true', 'yes'):
+            return None
+        path = os.environ.get('PDF_NEAR_DUP_PATH') or os.path.join(
+            tempfile.gettempdir(), 'wycena2025_pdf_near_duplicates.sqlite3')
+        try:
+            return NearDuplicateIndex(
+                path,
+                threshold=float(os.environ.get('PDF_NEAR_DUP_THRESHOLD', 0.9)),
+                ttl=int(os.environ.get('PDF_NEAR_DUP_TTL', 30 * 86400)),
+                max_entries=int(os.environ.get('PDF_NEAR_DUP_MAX_ENTRIES', 5000))
+            )
+        except Exception as e:
+            logger.warning(f"Near-duplicate index disabled: {e}")
+            return None
+
+    def near_duplicate_stats(self) -> Dict[str, Any]:
+        return self.near_duplicates.stats() if self.near_duplicates is not None else {'enabled': False}
+
+    def _reuse_near_duplicate(self, pdf_text: str, current: Fingerprint) -> Optional[Dict[str, Any]]:
+        """Stored analysis of a near-identical document, checked against the pages that differ
+
+        Rule values read from the changed pages (another cover, address or
+        date) replace the stored ones - numbers only when stated with their
+        unit. None when nothing similar is indexed, too large a share of the
+        pages changed, or a changed page gives a bare number that disagrees
+        with the stored value (an adaptation the rules cannot read reliably).
+        """
+        match = self.near_duplicates.find(self._near_duplicate_namespace(), current)
+        if match is None:
+            return None
+        changed = changed_pages(current, match.pages)
+        if len(changed) > self.near_dup_max_changed * max(len(current.pages), 1):
+            logger.info(f"Near-duplicate ({match.similarity:.0%}) rejected: {len(changed)} of "
+                        f"{len(current.pages)} pages changed")
+            self._count(near_dup_rejected=1)
+            return None
+
+        analysis = dict(match.analysis)
+        found_data = dict(analysis.get("found_data") or {})
+        updated = []
+        if changed:
+            changed_text = "\n".join(text for number, text in split_pages(pdf_text) if number in changed)
+            confirmed = set()
+            for field, value in extract_fields(changed_text, confirmed).items():
+                if value is None or value == found_data.get(field):
+                    continue
+                if field in FIELD_RANGES and field not in confirmed:
+                    logger.info(f"Near-duplicate ({match.similarity:.0%}) rejected: {field} {value} "
+                                f"on changed pages {changed}, {found_data.get(field)} stored")
+                    self._count(near_dup_conflicts=1)
+                    return None
+                found_data[field] = value
+                updated.append(field)
+        analysis["found_data"] = found_data
+        analysis["extraction_method"] = "near_duplicate"
+        analysis["near_duplicate"] = {
+            "similarity": round(match.similarity, 3),
+            "source_sha256": match.sha256,
+            "source_age_seconds": round(match.age, 1),
+            "changed_pages": changed,
+            "fields_from_changed_pages": updated
+        }
+        note = (f"Dane przejęte z wcześniejszej analizy niemal identycznego projektu "
+                f"(podobieństwo {match.similarity:.0%}).")
+        if updated:
+            note += f" Ze zmienionych stron {changed} odczytano: {', '.join(updated)}."
+        analysis["notes"] = f"{analysis.get('notes') or ''} {note}".strip()
+        self._count(near_dup_hits=1, near_dup_fields_from_changed_pages=len(updated))
+        logger.info(f"Near-duplicate of {match.sha256[:12]} ({match.similarity:.0%}), "
+                    f"{len(changed)} changed pages, {len(updated)} fields updated")
+        return analysis
+
+    def _near_duplicate_namespace(self) -> str:
+        return f"{'+'.join(self.models)}:{PROMPT_VERSION}"
+
+    def _create_limiter(self) -> Optional[TokenBucketLimiter]:
+        """Token bucket shared by all workers through a locked state file; PDF_GROQ_RPM=0 disables it"""
+        requests_per_minute = float(os.environ.get('PDF_GROQ_RPM', 30))
+        if requests_per_minute <= 0:
+            return None
+        path = os.environ.get('PDF_GROQ_LIMITER_PATH') or os.path.join(
+            tempfile.gettempdir(), 'wycena2025_groq_limiter.json')
+        return TokenBucketLimiter(
+            path,
+            requests_per_minute=requests_per_minute,
+            tokens_per_minute=float(os.environ.get('PDF_GROQ_TPM', 6000)),
+            max_concurrency=int(os.environ.get('PDF_GROQ_MAX_CONCURRENCY', 6))
+        )
+
+    def rate_limit_stats(self) -> Dict[str, Any]:
+        return self.limiter.stats() if self.limiter else {'enabled': False}
+
+    def _cache_key(self, digest: str) -> str:
+        return f"{digest}:{'+'.join(self.models)}:{PROMPT_VERSION}"
+
+    def cache_stats(self) -> Dict[str, Any]:
+        return self.cache.stats() if self.cache else {'enabled': False}
+
+    def page_cache_stats(self) -> Dict[str, Any]:
+        return self.page_cache.stats() if self.page_cache else {'enabled': False}
+
+    def _create_sandbox(self) -> Optional[SandboxPool]:
+        if os.environ.get('PDF_SANDBOX', 'true').lower() not in ('1', 'true', 'yes'):
+            return None
+        return SandboxPool(workers=int(os.environ.get('PDF_SANDBOX_WORKERS', 2)),
+                           deadline=float(os.environ.get('PDF_SANDBOX_DEADLINE', 30)),
+                           cpu_seconds=float(os.environ.get('PDF_SANDBOX_CPU_SECONDS', 20)),
+                           memory_limit=int(os.environ.get('PDF_SANDBOX_MEMORY_MB', 1024)) * 1024 * 1024,
+                           max_jobs=int(os.environ.get('PDF_SANDBOX_MAX_JOBS', 100)),
+                           queue_timeout=float(os.environ.get('PDF_SANDBOX_QUEUE_TIMEOUT', 30)))
+
+    def sandbox_stats(self) -> Dict[str, Any]:
+        return self.sandbox.stats() if self.sandbox else {'enabled': False}
+
+    def _count(self, **increments: int) -> None:
+        with self._stats_lock:
+            for name, value in increments.items():
+                self._extraction_stats[name] += value
+
+    def extraction_stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            stats = dict(self._extraction_stats)
+        stats['rules_enabled'] = self.rules_enabled
+        stats['llm_skip_rate'] = (round(stats['llm_skipped'] / stats['documents'], 3)
+                                  if stats['documents'] else None)
+        streamed = stats.pop('llm_streamed')
+        total, first_field = stats.pop('llm_seconds'), stats.pop('llm_first_field_seconds')
+        stats['llm_streamed'] = streamed
+        stats['llm_mean_seconds'] = round(total / streamed, 3) if streamed else None
+        stats['llm_mean_first_field_seconds'] = round(first_field / streamed, 3) if streamed else None
+        with self._stats_lock:
+            stats['tiers'] = {name: dict(tier, mean_seconds=round(tier['seconds'] / tier['calls'], 3)
+                                         if tier['calls'] else None)
+                              for name, tier in self._tier_stats.items()}
+        return stats
+
     def _validate_dependencies(self):
         """Validate required dependencies"""
         if PyPDF2 is None or PdfReader is None:
@@ -82,45 +359,109 @@ class PDFAIAnalyzer:
         """Check if the service is available"""
         return self._initialized and self.client is not None
 
-    def extract_text_from_pdf(self, pdf_file: Union[BytesIO, Any]) -> str:
-        """Extract text content from uploaded PDF file"""
+    def extract_text_from_pdf(self, pdf_file: Union[BytesIO, Any],
+                              detector: Optional[FieldDetector] = None) -> str:
+        """Extract text content from uploaded PDF file
+
+        Pages are pulled lazily and joined once. With a detector, each page is
+        fed to it and extraction stops as soon as it reports the needed fields.
+        With the sandbox on, parsing happens in a limited worker process and a
+        limit hit raises ExtractionLimitExceeded.
+        """
         if not self.is_available():
             raise PDFAnalyzerError("PDF Analyzer service not available")
 
+        spooled = None
         try:
-            # Reset file pointer if needed
-            if hasattr(pdf_file, 'seek'):
-                pdf_file.seek(0)
-
-            text_content = ""
             if PdfReader is None:
                 raise PDFAnalyzerError("PdfReader not available")
-            pdf_reader = PdfReader(pdf_file)
 
-            if len(pdf_reader.pages) == 0:
-                raise PDFAnalyzerError("PDF nie zawiera żadnych stron")
+            info: Dict[str, Any] = {}
+            if self.sandbox is not None:
+                # The worker needs a file descriptor - anything else is spooled first
+                if isinstance(pdf_file, PDFUpload):
+                    source = pdf_file
+                else:
+                    source = spooled = spool_upload(pdf_file, self.max_bytes)
+                pages = self.sandbox.iter_pages(source, self.page_timeout, cache=self.page_cache, info=info)
+            else:
+                if isinstance(pdf_file, PDFUpload):
+                    pdf_file = pdf_file.stream()
+                # Reset file pointer if needed
+                if hasattr(pdf_file, 'seek'):
+                    pdf_file.seek(0)
+                pdf_reader = PdfReader(pdf_file)
 
-            for page_num, page in enumerate(pdf_reader.pages):
-                try:
-                    page_text = page.extract_text()
+                page_count = info['page_count'] = len(pdf_reader.pages)
+                if page_count == 0:
+                    raise PDFAnalyzerError("PDF nie zawiera żadnych stron")
+
+                if self.extractor is not None and page_count >= self.parallel_min_pages:
+                    keys = ([page_content_key(page) for page in pdf_reader.pages]
+                            if self.page_cache is not None else None)
+                    pages = self.extractor.iter_extract(self._read_bytes(pdf_file), page_count,
+                                                        cache=self.page_cache, keys=keys)
+                else:
+                    pages = iter_pages_sequential(pdf_reader, self.page_timeout, cache=self.page_cache)
+
+            blocks = []
+            extracted = 0
+            try:
+                for page_num, page_text, error in pages:
+                    extracted += 1
+                    if error:
+                        logger.warning(f"Failed to extract text from page {page_num + 1}: {error}")
+                        continue
                     if page_text.strip():
-                        text_content += f"\n--- Strona {page_num + 1} ---\n{page_text}\n"
-                except Exception as e:
-                    logger.warning(f"Failed to extract text from page {page_num + 1}: {e}")
-                    continue
+                        blocks.append(f"\n--- Strona {page_num + 1} ---\n{page_text}\n")
+                        if detector is not None and detector.feed(page_text):
+                            break
+            finally:
+                pages.close()
+            text_content = ''.join(blocks)
+
+            page_count = info.get('page_count', extracted)
+            if page_count == 0:
+                raise PDFAnalyzerError("PDF nie zawiera żadnych stron")
+            skipped = page_count - extracted
+            self._count(pages_extracted=extracted, pages_skipped=skipped, extraction_early_stops=int(skipped > 0))
+            if skipped:
+                logger.info(f"Extraction stopped after page {extracted} of {page_count}: rule fields sufficient")
 
             if not text_content.strip():
                 raise PDFAnalyzerError("Nie udało się wyciągnąć tekstu z pliku PDF")
 
-            logger.info(f"Extracted {len(text_content)} characters from {len(pdf_reader.pages)} pages")
+            logger.info(f"Extracted {len(text_content)} characters from {extracted} of {page_count} pages")
             return text_content
 
+        except ExtractionLimitExceeded as e:
+            logger.warning(f"PDF text extraction stopped by sandbox ({e.reason})")
+            raise
         except Exception as e:
             logger.error(f"PDF text extraction failed: {e}")
             raise PDFAnalyzerError(f"Błąd ekstrakcji tekstu: {str(e)}")
+        finally:
+            if spooled is not None:
+                spooled.close()
 
-    def analyze_construction_project(self, pdf_text: str) -> Dict[str, Any]:
-        """Analyze construction project PDF and extract heat pump sizing data"""
+    def _read_bytes(self, pdf_file):
+        if isinstance(pdf_file, mmap.mmap):
+            return pdf_file  # spooled upload - copied straight from the mapping
+        if hasattr(pdf_file, 'getvalue'):
+            return pdf_file.getvalue()
+        pdf_file.seek(0)
+        return pdf_file.read()
+
+    def analyze_construction_project(self, pdf_text: str,
+                                     known_data: Optional[Dict[str, Any]] = None,
+                                     on_field: Optional[Callable[[str, Any], None]] = None) -> Dict[str, Any]:
+        """Analyze construction project PDF and extract heat pump sizing data
+
+        known_data: values already read by the rule extractor - the model is
+        asked only for the remaining fields and the known values win on merge
+        on_field(field, value): called for each found_data member as soon as
+        the streamed response contains it
+        """
 
         if not self.is_available():
             if not self.api_key:
@@ -128,23 +469,168 @@ class PDFAIAnalyzer:
             else:
                 raise PDFAnalyzerError("Serwis analizy AI nie jest dostępny")
 
-        # Truncate text if too long (API limits)
+        if not self.client:
+            return self._create_fallback_analysis("Błąd analizy AI: Groq client not initialized")
+
+        # Too long for the API limits: whole document in chunks, or the most
+        # relevant pages - never the first N characters
         max_text_length = 12000  # Conservative limit
         if len(pdf_text) > max_text_length:
-            pdf_text = pdf_text[:max_text_length] + "\\n[TEKST SKRÓCONY]"
-            logger.info(f"PDF text truncated to {max_text_length} characters")
-
-        prompt = self._build_analysis_prompt(pdf_text)
+            analysis = self._analyze_chunks(pdf_text, known_data, on_field) if self.map_reduce else None
+            if analysis is not None:
+                return analysis
+            original_length = len(pdf_text)
+            pdf_text, pages = select_relevant_text(pdf_text, max_text_length)
+            logger.info(f"PDF text reduced from {original_length} to {len(pdf_text)} characters "
+                        f"(pages {pages})")
 
+        prompt = self._build_analysis_prompt(pdf_text, known_data)
         try:
-            if not self.client:
-                raise PDFAnalyzerError("Groq client not initialized")
+            best, best_model, error = self._run_cascade(prompt, known_data, on_field)
+        except RateLimitTimeout:
+            best, best_model, error = None, None, RATE_LIMIT_ERROR
+        if best is None:
+            return self._create_fallback_analysis(error or "Błąd parsowania odpowiedzi AI")
+
+        best["model"] = best_model
+        if known_data:
+            best = self._merge_known_data(best, known_data)
+        return best
+
+    def _analyze_chunks(self, pdf_text: str, known_data: Optional[Dict[str, Any]],
+                        on_field: Optional[Callable[[str, Any], None]]) -> Optional[Dict[str, Any]]:
+        """Map-reduce path: chunks analysed in parallel, found_data merged field by field
+
+        Beyond PDF_MAP_MAX_CHUNKS, or beyond the tokens the shared limiter
+        holds right now, the lowest scoring chunks are dropped - chunks never
+        queue for the bucket. None when fewer than two chunks fit - the caller
+        then sends the most relevant pages in one prompt. Merged fields are
+        reported through on_field once the merge is done - chunks may
+        disagree, so their streamed values are not passed on.
+        """
+        chunks = chunk_pages(pdf_text, self.map_chunk_chars)
+        scores = [sum(score_page(text) for _, text in split_pages(chunk)) for _, chunk in chunks]
+        ranked = sorted(range(len(chunks)), key=lambda i: scores[i], reverse=True)[:self.map_max_chunks]
+        if self.limiter is not None:
+            # Same estimate as _call_with_retries: prompt / 4 + a typical answer
+            overhead = len(self._build_analysis_prompt("", known_data, fragment=(1, len(chunks)))) // 4 + 500
+            available = self.limiter.available(self.models[-1])  # the tier chunks are sent to
+            keep, cost = [], 0
+            for index in ranked:
+                cost += overhead + len(chunks[index][1]) // 4
+                if cost > available:
+                    break
+                keep.append(index)
+            if len(keep) < 2:
+                logger.info(f"Map-reduce skipped: {available:.0f} tokens available, "
+                            f"{len(keep)} chunks fit - one call on the most relevant pages")
+                self._count(map_budget_single_calls=1)
+                return None
+            ranked = keep
+        dropped = len(chunks) - len(ranked)
+        chunks = [chunks[i] for i in sorted(ranked)]
+        logger.info(f"Map-reduce analysis of {len(pdf_text)} characters: {len(chunks)} chunks "
+                    f"(pages {[pages[0] for pages, _ in chunks]}), {dropped} dropped")
+
+        def analyze(index: int) -> Optional[Tuple[Optional[Dict[str, Any]], Optional[str], Optional[str]]]:
+            prompt = self._build_analysis_prompt(chunks[index][1], known_data, fragment=(index + 1, len(chunks)))
+            try:
+                return self._run_cascade(prompt, known_data, None, partial=True)
+            except RateLimitTimeout:
+                return None
+
+        with ThreadPoolExecutor(max_workers=max(1, min(self.map_concurrency, len(chunks))),
+                                thread_name_prefix='pdf-map') as pool:
+            results = list(pool.map(analyze, range(len(chunks))))
+        # Chunks the limiter did not admit in time were never sent - one more try each, in sequence
+        limited = [index for index, result in enumerate(results) if result is None]
+        for index in limited:
+            results[index] = analyze(index) or (None, None, RATE_LIMIT_ERROR)
+        self._count(map_chunks_rate_limited=len(limited))
+
+        analyses = [analysis for analysis, _, _ in results]
+        failed = sum(1 for analysis in analyses if analysis is None)
+        if failed == len(analyses):
+            self._count(map_reduce_documents=1, map_chunks=len(chunks), map_chunks_failed=failed,
+                        map_chunks_dropped=dropped)
+            return self._create_fallback_analysis(results[0][2] or "Błąd parsowania odpowiedzi AI")
+
+        merged = merge_analyses(analyses)
+        merged["chunks"].update(dropped=dropped, pages=[pages for pages, _ in chunks])
+        merged["model"] = "+".join(sorted({model for _, model, _ in results if model}))
+        self._count(map_reduce_documents=1, map_chunks=len(chunks), map_chunks_failed=failed,
+                    map_chunks_dropped=dropped, map_unit_corrections=merged["chunks"]["unit_corrections"],
+                    map_conflicts=merged["chunks"]["conflicts"])
+        if known_data:
+            merged = self._merge_known_data(merged, known_data)
+            merged["extraction_method"] = "rules+llm_map_reduce"
+        if on_field is not None:
+            for field, value in merged["found_data"].items():
+                if value is not None:
+                    on_field(field, value)
+        return merged
+
+    def _run_cascade(self, prompt: str, known_data: Optional[Dict[str, Any]],
+                     on_field: Optional[Callable[[str, Any], None]], partial: bool = False
+                     ) -> Tuple[Optional[Dict[str, Any]], Optional[str], Optional[str]]:
+        """Ask the model tiers in turn: (best analysis or None, its model, last error)
+
+        partial: the prompt holds only part of the document, so missing fields
+        and low data quality are expected; it goes to the last tier alone - a
+        fragment's confidence says little, and escalating chunk by chunk spent
+        more tokens than the 70B model on its own
+        """
+        # Cascade: a tier's answer is kept unless it fails the thresholds and a
+        # further tier is still allowed by the escalation and token limits
+        best, best_model, error = None, None, None
+        used_tokens = 0
+        models = self.models[-1:] if partial else self.models
+        for tier, model in enumerate(models):
+            try:
+                analysis, tokens, seconds, error = self._request_analysis(model, prompt, on_field)
+            except RateLimitTimeout:
+                # Not sent, so not a wrong answer: raised for a retry unless a tier answered already
+                if best is None:
+                    raise
+                break
+            used_tokens += tokens
+            if analysis is not None:
+                best, best_model = analysis, model
 
-            logger.info(f"Sending request to Groq AI with model: {self.model}")
+            reason = self._escalation_reason(analysis, known_data, partial)
+            last_tier = tier == len(models) - 1
+            if reason and not last_tier:
+                if tier >= self.cascade_max_escalations:
+                    reason = None
+                    logger.info(f"Cascade: escalation limit reached at {model}")
+                elif used_tokens + tokens > self.cascade_token_budget:
+                    # Next call estimated at the size of this one
+                    reason = None
+                    logger.info(f"Cascade: token budget {self.cascade_token_budget} reached at {model}")
+            escalate = bool(reason) and not last_tier
+            self._count_tier(model, tokens=tokens, seconds=seconds, failed=analysis is None,
+                             escalated=escalate, accepted=analysis is not None and not escalate)
+            if not escalate:
+                break
+            logger.info(f"Cascade: {model} answer rejected ({reason}), escalating to {models[tier + 1]}")
+
+        return best, best_model, error
+
+    def _request_analysis(self, model: str, prompt: str,
+                          on_field: Optional[Callable[[str, Any], None]]
+                          ) -> Tuple[Optional[Dict[str, Any]], int, float, Optional[str]]:
+        """One completion: (analysis or None, tokens used, seconds, error message)
+
+        RateLimitTimeout is raised when the limiter did not admit the request.
+        """
+        started = time.monotonic()
+        usage, received = None, 0
+        try:
+            logger.info(f"Sending request to Groq AI with model: {model}")
             logger.debug(f"Prompt length: {len(prompt)} characters")
 
-            response = self.client.chat.completions.create(
-                model=self.model,
+            request = dict(
+                model=model,
                 messages=[
                     {
                         "role": "system",
@@ -158,40 +644,195 @@ class PDFAIAnalyzer:
                 temperature=0.1,  # Low temperature for precise analysis
                 max_tokens=2000
             )
+            if self.json_mode:
+                # Strict JSON output - no prose or code fences around the object
+                request["response_format"] = {"type": "json_object"}
+
+            def call():
+                if self.stream_responses:
+                    return self._read_stream(
+                        self.client.chat.completions.create(stream=True, **request), on_field)
+                response = self.client.chat.completions.create(**request)
+                ai_response = response.choices[0].message.content or ""
+                logger.info(f"AI analysis completed, response length: {len(ai_response)}")
+                return parse_analysis(ai_response), getattr(response, 'usage', None), len(ai_response)
+
+            analysis_result, usage, received = self._call_with_retries(model, prompt, call)
 
-            logger.info("Groq AI request completed successfully")
+            error = None
+            if not analysis_result or "found_data" not in analysis_result:
+                logger.error("AI response does not contain the analysis JSON object")
+                analysis_result, error = None, "Błąd parsowania odpowiedzi AI"
 
-            ai_response = response.choices[0].message.content
-            if ai_response:
-                ai_response = ai_response.strip()
+        except RateLimitTimeout as e:
+            logger.warning(f"Groq request for {model} not sent: {e}")
+            self._count(llm_queue_timeouts=1)
+            raise
+        except Exception as e:
+            logger.error(f"AI analysis request failed: {e}")
+            analysis_result, error = None, f"Błąd analizy AI: {str(e)}"
+
+        # Usage reported by Groq, otherwise ~4 characters per token
+        tokens = getattr(usage, 'total_tokens', None) or (len(prompt) + received) // 4
+        return analysis_result, tokens, time.monotonic() - started, error
 
-            logger.info(f"AI analysis completed, response length: {len(ai_response) if ai_response else 0}")
+    def _call_with_retries(self, model: str, prompt: str, call: Callable[[], Tuple[Any, Any, int]]
+                           ) -> Tuple[Any, Any, int]:
+        """Run `call` inside a limiter slot, retrying 429 and 5xx with jittered backoff
 
-            # Parse JSON response
+        A 429 blocks the model in the shared bucket for Retry-After seconds so
+        the other workers back off too. The whole attempt sequence shares one
+        deadline - PDF_GROQ_QUEUE_TIMEOUT plus the time the token bucket needs
+        to refill the call's own estimate; RateLimitTimeout is raised once it
+        cannot be met.
+        """
+        estimate = len(prompt) // 4 + 500  # prompt plus a typical answer, settled from usage
+        deadline = time.monotonic() + self.queue_timeout
+        if self.limiter is not None:
+            # A 12000-character prompt is ~4000 tokens: 40 s of a 6000 TPM bucket on its own
+            deadline += self.limiter.refill_seconds(estimate)
+        attempt = 0
+        while True:
             try:
-                if not ai_response:
-                    raise ValueError("Empty AI response")
-                analysis_result = json.loads(ai_response)
-                return analysis_result
+                if self.limiter is None:
+                    return call()
+                with self.limiter.slot(model, estimate, deadline - time.monotonic()):
+                    result = call()
+                used = getattr(result[1], 'total_tokens', None)
+                if used:
+                    self.limiter.settle(model, used - estimate)
+                return result
+            except RateLimitTimeout:
+                raise
+            except Exception as e:
+                status = getattr(e, 'status_code', None)
+                if attempt >= self.max_retries or status is None or not (status == 429 or status >= 500):
+                    raise
+                delay = backoff_delay(attempt, self.backoff_base, self.backoff_cap)
+                retry_after = _retry_after(e)
+                if retry_after is not None:
+                    delay = max(delay, retry_after)
+                if time.monotonic() + delay > deadline:
+                    raise RateLimitTimeout(f"Retry in {delay:.1f}s would miss the deadline") from e
+                attempt += 1
+                if status == 429:
+                    self._count(llm_retries=1, llm_rate_limited=1)
+                    logger.warning(f"Groq rate limit for {model}, retry {attempt} in {delay:.1f}s")
+                else:
+                    self._count(llm_retries=1, llm_server_errors=1)
+                    logger.warning(f"Groq server error {status} for {model}, retry {attempt} in {delay:.1f}s")
+                if status == 429 and self.limiter is not None:
+                    self.limiter.penalize(model, delay)  # the slot waits it out, in every worker
+                else:
+                    time.sleep(delay)
 
-            except json.JSONDecodeError as e:
-                logger.error(f"Failed to parse AI JSON response: {e}")
-                logger.debug(f"Raw AI response: {ai_response}")
+    def _escalation_reason(self, analysis: Optional[Dict[str, Any]],
+                           known_data: Optional[Dict[str, Any]], partial: bool = False) -> Optional[str]:
+        """Why a tier's answer is not good enough, None when it is accepted"""
+        if analysis is None:
+            return "error"
+        try:
+            confidence = float(analysis.get("confidence_level") or 0)
+        except (TypeError, ValueError):
+            confidence = 0.0
+        if confidence < self.cascade_min_confidence:
+            return "low_confidence"
+        if partial:
+            return None
+        if QUALITY_RANK.get(analysis.get("data_quality"), 0) < QUALITY_RANK.get(self.cascade_min_quality, 1):
+            return "low_quality"
+        found = dict(analysis.get("found_data") or {})
+        found.update({field: value for field, value in (known_data or {}).items() if value is not None})
+        if not is_sufficient(found):
+            return "missing_fields"
+        return None
 
-                # Return fallback response
-                return self._create_fallback_analysis("Błąd parsowania odpowiedzi AI")
+    def _count_tier(self, model: str, tokens: int, seconds: float, failed: bool,
+                    escalated: bool, accepted: bool) -> None:
+        with self._stats_lock:
+            tier = self._tier_stats.setdefault(model, {'calls': 0, 'accepted': 0, 'escalated': 0,
+                                                       'failed': 0, 'tokens': 0, 'seconds': 0.0})
+            tier['calls'] += 1
+            tier['accepted'] += accepted
+            tier['escalated'] += escalated
+            tier['failed'] += failed
+            tier['tokens'] += tokens
+            tier['seconds'] += seconds
 
-        except Exception as e:
-            logger.error(f"AI analysis request failed: {e}")
-            return self._create_fallback_analysis(f"Błąd analizy AI: {str(e)}")
+    def _read_stream(self, stream, on_field: Optional[Callable[[str, Any], None]]):
+        """Parse a streamed completion; the stream is closed as soon as the schema is complete
+
+        Returns (analysis or None, usage or None, characters received).
+        """
+        parser = StreamingAnalysisParser()
+        started = time.monotonic()
+        first_field = None
+        stopped_early = False
+        usage = None
+        try:
+            for chunk in stream:
+                x_groq = getattr(chunk, 'x_groq', None)
+                usage = getattr(chunk, 'usage', None) or getattr(x_groq, 'usage', None) or usage
+                if not chunk.choices:
+                    continue
+                content = chunk.choices[0].delta.content
+                if not content:
+                    continue
+                for field, value in parser.feed(content):
+                    if value is None:
+                        continue  # "field": null - nothing read, no event
+                    if first_field is None:
+                        first_field = time.monotonic() - started
+                    if on_field is not None:
+                        on_field(field, value)
+                if parser.complete:
+                    stopped_early = True
+                    break
+        finally:
+            # Closing the HTTP response stops the generation on the Groq side
+            close = getattr(stream, 'close', None)
+            if close is not None:
+                close()
+
+        elapsed = time.monotonic() - started
+        self._count(llm_streamed=1, llm_early_stops=int(stopped_early), llm_seconds=elapsed,
+                    llm_first_field_seconds=first_field or 0.0)
+        logger.info(f"AI stream finished in {elapsed:.2f} s (first field after "
+                    f"{first_field if first_field is not None else float('nan'):.2f} s, early stop: {stopped_early})")
+        return parser.result or None, usage, parser.received
 
-    def _build_analysis_prompt(self, pdf_text: str) -> str:
-        """Build the analysis prompt for AI"""
+    def _merge_known_data(self, analysis: Dict[str, Any], known_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Rule matches override the model's values for the same fields"""
+        found = dict(analysis.get("found_data") or {})
+        found.update({field: value for field, value in known_data.items() if value is not None})
+        analysis["found_data"] = found
+        analysis["extraction_method"] = "rules+llm"
+        return analysis
+
+    def _build_analysis_prompt(self, pdf_text: str, known_data: Optional[Dict[str, Any]] = None,
+                               fragment: Optional[Tuple[int, int]] = None) -> str:
+        """Build the analysis prompt for AI; fragment=(number, total) for one chunk of a long document"""
+        text_header = "TEKST PROJEKTU:"
+        if fragment:
+            text_header = (f"TEKST PROJEKTU (fragment {fragment[0]} z {fragment[1]} - pozostałe fragmenty są "
+                           f"analizowane osobno; dla danych, których nie ma w tym fragmencie, podaj null, "
+                           f"a confidence_level odnieś tylko do znalezionych wartości):")
+        known_section = ""
+        if known_data and any(value is not None for value in known_data.values()):
+            known_lines = "\n".join(f"- {field}: {value}" for field, value in known_data.items()
+                                    if value is not None)
+            known_section = f"""
+DANE JUŻ ODCZYTANE Z PROJEKTU (nie szukaj ich ponownie, przepisz bez zmian):
+{known_lines}
+
+SZUKAJ TYLKO PÓL: {", ".join(missing_fields(known_data))}
+"""
         return f"""
 Jesteś ekspertem od analizy projektów budowlanych i doboru pomp ciepła. Przeanalizuj poniższy tekst z projektu budowlanego i wyciągnij kluczowe dane potrzebne do profesjonalnego doboru pompy ciepła.
 
-TEKST PROJEKTU:
+{text_header}
 {pdf_text}
+{known_section}
 
 ZADANIE:
 Znajdź i wyciągnij następujące dane (jeśli są dostępne):
@@ -252,6 +893,11 @@ WAŻNE ZASADY:
             "notes": "Proszę wprowadzić dane ręcznie ze względu na błąd analizy automatycznej."
         }
 
+    def _is_fallback(self, analysis: Dict[str, Any]) -> bool:
+        return (analysis.get("data_quality") == "insufficient"
+                and not analysis.get("confidence_level")
+                and str(analysis.get("analysis_summary", "")).startswith("Analiza nie powiodła się"))
+
     def calculate_heating_requirements(self, analysis_data: Dict[str, Any]) -> Dict[str, Any]:
         """Calculate heating requirements based on analysis data"""
         found_data = analysis_data.get("found_data", {})
@@ -301,8 +947,21 @@ WAŻNE ZASADY:
             "confidence": "none"
         }
 
-    def process_pdf_file(self, pdf_file) -> Dict[str, Any]:
-        """Main method to process PDF file with comprehensive error handling"""
+    def process_pdf_file(self, pdf_file,
+                         progress: Optional[Callable[[str, Optional[Dict[str, Any]]], None]] = None) -> Dict[str, Any]:
+        """Main method to process PDF file with comprehensive error handling
+
+        `progress(stage, data)` is called at each pipeline stage
+        (extracting, analysing, calculating) and as "field" with each found_data
+        value as soon as it is known - used by asynchronous jobs.
+        `pdf_file` is a PDFUpload from the route or any file object, which is
+        spooled here first.
+        """
+        def report(stage: str, data: Optional[Dict[str, Any]] = None) -> None:
+            if progress is not None:
+                progress(stage, data)
+
+        upload = None
         try:
             logger.info("🔍 Starting PDF processing...")
 
@@ -324,9 +983,25 @@ WAŻNE ZASADY:
                     "error_type": "service_unavailable"
                 }
 
+            # Structure check on the raw bytes - bad files are refused before any parsing
+            upload = pdf_file if isinstance(pdf_file, PDFUpload) else spool_upload(pdf_file, self.max_bytes)
+            probe = inspect_pdf(upload, self.max_pages)
+
+            # Repeat upload of the same file - result straight from cache
+            cache_key = self._cache_key(upload.sha256)
+            if self.cache is not None:
+                entry = self.cache.get_entry(cache_key)
+                if entry is not None:
+                    cached, age = entry
+                    logger.info(f"✅ PDF analysis served from cache (age {age:.0f} s)")
+                    return dict(cached, cache={'hit': True, 'age_seconds': round(age, 1)})
+
             # Extract text
             logger.info("📄 Extracting text from PDF...")
-            pdf_text = self.extract_text_from_pdf(pdf_file)
+            report("extracting", {"bytes": upload.size, "pages": probe['page_count']})
+            detector = FieldDetector() if self.rules_enabled and self.early_stop else None
+            pdf_text = self.extract_text_from_pdf(upload, detector)
+            upload.release_pages()
             logger.info(f"✅ Extracted {len(pdf_text)} characters from PDF")
 
             if not pdf_text or len(pdf_text.strip()) < 10:
@@ -337,13 +1012,57 @@ WAŻNE ZASADY:
                     "error_type": "insufficient_text"
                 }
 
-            # Analyze with AI
-            logger.info("🤖 Starting AI analysis...")
-            analysis_result = self.analyze_construction_project(pdf_text)
-            logger.info(f"✅ AI analysis completed with {analysis_result.get('data_quality', 'unknown')} quality")
+            # Rule-based fast path - no AI call when the project states the values plainly
+            report("analysing", {"text_length": len(pdf_text)})
+            confirmed = set()  # fields stated with their unit - only these can skip the AI call
+            if detector is not None and detector.sufficient:
+                found, confirmed = detector.found, detector.confirmed  # extraction stopped on these values
+            else:
+                found = extract_fields(pdf_text, confirmed) if self.rules_enabled else None
+            sufficient = bool(found) and is_sufficient(found, confirmed)
+            known = len(found) - len(missing_fields(found)) if found else 0
+            for field, value in (found or {}).items():
+                if value is not None:
+                    report("field", {"field": field, "value": value, "source": "rules"})
+            # Another client's copy of an analysed catalog design - its analysis is reused
+            current = fingerprint(pdf_text) if self.near_duplicates is not None and not sufficient else None
+            reused = self._reuse_near_duplicate(pdf_text, current) if current is not None else None
+            if sufficient:
+                analysis_result = build_rule_analysis(found)
+                self._count(documents=1, llm_skipped=1, fields_from_rules=known)
+                logger.info(f"✅ Rule-based extraction sufficient ({known} fields), AI call skipped")
+            elif reused is not None:
+                analysis_result = reused
+                for field, value in analysis_result["found_data"].items():
+                    if value is not None and not (found and found.get(field) is not None):
+                        report("field", {"field": field, "value": value, "source": "near_duplicate"})
+                self._count(documents=1, llm_skipped=1, fields_from_rules=known)
+                logger.info("✅ Near-duplicate of an analysed project, AI call skipped")
+            else:
+                # Analyze with AI
+                logger.info("🤖 Starting AI analysis...")
+                def on_field(field: str, value: Any) -> None:
+                    # Values copied back from the rules were reported already
+                    if not (found and found.get(field) is not None):
+                        report("field", {"field": field, "value": value, "source": "llm"})
+
+                analysis_result = self.analyze_construction_project(pdf_text, known_data=found, on_field=on_field)
+                if known and self._is_fallback(analysis_result):
+                    # AI failed - still hand back what the rules read
+                    analysis_result["found_data"].update(
+                        {field: value for field, value in found.items() if value is not None})
+                analysis_result.setdefault("extraction_method", "llm")
+                if current is not None and not self._is_fallback(analysis_result):
+                    self.near_duplicates.add(self._near_duplicate_namespace(), upload.sha256,
+                                             current, analysis_result)
+                requested = missing_fields(found) if found else FOUND_DATA_FIELDS
+                self._count(documents=1, llm_calls=1, fields_from_rules=known,
+                            fields_requested_from_llm=len(requested))
+                logger.info(f"✅ AI analysis completed with {analysis_result.get('data_quality', 'unknown')} quality")
 
             # Calculate heating requirements
             logger.info("🔢 Calculating heating requirements...")
+            report("calculating")
             heating_calc = self.calculate_heating_requirements(analysis_result)
             logger.info(f"✅ Heating calculations completed using {heating_calc.get('method', 'unknown')} method")
 
@@ -356,9 +1075,28 @@ WAŻNE ZASADY:
                 "timestamp": None  # Will be set by API
             }
 
+            # Fallback (AI error) is not cached - the next upload retries the analysis
+            if self.cache is not None and not self._is_fallback(analysis_result):
+                self.cache.put(cache_key, result)
+            result["cache"] = {"hit": False}
+
             logger.info("🎉 PDF processing completed successfully")
             return result
 
+        except UploadRejected as e:
+            logger.warning(f"❌ PDF rejected before parsing ({e.error_type}): {e.message}")
+            return {
+                "processing_status": "error",
+                "error_message": e.message,
+                "error_type": e.error_type
+            }
+        except ExtractionLimitExceeded as e:
+            logger.warning(f"❌ PDF extraction hit a sandbox limit ({e.error_type})")
+            return {
+                "processing_status": "error",
+                "error_message": e.message,
+                "error_type": e.error_type
+            }
         except PDFAnalyzerError as e:
             logger.error(f"❌ PDF Analysis Error: {e}")
             return {
@@ -373,6 +1111,10 @@ WAŻNE ZASADY:
                 "error_message": f"Nieoczekiwany błąd: {str(e)}",
                 "error_type": "unexpected_error"
             }
+        finally:
+            # Uploads spooled here are ours to remove; the caller closes its own
+            if upload is not None and upload is not pdf_file:
+                upload.close()
 
 # Create global instance
 pdf_analyzer = PDFAIAnalyzer()
\ No newline at end of file
@@ -0,0 +1,318 @@
+"""
+Parallel PDF text extraction
+Page ranges are spread across a process pool; workers read the PDF from one
+shared memory buffer, each page has its own timeout and failures stay local
+to the page that caused them. Pages are produced lazily in document order, so
+the caller can stop early, and their text can be cached by page content hash.
+"""
+import hashlib
+import io
+import logging
+import math
+import multiprocessing
+import os
+import signal
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+try:
+    from PyPDF2 import PdfReader
+except ImportError:
+    PdfReader = None
+
+logger = logging.getLogger(__name__)
+
+# (page index, text or None, error or None)
+PageResult = Tuple[int, Optional[str], Optional[str]]
+
+
+class PageTimeout(Exception):
+    """Extraction of a single page exceeded its time limit"""
+    pass
+
+
+def _on_alarm(signum, frame):
+    raise PageTimeout()
+
+
+class _SharedBufferReader(io.RawIOBase):
+    """Read-only file view of a shared memory segment for PdfReader - reads copy only what they return"""
+
+    def __init__(self, buffer: memoryview):
+        self._buffer = buffer
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, target) -> int:
+        chunk = self._buffer[self._position:self._position + len(target)]
+        target[:len(chunk)] = chunk
+        self._position += len(chunk)
+        return len(chunk)
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._position, io.SEEK_END: len(self._buffer)}[whence]
+        self._position = max(0, base + offset)
+        return self._position
+
+    def tell(self) -> int:
+        return self._position
+
+    def close(self) -> None:
+        self._buffer.release()
+        super().close()
+
+
+# Worker process state: the parsed document of the last buffer it has seen,
+# with the segment it is mapped from
+_worker_reader: Dict[str, Tuple[object, shared_memory.SharedMemory, _SharedBufferReader]] = {}
+
+
+def _attach_reader(shm_name: str, size: int):
+    entry = _worker_reader.get(shm_name)
+    if entry is None:
+        _detach_reader()
+        shm = shared_memory.SharedMemory(name=shm_name)
+        # The parent owns the segment and unlinks it after the extraction; the
+        # worker maps it until the next document - no per-worker copy of the file
+        stream = _SharedBufferReader(shm.buf[:size])
+        entry = _worker_reader[shm_name] = (PdfReader(stream), shm, stream)
+    return entry[0]
+
+
+def _detach_reader() -> None:
+    for _, shm, stream in _worker_reader.values():
+        try:
+            stream.close()
+            shm.close()
+        except BufferError:
+            pass  # a page object still holds a view - the mapping goes with the process
+    _worker_reader.clear()
+
+
+def _stream_bytes(obj) -> bytes:
+    """Raw (still encoded) data of a content stream or an array of them"""
+    obj = obj.get_object() if hasattr(obj, 'get_object') else obj
+    if isinstance(obj, list):
+        return b''.join(_stream_bytes(item) for item in obj)
+    data = getattr(obj, '_data', None)
+    return data if isinstance(data, bytes) else b''
+
+
+def page_content_key(page) -> Optional[str]:
+    """SHA-256 of what the page text depends on: content streams, fonts, form XObjects
+
+    None when the page cannot be read - such pages are not cached.
+    """
+    try:
+        digest = hashlib.sha256(_stream_bytes(page.get('/Contents')) if page.get('/Contents') else b'')
+        resources = page.get('/Resources')
+        resources = resources.get_object() if resources is not None else {}
+        fonts = resources.get('/Font')
+        for name, font in sorted((fonts.get_object() if fonts is not None else {}).items()):
+            font = font.get_object()
+            digest.update(f"|{name}:{font.get('/BaseFont')}".encode('utf-8', 'replace'))
+            if font.get('/ToUnicode') is not None:
+                digest.update(_stream_bytes(font['/ToUnicode']))
+        xobjects = resources.get('/XObject')
+        for name, xobject in sorted((xobjects.get_object() if xobjects is not None else {}).items()):
+            xobject = xobject.get_object()
+            if xobject.get('/Subtype') == '/Form':  # images carry no text
+                digest.update(f"|{name}:".encode('utf-8', 'replace') + _stream_bytes(xobject))
+        return digest.hexdigest()
+    except Exception as e:
+        logger.debug(f"Page content key unavailable: {e}")
+        return None
+
+
+def _extract_range(shm_name: str, size: int, indices: Sequence[int],
+                   page_timeout: float) -> List[PageResult]:
+    """Worker: extract the given pages with a per-page SIGALRM timeout"""
+    results = []
+    try:
+        reader = _attach_reader(shm_name, size)
+    except Exception as e:
+        return [(index, None, f"open failed: {e}") for index in indices]
+
+    use_alarm = page_timeout > 0 and hasattr(signal, 'setitimer')
+    if use_alarm:
+        signal.signal(signal.SIGALRM, _on_alarm)
+
+    for index in indices:
+        try:
+            if use_alarm:
+                signal.setitimer(signal.ITIMER_REAL, page_timeout)
+            try:
+                text = reader.pages[index].extract_text() or ''
+            finally:
+                if use_alarm:
+                    signal.setitimer(signal.ITIMER_REAL, 0)
+            results.append((index, text, None))
+        except PageTimeout:
+            results.append((index, None, f"timeout after {page_timeout}s"))
+        except Exception as e:
+            results.append((index, None, str(e) or e.__class__.__name__))
+    return results
+
+
+def _extract_page(page, page_timeout: float) -> Tuple[Optional[str], Optional[str]]:
+    """(text, error) of one page; the alarm handler is only installed around this page"""
+    use_alarm = (page_timeout > 0 and hasattr(signal, 'setitimer')
+                 and threading.current_thread() is threading.main_thread())
+    previous = signal.signal(signal.SIGALRM, _on_alarm) if use_alarm else None
+    try:
+        if use_alarm:
+            signal.setitimer(signal.ITIMER_REAL, page_timeout)
+        try:
+            return page.extract_text() or '', None
+        finally:
+            if use_alarm:
+                signal.setitimer(signal.ITIMER_REAL, 0)
+    except PageTimeout:
+        return None, f"timeout after {page_timeout}s"
+    except MemoryError:
+        raise  # not a page problem - the sandbox worker reports it for the document
+    except Exception as e:
+        return None, str(e) or e.__class__.__name__
+    finally:
+        if use_alarm:
+            signal.signal(signal.SIGALRM, previous)
+
+
+def iter_pages_sequential(reader, page_timeout: float = 0, cache=None) -> Iterator[PageResult]:
+    """Lazy single-process extraction (no timeout off the main thread)
+
+    cache: get/put store of page text by page_content_key - pages shared by
+    documents built from the same template are extracted once
+    """
+    for index in range(len(reader.pages)):
+        page = reader.pages[index]
+        key = page_content_key(page) if cache is not None else None
+        text = cache.get(key) if key is not None else None
+        if text is not None:
+            yield index, text, None
+            continue
+        text, error = _extract_page(page, page_timeout)
+        if key is not None and error is None:
+            cache.put(key, text)
+        yield index, text, error
+
+
+def extract_pages_sequential(reader, page_timeout: float = 0) -> List[PageResult]:
+    """Single-process extraction of all pages with the same result format"""
+    return list(iter_pages_sequential(reader, page_timeout))
+
+
+class ParallelExtractor:
+    """Persistent process pool for page extraction (one per worker process)"""
+
+    def __init__(self, workers: Optional[int] = None, page_timeout: float = 10.0,
+                 ranges_per_worker: int = 4):
+        self.workers = workers or os.cpu_count() or 1
+        self.page_timeout = page_timeout
+        self.ranges_per_worker = ranges_per_worker
+        self._pool = None
+        self._pool_pid = None
+        self._lock = threading.Lock()
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        # forkserver: safe to start from a threaded gunicorn worker
+        with self._lock:
+            if self._pool is None or self._pool_pid != os.getpid():
+                method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else None
+                context = multiprocessing.get_context(method)
+                self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+                self._pool_pid = os.getpid()
+            return self._pool
+
+    def _reset_pool(self) -> None:
+        with self._lock:
+            if self._pool is not None:
+                # A stuck worker would never pick up the shutdown - terminate it
+                for process in list((self._pool._processes or {}).values()):
+                    process.terminate()
+                self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def extract(self, pdf_bytes: bytes, page_count: int) -> List[PageResult]:
+        """Extract all pages in order; a crashed or timed-out range only fails its own pages"""
+        return list(self.iter_extract(pdf_bytes, page_count))
+
+    def iter_extract(self, pdf_bytes: bytes, page_count: int, cache=None,
+                     keys: Optional[Sequence[Optional[str]]] = None) -> Iterator[PageResult]:
+        """Pages in document order as their ranges complete
+
+        Cached pages (keys from page_content_key) are not sent to the pool.
+        Closing the generator early cancels the ranges not started yet.
+        """
+        if page_count <= 0:
+            return
+
+        cached: Dict[int, str] = {}
+        if cache is not None and keys:
+            for index, key in enumerate(keys):
+                text = cache.get(key) if key is not None else None
+                if text is not None:
+                    cached[index] = text
+        pending = [index for index in range(page_count) if index not in cached]
+
+        chunk = max(1, math.ceil(len(pending) / (self.workers * self.ranges_per_worker)))
+        ranges = [pending[start:start + chunk] for start in range(0, len(pending), chunk)]
+        # Whole range budget: every page may use its own timeout, plus start-up slack
+        range_timeout = self.page_timeout * chunk + 30 if self.page_timeout > 0 else None
+
+        shm = None
+        futures: List[Tuple[List[int], Any]] = []
+        broken = False
+        try:
+            if ranges:
+                shm = shared_memory.SharedMemory(create=True, size=max(1, len(pdf_bytes)))
+                shm.buf[:len(pdf_bytes)] = pdf_bytes
+                pool = self._get_pool()
+                futures = [(indices, pool.submit(_extract_range, shm.name, len(pdf_bytes),
+                                                 indices, self.page_timeout))
+                           for indices in ranges]
+
+            done: Dict[int, PageResult] = {}
+            next_range = 0
+            for index in range(page_count):
+                if index in cached:
+                    yield index, cached[index], None
+                    continue
+                while index not in done:
+                    indices, future = futures[next_range]
+                    next_range += 1
+                    try:
+                        results = future.result(timeout=range_timeout)
+                    except BrokenProcessPool as e:
+                        broken = True
+                        results = [(i, None, f"worker crashed: {e}") for i in indices]
+                    except Exception as e:
+                        # Stuck range (a page that ignored SIGALRM in C code) - the pool is recycled
+                        broken = True
+                        future.cancel()
+                        results = [(i, None, f"range failed: {e or e.__class__.__name__}") for i in indices]
+                    for result in results:
+                        done[result[0]] = result
+                        if cache is not None and keys and keys[result[0]] is not None and result[2] is None:
+                            cache.put(keys[result[0]], result[1])
+                yield done.pop(index)
+        finally:
+            for _, future in futures:
+                future.cancel()
+            if broken:
+                logger.warning("Page extraction pool recycled after a failed range")
+                self._reset_pool()
+            if shm is not None:
+                shm.close()
+                shm.unlink()
+
+    def shutdown(self) -> None:
+        self._reset_pool()
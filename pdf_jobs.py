@@ -0,0 +1,299 @@
+"""
+PDF analysis jobs
+Asynchronous PDF analysis: job state in SQLite shared by all workers,
+a bounded thread pool per worker and stage events for polling and SSE
+"""
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Stage -> approximate progress in percent (shown by the frontend)
+STAGE_PROGRESS = {
+    'queued': 0,
+    'extracting': 10,
+    'analysing': 40,
+    'calculating': 90,
+    'done': 100,
+    'error': 100
+}
+
+FINAL_STATUSES = ('done', 'error')
+
+
+class JobStore:
+    """Job state and stage events in a SQLite (WAL) file readable from any worker"""
+
+    def __init__(self, path: str, timeout: float = 5.0):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        conn = self._connect()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY,"
+            " status TEXT NOT NULL,"
+            " stage TEXT NOT NULL,"
+            " filename TEXT,"
+            " result TEXT,"
+            " error TEXT,"
+            " error_type TEXT,"
+            " created_at REAL NOT NULL,"
+            " updated_at REAL NOT NULL)"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS job_events ("
+            " seq INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " job_id TEXT NOT NULL,"
+            " stage TEXT NOT NULL,"
+            " data TEXT NOT NULL,"
+            " at REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS job_events_job ON job_events (job_id, seq)")
+
+    def _connect(self) -> sqlite3.Connection:
+        """One connection per thread (and per process - recreated after fork)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def create(self, filename: Optional[str] = None) -> str:
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        conn = self._connect()
+        conn.execute(
+            "INSERT INTO jobs (id, status, stage, filename, created_at, updated_at)"
+            " VALUES (?, 'queued', 'queued', ?, ?, ?)",
+            (job_id, filename, now, now)
+        )
+        self._add_event(conn, job_id, 'queued', {}, now)
+        return job_id
+
+    def set_stage(self, job_id: str, stage: str, data: Optional[Dict[str, Any]] = None) -> None:
+        now = time.time()
+        conn = self._connect()
+        conn.execute("UPDATE jobs SET status = 'running', stage = ?, updated_at = ? WHERE id = ?",
+                     (stage, now, job_id))
+        self._add_event(conn, job_id, stage, data or {}, now)
+
+    def add_event(self, job_id: str, name: str, data: Optional[Dict[str, Any]] = None) -> None:
+        """Event that does not change the stage (e.g. a found_data field)"""
+        now = time.time()
+        conn = self._connect()
+        conn.execute("UPDATE jobs SET updated_at = ? WHERE id = ?", (now, job_id))
+        self._add_event(conn, job_id, name, data or {}, now)
+
+    def finish(self, job_id: str, result: Optional[Dict[str, Any]] = None,
+               error: Optional[str] = None, error_type: Optional[str] = None) -> None:
+        now = time.time()
+        status = 'error' if error else 'done'
+        conn = self._connect()
+        conn.execute(
+            "UPDATE jobs SET status = ?, stage = ?, result = ?, error = ?, error_type = ?,"
+            " updated_at = ? WHERE id = ?",
+            (status, status, json.dumps(result, ensure_ascii=False) if result is not None else None,
+             error, error_type, now, job_id)
+        )
+        data = {'error': error, 'error_type': error_type} if error else {}
+        self._add_event(conn, job_id, status, data, now)
+
+    def _add_event(self, conn: sqlite3.Connection, job_id: str, stage: str,
+                   data: Dict[str, Any], now: float) -> None:
+        conn.execute("INSERT INTO job_events (job_id, stage, data, at) VALUES (?, ?, ?, ?)",
+                     (job_id, stage, json.dumps(data, ensure_ascii=False), now))
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        row = self._connect().execute(
+            "SELECT id, status, stage, filename, result, error, error_type, created_at, updated_at"
+            " FROM jobs WHERE id = ?", (job_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        job_id, status, stage, filename, result, error, error_type, created_at, updated_at = row
+        return {
+            'job_id': job_id,
+            'status': status,
+            'stage': stage,
+            'progress': STAGE_PROGRESS.get(stage, 0),
+            'filename': filename,
+            'result': json.loads(result) if result else None,
+            'error': error,
+            'error_type': error_type,
+            'created_at': created_at,
+            'updated_at': updated_at
+        }
+
+    def events_since(self, job_id: str, seq: int = 0) -> List[Dict[str, Any]]:
+        rows = self._connect().execute(
+            "SELECT seq, stage, data, at FROM job_events WHERE job_id = ? AND seq > ? ORDER BY seq",
+            (job_id, seq)
+        ).fetchall()
+        return [
+            dict(json.loads(data), seq=seq, stage=stage, progress=STAGE_PROGRESS.get(stage), at=at)
+            for seq, stage, data, at in rows
+        ]
+
+    def purge(self, older_than: float) -> int:
+        """Delete finished jobs (and their events) not updated for `older_than` seconds"""
+        cutoff = time.time() - older_than
+        conn = self._connect()
+        conn.execute(
+            "DELETE FROM job_events WHERE job_id IN"
+            " (SELECT id FROM jobs WHERE status IN ('done', 'error') AND updated_at < ?)", (cutoff,)
+        )
+        return conn.execute(
+            "DELETE FROM jobs WHERE status IN ('done', 'error') AND updated_at < ?", (cutoff,)
+        ).rowcount
+
+    def counts(self) -> Dict[str, int]:
+        rows = self._connect().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return dict(rows)
+
+
+class PDFJobRunner:
+    """Bounded pool running the PDF pipeline in the background of this worker
+
+    `process` is called as process(source, progress=callback) and returns the
+    process_pdf_file result dict. The source is raw bytes (wrapped in BytesIO)
+    or a spooled upload, which the runner closes once the job has finished.
+    """
+
+    def __init__(self, store: JobStore, process: Callable[..., Dict[str, Any]],
+                 workers: int = 2, queue_limit: int = 16, job_ttl: float = 3600,
+                 stale_after: float = 300):
+        self.store = store
+        self.process = process
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self.job_ttl = job_ttl
+        self.stale_after = stale_after
+        self._executor = None
+        self._executor_pid = None
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._metrics = Counter()
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        # Threads do not survive fork - each worker process gets its own pool
+        with self._lock:
+            if self._executor is None or self._executor_pid != os.getpid():
+                self._executor = ThreadPoolExecutor(max_workers=self.workers,
+                                                    thread_name_prefix='pdf-job')
+                self._executor_pid = os.getpid()
+                self._pending = 0
+            return self._executor
+
+    def submit(self, pdf_source: Any, filename: Optional[str] = None) -> Optional[str]:
+        """Queue the analysis; returns the job id or None when the queue is full
+
+        On None the source still belongs to the caller.
+        """
+        executor = self._get_executor()
+        with self._lock:
+            if self._pending >= self.queue_limit:
+                self._metrics['rejected'] += 1
+                return None
+            self._pending += 1
+            self._metrics['submitted'] += 1
+
+        try:
+            self.store.purge(self.job_ttl)
+            job_id = self.store.create(filename)
+            executor.submit(self._run, job_id, pdf_source)
+            return job_id
+        except Exception:
+            with self._lock:
+                self._pending -= 1
+            raise
+
+    def _run(self, job_id: str, pdf_source: Any) -> None:
+        def progress(stage: str, data: Optional[Dict[str, Any]] = None) -> None:
+            try:
+                if stage in STAGE_PROGRESS:
+                    self.store.set_stage(job_id, stage, data)
+                else:
+                    self.store.add_event(job_id, stage, data)
+            except sqlite3.Error as e:
+                logger.warning(f"Could not record stage {stage} of PDF job {job_id}: {e}")
+
+        started = time.monotonic()
+        try:
+            source = BytesIO(pdf_source) if isinstance(pdf_source, (bytes, bytearray)) else pdf_source
+            result = self.process(source, progress=progress)
+            if result.get('processing_status') == 'success':
+                self.store.finish(job_id, result=result)
+                self._metrics['done'] += 1
+            else:
+                self.store.finish(job_id, result=result,
+                                  error=result.get('error_message', 'Błąd analizy PDF'),
+                                  error_type=result.get('error_type'))
+                self._metrics['failed'] += 1
+        except Exception as e:
+            logger.error(f"PDF job {job_id} failed: {e}", exc_info=True)
+            self._metrics['failed'] += 1
+            try:
+                self.store.finish(job_id, error=f"Nieoczekiwany błąd: {str(e)}", error_type='unexpected_error')
+            except sqlite3.Error:
+                pass
+        finally:
+            if hasattr(pdf_source, 'close'):
+                pdf_source.close()
+            with self._lock:
+                self._pending -= 1
+                self._metrics['run_seconds'] += time.monotonic() - started
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Job state; a job not updated for `stale_after` seconds lost its worker"""
+        job = self.store.get(job_id)
+        if job and job['status'] not in FINAL_STATUSES and time.time() - job['updated_at'] > self.stale_after:
+            job.update(status='error', stage='error', progress=STAGE_PROGRESS['error'],
+                       error='Zadanie analizy zostało przerwane', error_type='job_lost')
+        return job
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            metrics = dict(self._metrics)
+            pending = self._pending
+        finished = metrics.get('done', 0) + metrics.get('failed', 0)
+        return {
+            'workers': self.workers,
+            'queue_limit': self.queue_limit,
+            'pending_in_worker': pending,
+            'submitted': metrics.get('submitted', 0),
+            'rejected': metrics.get('rejected', 0),
+            'done': metrics.get('done', 0),
+            'failed': metrics.get('failed', 0),
+            'avg_run_seconds': round(metrics.get('run_seconds', 0) / finished, 3) if finished else None,
+            'jobs_by_status': self.store.counts()
+        }
+
+
+def create_job_runner(process: Callable[..., Dict[str, Any]]) -> PDFJobRunner:
+    """Job runner configured from PDF_JOB_* environment variables"""
+    path = os.environ.get('PDF_JOB_DB') or os.path.join(tempfile.gettempdir(), 'wycena2025_pdf_jobs.sqlite3')
+    return PDFJobRunner(
+        JobStore(path),
+        process,
+        workers=int(os.environ.get('PDF_JOB_WORKERS', 2)),
+        queue_limit=int(os.environ.get('PDF_JOB_QUEUE', 16)),
+        job_ttl=float(os.environ.get('PDF_JOB_TTL', 3600)),
+        stale_after=float(os.environ.get('PDF_JOB_STALE_AFTER', 300))
+    )
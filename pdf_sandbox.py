@@ -0,0 +1,356 @@
+"""
+Sandboxed PDF text extraction
+PyPDF2 runs in pre-forked worker processes with an address space limit and a
+CPU time limit per document; the parent enforces a wall-clock deadline and
+kills the worker when it is missed. A worker is replaced after any limit hit
+and after a fixed number of documents. The upload's file descriptor is passed
+to the worker, which maps it - the document is never copied between processes.
+
+Protocol per document (parent -> worker, worker -> parent):
+    ('extract', job, page_timeout, cpu_seconds, with_keys) + file descriptor
+    ('pages', job, count, keys)
+    ('cached', job, indices)      pages the parent already has
+    ('page', job, index, text, error) ...
+    ('stop', job)                 the parent needs no more pages
+    ('done', job) | ('failed', job, reason, message)
+"""
+import itertools
+import logging
+import mmap
+import multiprocessing
+import os
+import queue
+import signal
+import threading
+import time
+from multiprocessing import reduction
+from typing import Any, Dict, Iterator, Optional
+
+from pdf_extract import PageResult, _extract_page, page_content_key
+
+try:
+    import resource
+except ImportError:  # not on Windows - the sandbox keeps only the deadline
+    resource = None
+
+try:
+    from PyPDF2 import PdfReader
+except ImportError:
+    PdfReader = None
+
+logger = logging.getLogger(__name__)
+
+# reason -> (error_type, message for the user)
+LIMIT_ERRORS = {
+    'timeout': ('extraction_timeout',
+                "Odczyt pliku PDF przekroczył limit czasu - plik może być uszkodzony lub zbyt złożony"),
+    'cpu_limit': ('extraction_cpu_limit',
+                  "Odczyt pliku PDF przekroczył limit czasu procesora - plik może być uszkodzony lub zbyt złożony"),
+    'memory_limit': ('extraction_memory_limit',
+                     "Odczyt pliku PDF przekroczył limit pamięci - plik może być uszkodzony lub zbyt złożony"),
+    'crashed': ('extraction_crashed', "Proces odczytu pliku PDF zakończył się nieoczekiwanie"),
+    'busy': ('extraction_busy', "Wszystkie procesy odczytu PDF są zajęte - spróbuj ponownie za chwilę"),
+}
+# error_type -> HTTP status of the synchronous API response
+LIMIT_HTTP_STATUS = {error_type: 503 if reason == 'busy' else 422
+                     for reason, (error_type, _) in LIMIT_ERRORS.items()}
+
+
+class ExtractionLimitExceeded(Exception):
+    """The document hit a sandbox limit; carries the API error type"""
+
+    def __init__(self, reason: str):
+        self.reason = reason
+        self.error_type, self.message = LIMIT_ERRORS[reason]
+        self.http_status = LIMIT_HTTP_STATUS[self.error_type]
+        super().__init__(self.message)
+
+
+class SandboxError(Exception):
+    """Extraction failed inside the worker (unreadable PDF) - the worker stays up"""
+    pass
+
+
+class _CpuLimit(BaseException):
+    """Raised by the SIGXCPU handler; BaseException so page-level handlers let it through"""
+    pass
+
+
+def _on_xcpu(signum, frame):
+    raise _CpuLimit()
+
+
+def _set_cpu_limit(seconds: Optional[float]) -> None:
+    """Soft RLIMIT_CPU `seconds` from now (cumulative for the process), None lifts it"""
+    if resource is None:
+        return
+    _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    if seconds is None:
+        soft = hard
+    else:
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        soft = int(usage.ru_utime + usage.ru_stime + seconds) + 1
+        if hard != resource.RLIM_INFINITY:
+            soft = min(soft, hard)
+    resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+
+
+def _worker_main(conn, memory_limit: int) -> None:
+    """Worker loop: one document at a time until told to exit or a limit was hit"""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # Ctrl+C is for the parent
+    if resource is not None:
+        signal.signal(signal.SIGXCPU, _on_xcpu)
+        if memory_limit > 0:
+            resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, OSError):
+            return
+        if message[0] == 'exit':
+            return
+        if message[0] != 'extract':
+            continue  # a late 'stop' for a document that had already finished
+        _, job, page_timeout, cpu_seconds, with_keys = message
+        fd = reduction.recv_handle(conn)
+        if not _run_job(conn, job, fd, page_timeout, cpu_seconds, with_keys):
+            return  # state after a limit hit is not trusted - the parent starts a new worker
+
+
+def _run_job(conn, job: int, fd: int, page_timeout: float, cpu_seconds: float, with_keys: bool) -> bool:
+    """Extract one document; False when the worker has to be replaced"""
+    reader = buffer = None
+    try:
+        _set_cpu_limit(cpu_seconds if cpu_seconds > 0 else None)
+        with open(fd, 'rb') as file:
+            buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            reader = PdfReader(buffer)
+            count = len(reader.pages)
+            keys = [page_content_key(page) for page in reader.pages] if with_keys else None
+            conn.send(('pages', job, count, keys))
+
+            reply = conn.recv()
+            cached = reply[2] if reply[0] == 'cached' else None
+            for index in range(count if cached is not None else 0):
+                if index in cached:
+                    continue
+                if conn.poll() and conn.recv()[0] == 'stop':
+                    break
+                text, error = _extract_page(reader.pages[index], page_timeout)
+                conn.send(('page', job, index, text, error))
+        conn.send(('done', job))
+        return True
+    except _CpuLimit:
+        reader = None
+        conn.send(('failed', job, 'cpu_limit', f"CPU limit of {cpu_seconds}s exceeded"))
+        return False
+    except MemoryError:
+        reader = None  # free what we can before building the reply
+        conn.send(('failed', job, 'memory_limit', "address space limit exceeded"))
+        return False
+    except Exception as e:
+        conn.send(('failed', job, 'error', str(e) or e.__class__.__name__))
+        return True
+    finally:
+        reader = None
+        if buffer is not None:
+            buffer.close()
+        _set_cpu_limit(None)
+
+
+class _Worker:
+    __slots__ = ('process', 'conn', 'jobs', 'alive')
+
+    def __init__(self, process, conn):
+        self.process = process
+        self.conn = conn
+        self.jobs = 0
+        self.alive = True
+
+
+class SandboxPool:
+    """Pre-forked extraction workers with per-document limits (one pool per worker process)"""
+
+    def __init__(self, workers: int = 2, deadline: float = 30.0, cpu_seconds: float = 20.0,
+                 memory_limit: int = 1024 * 1024 * 1024, max_jobs: int = 100,
+                 queue_timeout: Optional[float] = None):
+        self.workers = workers
+        self.deadline = deadline
+        self.queue_timeout = deadline if queue_timeout is None else queue_timeout
+        self.cpu_seconds = cpu_seconds
+        self.memory_limit = memory_limit
+        self.max_jobs = max_jobs
+        self._idle: Optional[queue.Queue] = None
+        self._pool_pid = None
+        self._lock = threading.Lock()
+        self._jobs = itertools.count(1)
+        self._counters = {'documents': 0, 'timeouts': 0, 'cpu_limit_kills': 0, 'memory_limit_kills': 0,
+                          'crashes': 0, 'busy': 0, 'recycled_after_failure': 0, 'recycled_after_max_jobs': 0,
+                          'started': 0}
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._counters[name] += 1
+
+    def _spawn(self) -> _Worker:
+        # forkserver: safe to start from a threaded gunicorn worker
+        method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else None
+        context = multiprocessing.get_context(method)
+        parent_conn, child_conn = context.Pipe()
+        process = context.Process(target=_worker_main, args=(child_conn, self.memory_limit),
+                                  name='pdf-sandbox', daemon=True)
+        process.start()
+        child_conn.close()
+        self._count('started')
+        return _Worker(process, parent_conn)
+
+    def _pool(self) -> queue.Queue:
+        with self._lock:
+            if self._idle is None or self._pool_pid != os.getpid():
+                self._idle = queue.Queue()
+                self._pool_pid = os.getpid()
+                spawn = True
+            else:
+                spawn = False
+        if spawn:
+            for _ in range(self.workers):
+                self._idle.put(self._spawn())
+        return self._idle
+
+    def _release(self, worker: _Worker) -> None:
+        if worker.alive and worker.jobs >= self.max_jobs:
+            self._stop(worker)
+            self._count('recycled_after_max_jobs')
+        elif not worker.alive:
+            self._count('recycled_after_failure')
+        if not worker.alive:
+            self._discard(worker)
+            worker = self._spawn()
+        self._pool().put(worker)
+
+    def _stop(self, worker: _Worker) -> None:
+        try:
+            worker.conn.send(('exit',))
+        except OSError:
+            pass
+        worker.process.join(1)
+        worker.alive = False
+
+    def _discard(self, worker: _Worker) -> None:
+        if worker.process.is_alive():
+            worker.process.kill()
+        worker.process.join(1)
+        worker.conn.close()
+        worker.alive = False
+
+    def _receive(self, worker: _Worker, job: int, deadline: float):
+        """Next message of this job; kills the worker and raises on deadline or death"""
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not worker.conn.poll(remaining):
+                self._discard(worker)
+                self._count('timeouts')
+                raise ExtractionLimitExceeded('timeout')
+            try:
+                message = worker.conn.recv()
+            except (EOFError, OSError):
+                self._discard(worker)
+                code = worker.process.exitcode
+                # The kernel kills at the hard CPU limit with SIGKILL/SIGXCPU
+                reason = 'cpu_limit' if code in (-signal.SIGXCPU,) else 'crashed'
+                self._count('cpu_limit_kills' if reason == 'cpu_limit' else 'crashes')
+                logger.warning(f"PDF sandbox worker died (exit code {code})")
+                raise ExtractionLimitExceeded(reason)
+            if message[1] != job:
+                continue  # leftover of an earlier document
+            if message[0] == 'failed':
+                _, _, reason, detail = message
+                if reason == 'error':
+                    raise SandboxError(detail)
+                worker.alive = False  # the worker exits on its own
+                self._discard(worker)
+                self._count(f"{reason}_kills")
+                logger.warning(f"PDF sandbox limit hit: {detail}")
+                raise ExtractionLimitExceeded(reason)
+            return message
+
+    def iter_pages(self, file_obj, page_timeout: float = 0, cache=None,
+                   info: Optional[Dict[str, Any]] = None) -> Iterator[PageResult]:
+        """Pages of the document behind file_obj.fileno(), in order, extracted in a worker
+
+        Cached pages (by page_content_key) are not extracted again. Closing
+        the generator early tells the worker to stop after the current page.
+        `info['page_count']` is set once the worker has parsed the page tree.
+        Waiting over `queue_timeout` for a free worker raises 'busy'; the
+        deadline of the document starts once it has a worker.
+        """
+        idle = self._pool()
+        try:
+            worker = idle.get(timeout=self.queue_timeout)
+        except queue.Empty:
+            self._count('busy')
+            raise ExtractionLimitExceeded('busy')
+        deadline = time.monotonic() + self.deadline
+
+        job = next(self._jobs)
+        worker.jobs += 1
+        self._count('documents')
+        finished = False
+        try:
+            worker.conn.send(('extract', job, page_timeout, self.cpu_seconds, cache is not None))
+            reduction.send_handle(worker.conn, file_obj.fileno(), worker.process.pid)
+            _, _, count, keys = self._receive(worker, job, deadline)
+            if info is not None:
+                info['page_count'] = count
+
+            cached: Dict[int, Any] = {}
+            for index, key in enumerate(keys or []):
+                text = cache.get(key) if key is not None else None
+                if text is not None:
+                    cached[index] = text
+            worker.conn.send(('cached', job, set(cached)))
+
+            for index in range(count):
+                if index in cached:
+                    yield index, cached[index], None
+                    continue
+                _, _, page_index, text, error = self._receive(worker, job, deadline)
+                if cache is not None and keys and keys[page_index] is not None and error is None:
+                    cache.put(keys[page_index], text)
+                yield page_index, text, error
+            self._receive(worker, job, deadline)  # 'done'
+            finished = True
+        except SandboxError:
+            finished = True  # the worker reported it and is ready for the next document
+            raise
+        finally:
+            if not finished and worker.alive:
+                # Stopped early by the caller: let the worker finish its page, then reuse it
+                try:
+                    worker.conn.send(('stop', job))
+                    while self._receive(worker, job, deadline)[0] != 'done':
+                        pass
+                except (ExtractionLimitExceeded, SandboxError, OSError):
+                    pass
+            self._release(worker)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._counters)
+        stats.update(workers=self.workers, deadline_seconds=self.deadline,
+                     queue_timeout_seconds=self.queue_timeout, cpu_seconds=self.cpu_seconds,
+                     memory_limit_mb=self.memory_limit // (1024 * 1024), max_jobs=self.max_jobs,
+                     idle=self._idle.qsize() if self._idle is not None else 0)
+        stats['kills'] = stats['timeouts'] + stats['cpu_limit_kills'] + stats['memory_limit_kills']
+        return stats
+
+    def shutdown(self) -> None:
+        if self._idle is None:
+            return
+        while True:
+            try:
+                self._stop(self._idle.get_nowait())
+            except queue.Empty:
+                break
+        self._idle = None
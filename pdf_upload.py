@@ -0,0 +1,184 @@
+"""
+PDF upload spooling and structural pre-check
+Uploads are copied in chunks to an anonymous temporary file and memory-mapped,
+so the request never holds the document as one bytes object; the header,
+trailer and page tree are inspected before PyPDF2 parses anything
+"""
+import hashlib
+import logging
+import mmap
+import re
+import tempfile
+from typing import Any, BinaryIO, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+SPOOL_CHUNK = 64 * 1024
+HEADER_WINDOW = 1024  # the spec tolerates junk before %PDF-
+TRAILER_WINDOW = 4096
+SCAN_WINDOW = 1024 * 1024  # multiple of the page size - released after each window
+SCAN_OVERLAP = 256  # longest token match that may cross a window edge
+
+_PAGES_COUNT_RE = re.compile(rb'/Count\s+(\d+)')
+_PAGES_TYPE_RE = re.compile(rb'/Type\s*/Pages(?![A-Za-z])')
+_OBJSTM_RE = re.compile(rb'/Type\s*/ObjStm(?![A-Za-z])')
+_FONT_RE = re.compile(rb'/Font(?![A-Za-z])')
+_IMAGE_RE = re.compile(rb'/Subtype\s*/Image(?![A-Za-z])')
+
+
+class UploadRejected(Exception):
+    """Upload refused before parsing; carries the API error type and HTTP status"""
+
+    def __init__(self, message: str, error_type: str, http_status: int = 400):
+        super().__init__(message)
+        self.message = message
+        self.error_type = error_type
+        self.http_status = http_status
+
+
+class PDFUpload:
+    """Read-only memory map of a spooled upload; the file disappears on close"""
+
+    def __init__(self, file: BinaryIO, size: int, sha256: str):
+        self._file = file
+        self.size = size
+        self.sha256 = sha256
+        self.buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.probe: Optional[Dict[str, Any]] = None
+
+    def fileno(self) -> int:
+        """Descriptor of the spooled file - passed to the extraction sandbox"""
+        return self._file.fileno()
+
+    def stream(self) -> mmap.mmap:
+        """File-like view for PdfReader (read/seek/tell), rewound"""
+        self.buffer.seek(0)
+        return self.buffer
+
+    def release_pages(self, start: int = 0, length: int = 0) -> None:
+        """Drop resident pages of the mapping - they stay in the page cache, not in our RSS"""
+        if hasattr(mmap, 'MADV_DONTNEED'):
+            try:
+                self.buffer.madvise(mmap.MADV_DONTNEED, start, length or self.size - start)
+            except (OSError, ValueError):
+                pass
+
+    def close(self) -> None:
+        if not self.buffer.closed:
+            self.buffer.close()
+        self._file.close()
+
+    def __enter__(self) -> 'PDFUpload':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def spool_upload(stream: BinaryIO, max_bytes: int, chunk_size: int = SPOOL_CHUNK) -> PDFUpload:
+    """Copy an upload stream to a temporary file, hashing on the way
+
+    Raises UploadRejected ('too_large', 'empty_file') without keeping more
+    than one chunk in memory.
+    """
+    if hasattr(stream, 'seek'):
+        try:
+            stream.seek(0)
+        except (OSError, ValueError):
+            pass
+
+    spool = tempfile.TemporaryFile(prefix='wycena2025_upload_')
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        while True:
+            chunk = stream.read(chunk_size)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > max_bytes:
+                raise UploadRejected(
+                    f"Plik PDF jest za duży (limit {max_bytes // (1024 * 1024)} MB)", 'too_large', 413)
+            digest.update(chunk)
+            spool.write(chunk)
+        if size == 0:
+            raise UploadRejected("Przesłany plik jest pusty", 'empty_file')
+        spool.flush()
+        return PDFUpload(spool, size, digest.hexdigest())
+    except BaseException:
+        spool.close()
+        raise
+
+
+def _enclosing_object(buffer, position: int) -> bytes:
+    """Bytes of the indirect object around `position` ('n g obj' ... 'endobj')"""
+    start = buffer.rfind(b' obj', 0, position)
+    end = buffer.find(b'endobj', position)
+    if start < 0:
+        start = max(0, position - 512)
+    if end < 0:
+        end = min(len(buffer), position + 512)
+    return buffer[start:end]
+
+
+def inspect_pdf(upload: PDFUpload, max_pages: int = 0) -> Dict[str, Any]:
+    """Header, trailer and page tree check on the raw bytes, no PDF parse
+
+    Returns the probe dict (also stored on upload.probe) or raises
+    UploadRejected: 'not_pdf', 'too_many_pages', 'scanned_pdf'. Page count,
+    fonts and images are only visible when the objects are not packed in
+    compressed object streams - then the values are None and the full parse
+    decides.
+    """
+    if upload.probe is not None:
+        return upload.probe
+
+    buffer = upload.buffer
+    header_at = buffer.find(b'%PDF-', 0, HEADER_WINDOW)
+    if header_at < 0:
+        raise UploadRejected("Plik nie jest dokumentem PDF", 'not_pdf', 415)
+    version = buffer[header_at + 5:header_at + 8].decode('latin-1', 'replace')
+
+    tail_start = max(0, upload.size - TRAILER_WINDOW)
+    truncated = buffer.find(b'startxref', tail_start) < 0 or buffer.find(b'%%EOF', tail_start) < 0
+
+    # One pass in windows so at most SCAN_WINDOW of the file is resident at a time
+    object_streams = False
+    page_count = None
+    fonts = images = 0
+    for start in range(0, upload.size, SCAN_WINDOW):
+        end = min(start + SCAN_WINDOW, upload.size)
+        stop = min(end + SCAN_OVERLAP, upload.size)
+        object_streams = object_streams or _OBJSTM_RE.search(buffer, start, stop) is not None
+        fonts += sum(1 for match in _FONT_RE.finditer(buffer, start, stop) if match.start() < end)
+        images += sum(1 for match in _IMAGE_RE.finditer(buffer, start, stop) if match.start() < end)
+        # The root of the page tree has the largest /Count of all /Type /Pages nodes
+        for match in _PAGES_COUNT_RE.finditer(buffer, start, stop):
+            if match.start() < end and _PAGES_TYPE_RE.search(_enclosing_object(buffer, match.start())):
+                count = int(match.group(1))
+                page_count = count if page_count is None else max(page_count, count)
+        upload.release_pages(start, end - start)
+
+    if object_streams:
+        # Fonts and images may sit inside compressed object streams - unknown
+        fonts = images = None
+    probe = {
+        'version': version,
+        'size': upload.size,
+        'page_count': page_count,
+        'object_streams': object_streams,
+        'fonts': fonts,
+        'images': images,
+        'truncated': truncated
+    }
+    upload.probe = probe
+    logger.debug(f"PDF probe: {probe}")
+
+    if truncated:
+        logger.warning("PDF trailer missing (truncated upload?) - leaving it to the parser")
+    if max_pages and page_count is not None and page_count > max_pages:
+        raise UploadRejected(f"Dokument ma {page_count} stron (limit {max_pages})", 'too_many_pages', 413)
+    if fonts == 0 and images:
+        raise UploadRejected("Plik PDF zawiera wyłącznie skany bez warstwy tekstowej - "
+                             "prześlij wersję z tekstem lub wprowadź dane ręcznie", 'scanned_pdf', 422)
+    return probe
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+Postcode climate zones
+Indeks kod pocztowy -> strefa klimatyczna PN-EN 12831 w pliku binarnym mapowanym w pamięci
+
+Plik zawiera nagłówek i tablicę 100 000 rekordów (kody 00-000 ... 99-999),
+po 4 bajty: strefa (uint8, 0 = brak danych), temperatura projektowa (int8, °C),
+średnia temperatura zewnętrzna (int16, dziesiąte części °C). Odczyt to jedno
+przesunięcie w mmap - O(1), a strony pliku są współdzielone przez wszystkie
+workery na hoście.
+
+Użycie:
+    python postcode_zones.py build [--csv kody.csv] [--out postcode_zones.bin]
+    python postcode_zones.py lookup 34-500
+"""
+import argparse
+import csv
+import logging
+import mmap
+import os
+import re
+import struct
+import tempfile
+import threading
+from typing import Dict, Iterable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'PLCZ'
+VERSION = 1
+HEADER = struct.Struct('<4sHHI')  # magic, wersja, rozmiar rekordu, liczba rekordów
+RECORD = struct.Struct('<Bbh')
+RECORD_COUNT = 100000
+
+# Strefa -> (temperatura projektowa °C, średnia roczna temperatura zewnętrzna °C)
+ZONE_CLIMATE = {
+    1: (-16, 7.7),
+    2: (-18, 7.9),
+    3: (-20, 7.6),
+    4: (-22, 6.9),
+    5: (-24, 5.5)
+}
+
+# Przybliżone strefy wg dwucyfrowego prefiksu kodu (okręgi pocztowe)
+DEFAULT_PREFIX_ZONES = {
+    **{f"{p:02d}": 3 for p in range(0, 10)},
+    '07': 4,
+    **{f"{p:02d}": 4 for p in range(10, 20)},
+    '16': 5,
+    **{f"{p:02d}": 3 for p in range(20, 40)},
+    '38': 4,
+    **{f"{p:02d}": 2 for p in range(40, 50)},
+    '43': 3,
+    **{f"{p:02d}": 2 for p in range(50, 60)},
+    '57': 3, '58': 3,
+    **{f"{p:02d}": 2 for p in range(60, 65)},
+    **{f"{p:02d}": 1 for p in range(65, 80)},
+    '77': 2,
+    **{f"{p:02d}": 2 for p in range(80, 90)},
+    **{f"{p:02d}": 3 for p in range(90, 100)}
+}
+
+# Doprecyzowania trzycyfrowe: Podhale, Tatry, Bieszczady
+DEFAULT_DETAIL_ZONES = {
+    '344': 5, '345': 5, '346': 5, '384': 5, '387': 5
+}
+
+_POSTCODE_RE = re.compile(r'^\s*(\d{2})-?(\d{3})\s*$')
+
+
+def postcode_number(postcode) -> Optional[int]:
+    """'34-500' / '34500' -> 34500; None dla niepoprawnego kodu"""
+    match = _POSTCODE_RE.match(str(postcode or ''))
+    if not match:
+        return None
+    return int(match.group(1) + match.group(2))
+
+
+def _prefix_overrides(rows: Iterable[Tuple[str, int]]) -> Dict[str, int]:
+    overrides = {}
+    for prefix, zone in rows:
+        digits = re.sub(r'\D', '', prefix)
+        if 2 <= len(digits) <= 5 and zone in ZONE_CLIMATE:
+            overrides[digits] = zone
+    return overrides
+
+
+def build_index(path: str, csv_path: Optional[str] = None) -> str:
+    """Zbuduj plik indeksu; CSV 'kod,strefa' (kod: 2-5 cyfr, np. 34-5 lub 34-500) nadpisuje domyślne strefy"""
+    overrides = dict(DEFAULT_DETAIL_ZONES)
+    if csv_path:
+        with open(csv_path, 'r', encoding='utf-8') as f:
+            rows = [(row[0], int(row[1])) for row in csv.reader(f)
+                    if len(row) >= 2 and row[1].strip().isdigit()]
+        overrides.update(_prefix_overrides(rows))
+
+    by_length = {length: {k: v for k, v in overrides.items() if len(k) == length}
+                 for length in (5, 4, 3, 2)}
+
+    data = bytearray(HEADER.size + RECORD.size * RECORD_COUNT)
+    HEADER.pack_into(data, 0, MAGIC, VERSION, RECORD.size, RECORD_COUNT)
+    for number in range(RECORD_COUNT):
+        digits = f"{number:05d}"
+        zone = DEFAULT_PREFIX_ZONES.get(digits[:2], 0)
+        # Najdokładniejszy pasujący prefiks wygrywa
+        for length in (5, 4, 3, 2):
+            found = by_length[length].get(digits[:length])
+            if found:
+                zone = found
+                break
+        if zone:
+            design_temp, avg_temp = ZONE_CLIMATE[zone]
+            RECORD.pack_into(data, HEADER.size + number * RECORD.size,
+                             zone, design_temp, int(round(avg_temp * 10)))
+
+    # Zapis atomowy - równolegle startujące workery nie zobaczą połowy pliku
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.postcode_zones.')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+    logger.info(f"Postcode climate zone index written to {path}")
+    return path
+
+
+class PostcodeZoneIndex:
+    """Indeks kodów pocztowych mapowany w pamięci (tylko odczyt)"""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, record_size, count = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC or version != VERSION or record_size != RECORD.size:
+            raise ValueError(f"Unsupported postcode index format: {path}")
+        if len(self._mmap) < HEADER.size + record_size * count:
+            raise ValueError(f"Truncated postcode index: {path}")
+        self.count = count
+
+    def lookup(self, postcode) -> Optional[Dict[str, float]]:
+        """Strefa, temperatura projektowa i średnia temperatura dla kodu lub None"""
+        number = postcode_number(postcode)
+        if number is None or number >= self.count:
+            return None
+        zone, design_temp, avg_temp = RECORD.unpack_from(self._mmap, HEADER.size + number * RECORD.size)
+        if not zone:
+            return None
+        return {
+            'zone': zone,
+            'design_temp': design_temp,
+            'avg_temp': avg_temp / 10
+        }
+
+    def close(self) -> None:
+        self._mmap.close()
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def default_index_path() -> str:
+    return os.environ.get('CIEPLO_POSTCODE_INDEX') or os.path.join(
+        tempfile.gettempdir(), 'wycena2025_postcode_zones.bin')
+
+
+def get_index(path: Optional[str] = None) -> Optional[PostcodeZoneIndex]:
+    """Wspólny indeks procesu; plik budowany z domyślnych stref, jeśli go brak
+
+    Ścieżka liczy się tylko przy pierwszym wywołaniu (start aplikacji).
+    """
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                path = path or default_index_path()
+                try:
+                    if not os.path.exists(path):
+                        build_index(path)
+                    _index = PostcodeZoneIndex(path)
+                except (OSError, ValueError) as e:
+                    logger.warning(f"Postcode climate zone index unavailable: {e}")
+                    return None
+    return _index
+
+
+def lookup(postcode) -> Optional[Dict[str, float]]:
+    index = get_index()
+    return index.lookup(postcode) if index else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Indeks kod pocztowy -> strefa klimatyczna')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    build = sub.add_parser('build', help='zbuduj plik indeksu')
+    build.add_argument('--csv', help="CSV 'kod,strefa' (kod: prefiks 2-5 cyfr)")
+    build.add_argument('--out', default=default_index_path())
+
+    find = sub.add_parser('lookup', help='sprawdź kod pocztowy')
+    find.add_argument('postcode')
+    find.add_argument('--index', default=default_index_path())
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    if args.command == 'build':
+        build_index(args.out, args.csv)
+    else:
+        if not os.path.exists(args.index):
+            build_index(args.index)
+        print(PostcodeZoneIndex(args.index).lookup(args.postcode))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,456 @@
+"""
+Resilience helpers
+Mechanizmy ochrony wywołań zewnętrznych API (cieplo.app)
+"""
+import json
+import os
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Hashable, Iterator, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+def _percentile(values, p: float) -> Optional[float]:
+    """Percentyl p (0-100) z posortowanej listy"""
+    if not values:
+        return None
+    index = min(len(values) - 1, max(0, int(round(p / 100 * len(values))) - 1))
+    return values[index]
+
+
+class SingleFlightTimeout(Exception):
+    """Oczekiwanie na trwające identyczne wywołanie przekroczyło limit czasu"""
+    pass
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error', 'waiters')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Łączenie identycznych równoległych wywołań w jedno (klucz = klucz cache)
+
+    Pierwszy wątek z danym kluczem wykonuje funkcję, kolejne czekają na jej
+    wynik (maksymalnie `timeout` sekund) i dostają ten sam obiekt.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+
+        self.leaders = 0
+        self.coalesced = 0
+        self.timeouts = 0
+
+    def do(self, key: Hashable, fn: Callable[[], Any], timeout: float) -> Tuple[Any, bool]:
+        """Zwróć (wynik, czy_współdzielony)"""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = _Call()
+                self._calls[key] = call
+                self.leaders += 1
+                leader = True
+            else:
+                call.waiters += 1
+                self.coalesced += 1
+                leader = False
+
+        if not leader:
+            if not call.done.wait(timeout):
+                with self._lock:
+                    self.timeouts += 1
+                raise SingleFlightTimeout(f"Timed out after {timeout}s waiting for in-flight call")
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+            return call.result, False
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'in_flight': len(self._calls),
+                'leaders': self.leaders,
+                'coalesced_waits': self.coalesced,
+                'coalesce_timeouts': self.timeouts
+            }
+
+
+class LatencyWindow:
+    """Okno ostatnich wywołań upstream (czas trwania i wynik)"""
+
+    def __init__(self, size: int = 200):
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+        self.last_success_at = None
+        self.last_failure_at = None
+
+    def record(self, latency: float, ok: bool) -> None:
+        now = time.time()
+        with self._lock:
+            self._samples.append((now, latency, ok))
+            if ok:
+                self.last_success_at = now
+            else:
+                self.last_failure_at = now
+
+    def percentile(self, p: float, successful_only: bool = True) -> Optional[float]:
+        """Percentyl czasu odpowiedzi (p w zakresie 0-100) lub None bez próbek"""
+        with self._lock:
+            latencies = sorted(latency for _, latency, ok in self._samples
+                               if ok or not successful_only)
+        return _percentile(latencies, p)
+
+    def summary(self, max_age: Optional[float] = None) -> Dict[str, Any]:
+        """Statystyki okna (opcjonalnie tylko próbki młodsze niż max_age sekund)"""
+        now = time.time()
+        with self._lock:
+            samples = [sample for sample in self._samples
+                       if max_age is None or now - sample[0] <= max_age]
+            last_success_at = self.last_success_at
+            last_failure_at = self.last_failure_at
+
+        latencies = sorted(latency for _, latency, ok in samples if ok)
+        errors = sum(1 for _, _, ok in samples if not ok)
+
+        def percentile(p):
+            value = _percentile(latencies, p)
+            return round(value, 4) if value is not None else None
+
+        return {
+            'samples': len(samples),
+            'errors': errors,
+            'error_rate': round(errors / len(samples), 4) if samples else None,
+            'p50': percentile(50),
+            'p95': percentile(95),
+            'p99': percentile(99),
+            'last_success_at': last_success_at,
+            'last_failure_at': last_failure_at,
+            'seconds_since_success': round(now - last_success_at, 1) if last_success_at else None
+        }
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+
+class CircuitBreaker:
+    """Bezpiecznik: closed -> open po serii błędów -> half_open po czasie -> closed
+
+    W stanie open wywołania są odrzucane od razu, w half_open przepuszczane
+    jest tylko `half_open_max_calls` próbnych wywołań.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold: int = 5, recovery_timeout: float = 30,
+                 half_open_max_calls: int = 1):
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._half_open_calls = 0
+
+        self.rejected = 0
+        self.opened = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self) -> str:
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.recovery_timeout:
+            self._state = self.HALF_OPEN
+            self._half_open_calls = 0
+        return self._state
+
+    def allow(self) -> bool:
+        """Czy wywołanie może pójść do upstream"""
+        with self._lock:
+            state = self._current_state()
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and self._half_open_calls < self.half_open_max_calls:
+                self._half_open_calls += 1
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+
+    def record_failure(self) -> None:
+        with self._lock:
+            state = self._current_state()
+            self._failures += 1
+            if state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if state != self.OPEN:
+                    self.opened += 1
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+
+    def retry_after(self) -> int:
+        """Sekundy do próby half-open (0 gdy bezpiecznik zamknięty)"""
+        with self._lock:
+            if self._current_state() != self.OPEN:
+                return 0
+            remaining = self.recovery_timeout - (time.monotonic() - self._opened_at)
+            return max(1, int(remaining + 0.999))
+
+    def stats(self) -> Dict[str, Any]:
+        state = self.state
+        with self._lock:
+            return {
+                'state': state,
+                'consecutive_failures': self._failures,
+                'failure_threshold': self.failure_threshold,
+                'recovery_timeout': self.recovery_timeout,
+                'times_opened': self.opened,
+                'rejected_calls': self.rejected
+            }
+
+
+class IntervalGate:
+    """Co najwyżej jedno wykonanie na `interval` sekund dla wszystkich workerów
+
+    Stan (czas ostatniego wykonania i jego wynik) leży w małym pliku JSON
+    chronionym blokadą fcntl. Bez fcntl limit działa w obrębie procesu.
+    """
+
+    def __init__(self, path: str, interval: float):
+        self.path = path
+        self.interval = interval
+        self._lock = threading.Lock()
+
+    def run(self, fn: Callable[[], Dict[str, Any]]) -> Tuple[Dict[str, Any], bool]:
+        """Wykonaj fn jeśli minął interwał, inaczej zwróć ostatni wynik; zwraca (wynik, wykonano)"""
+        with self._lock, open(self.path, 'a+', encoding='utf-8') as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                try:
+                    state = json.loads(f.read() or '{}')
+                except ValueError:
+                    state = {}
+
+                last = state.get('at', 0)
+                if state.get('result') is not None and time.time() - last < self.interval:
+                    return state['result'], False
+
+                result = fn()
+                f.seek(0)
+                f.truncate()
+                f.write(json.dumps({'at': time.time(), 'result': result}))
+                f.flush()
+                os.fsync(f.fileno())
+                return result, True
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def backoff_delay(attempt: int, base: float = 0.5, cap: float = 20.0) -> float:
+    """Opóźnienie ponowienia z pełnym jitterem: losowo z [0, min(cap, base * 2^attempt)]"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class RateLimitTimeout(Exception):
+    """Oczekiwanie w kolejce limitera przekroczyłoby termin wywołania"""
+    pass
+
+
+class TokenBucketLimiter:
+    """Limit zapytań i tokenów na minutę wspólny dla wszystkich workerów
+
+    Dwa kubełki na klucz (model): zapytania i szacowane tokeny, uzupełniane
+    w sposób ciągły do limitu na okres `period` (domyślnie minuta). Stan leży w pliku JSON pod blokadą
+    fcntl (bez fcntl - w obrębie procesu). Wątki procesu czekają w kolejce
+    FIFO: kubełki sprawdza tylko pierwszy w kolejce, więc nikt nie jest
+    wyprzedzany; dodatkowo `max_concurrency` wywołań naraz na proces.
+    Wywołanie, które nie zmieściłoby się w swoim terminie, dostaje
+    RateLimitTimeout od razu zamiast czekać na pewną porażkę.
+    """
+
+    def __init__(self, path: str, requests_per_minute: float, tokens_per_minute: float,
+                 max_concurrency: int = 4, period: float = 60.0):
+        self.path = path
+        self.period = period
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.max_concurrency = max_concurrency
+        self._cond = threading.Condition()
+        self._queue: deque = deque()
+        self._in_flight = 0
+        self.waits = LatencyWindow(500)
+
+        self.acquired = 0
+        self.throttled = 0
+        self.timeouts = 0
+        self.penalties = 0
+        self.max_queue_depth = 0
+
+    @contextmanager
+    def _state(self) -> Iterator[Dict[str, Any]]:
+        """Stan kubełków do odczytu i zmiany pod blokadą pliku"""
+        with open(self.path, 'a+', encoding='utf-8') as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                try:
+                    state = json.loads(f.read() or '{}')
+                except ValueError:
+                    state = {}
+                yield state
+                f.seek(0)
+                f.truncate()
+                f.write(json.dumps(state))
+                f.flush()
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _refill(self, state: Dict[str, Any], key: str, now: float) -> Dict[str, float]:
+        bucket = state.get(key) or {'requests': self.requests_per_minute, 'tokens': self.tokens_per_minute,
+                                    'at': now, 'blocked_until': 0.0}
+        elapsed = max(0.0, now - bucket['at'])
+        bucket['requests'] = min(self.requests_per_minute,
+                                 bucket['requests'] + elapsed * self.requests_per_minute / self.period)
+        bucket['tokens'] = min(self.tokens_per_minute,
+                               bucket['tokens'] + elapsed * self.tokens_per_minute / self.period)
+        bucket['at'] = now
+        state[key] = bucket
+        return bucket
+
+    def _take(self, key: str, tokens: float) -> float:
+        """Pobierz zapytanie i tokeny; zwraca 0 albo sekundy do możliwego pobrania"""
+        with self._state() as state:
+            now = time.time()
+            bucket = self._refill(state, key, now)
+            wait = max(0.0,
+                       bucket['blocked_until'] - now,
+                       (1 - bucket['requests']) * self.period / self.requests_per_minute,
+                       (tokens - bucket['tokens']) * self.period / self.tokens_per_minute)
+            if wait <= 0:
+                bucket['requests'] -= 1
+                bucket['tokens'] -= tokens
+            return wait
+
+    @contextmanager
+    def slot(self, key: str, tokens: float, timeout: float) -> Iterator[float]:
+        """Czekaj na swoją kolej i limity, zwraca czas oczekiwania w sekundach"""
+        tokens = min(tokens, self.tokens_per_minute)  # większe zapytanie nigdy by się nie zmieściło
+        started = time.monotonic()
+        deadline = started + timeout
+        ticket = object()
+        with self._cond:
+            self._queue.append(ticket)
+            self.max_queue_depth = max(self.max_queue_depth, len(self._queue))
+            try:
+                while True:
+                    remaining = deadline - time.monotonic()
+                    if self._queue[0] is ticket and self._in_flight < self.max_concurrency:
+                        wait = self._take(key, tokens)
+                        if wait <= 0:
+                            break
+                        if wait > remaining:
+                            raise RateLimitTimeout(f"Rate limit wait {wait:.1f}s exceeds deadline ({remaining:.1f}s left)")
+                        self._cond.wait(wait)
+                    else:
+                        if remaining <= 0:
+                            raise RateLimitTimeout(f"Waited {timeout}s in the rate limiter queue")
+                        self._cond.wait(remaining)
+            except RateLimitTimeout:
+                self.timeouts += 1
+                self._queue.remove(ticket)
+                self._cond.notify_all()
+                raise
+            self._queue.popleft()
+            self._in_flight += 1
+            waited = time.monotonic() - started
+            self.acquired += 1
+            self.throttled += waited > 0.001
+            self.waits.record(waited, True)
+            self._cond.notify_all()
+
+        try:
+            yield waited
+        finally:
+            with self._cond:
+                self._in_flight -= 1
+                self._cond.notify_all()
+
+    def available(self, key: str) -> float:
+        """Tokeny dostępne teraz w kubełku klucza (bez pobierania; 0 w czasie blokady po 429)"""
+        with self._state() as state:
+            now = time.time()
+            bucket = self._refill(state, key, now)
+            return 0.0 if bucket['blocked_until'] > now else max(0.0, bucket['tokens'])
+
+    def refill_seconds(self, tokens: float) -> float:
+        """Czas, w którym pusty kubełek uzbiera `tokens` (zapytanie większe od limitu - cały okres)"""
+        return min(tokens, self.tokens_per_minute) * self.period / self.tokens_per_minute
+
+    def settle(self, key: str, tokens: float) -> None:
+        """Rozlicz różnicę między szacunkiem a faktycznym zużyciem tokenów (może być ujemna)"""
+        with self._cond, self._state() as state:
+            bucket = self._refill(state, key, time.time())
+            bucket['tokens'] -= tokens
+
+    def penalize(self, key: str, seconds: float) -> None:
+        """Wstrzymaj klucz we wszystkich workerach (np. po 429 z Retry-After)"""
+        with self._cond, self._state() as state:
+            now = time.time()
+            bucket = self._refill(state, key, now)
+            bucket['blocked_until'] = max(bucket['blocked_until'], now + seconds)
+            self.penalties += 1
+            self._cond.notify_all()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            stats = {
+                'requests_per_minute': self.requests_per_minute,
+                'tokens_per_minute': self.tokens_per_minute,
+                'max_concurrency': self.max_concurrency,
+                'queue_depth': len(self._queue),
+                'max_queue_depth': self.max_queue_depth,
+                'in_flight': self._in_flight,
+                'acquired': self.acquired,
+                'throttled': self.throttled,
+                'timeouts': self.timeouts,
+                'penalties': self.penalties
+            }
+        waits = self.waits.summary()
+        stats['wait_seconds'] = {key: waits[key] for key in ('p50', 'p95', 'p99')}
+        return stats
@@ -0,0 +1,309 @@
+"""
+Result Cache
+Ograniczony cache LRU z TTL na wpis, bezpieczny dla wielu wątków
+"""
+import json
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def estimate_size(value: Any) -> int:
+    """Przybliżony rozmiar wartości w bajtach (długość serializacji JSON)"""
+    try:
+        return len(json.dumps(value, ensure_ascii=False, default=str).encode('utf-8'))
+    except (TypeError, ValueError):
+        return sys.getsizeof(value)
+
+
+class TTLCache:
+    """Cache LRU z TTL: get/put w O(1), limit wpisów i bajtów, liczniki"""
+
+    def __init__(self, ttl: float = 300, max_entries: int = 1000, max_bytes: Optional[int] = None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Zwróć wartość jeśli istnieje i nie wygasła (odświeża pozycję LRU)"""
+        entry = self.get_entry(key)
+        return entry[0] if entry else None
+
+    def get_entry(self, key: Hashable) -> Optional[Tuple[Any, float]]:
+        """Zwróć (wartość, wiek w sekundach) jeśli wpis nie wygasł"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            value, expires_at, size, stored_at = entry
+            now = time.monotonic()
+            if expires_at <= now:
+                self._remove(key, size)
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value, now - stored_at
+
+    def put(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """Zapisz wartość; przy przepełnieniu usuwa najdawniej używane wpisy"""
+        size = estimate_size(value) if self.max_bytes else 0
+        if self.max_bytes and size > self.max_bytes:
+            return
+
+        now = time.monotonic()
+        expires_at = now + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._bytes -= old[2]
+
+            self._data[key] = (value, expires_at, size, now)
+            self._bytes += size
+
+            while len(self._data) > self.max_entries or (
+                    self.max_bytes and self._bytes > self.max_bytes):
+                _, (_, _, evicted_size, _) = self._data.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def delete(self, key: Hashable) -> None:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                self._remove(key, entry[2])
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def _remove(self, key: Hashable, size: int) -> None:
+        del self._data[key]
+        self._bytes -= size
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        """Liczniki do health/metrics"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'backend': 'memory',
+                'entries': len(self._data),
+                'bytes': self._bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+                'evictions': self.evictions,
+                'expirations': self.expirations
+            }
+
+
+class SQLiteCache:
+    """Cache TTL w pliku SQLite (WAL) współdzielony przez workery na hoście
+
+    Ten sam interfejs co TTLCache (get/put/delete/clear/stats). Wpisy
+    przetrwają restart procesu; wygasłe są pomijane przy odczycie
+    i okresowo usuwane przy zapisie razem z najdawniej używanymi ponad
+    limit wpisów lub bajtów.
+    """
+
+    PURGE_EVERY = 100  # co ile zapisów usuwać wygasłe wpisy
+
+    def __init__(self, path: str, ttl: float = 300, max_entries: Optional[int] = None,
+                 timeout: float = 5.0, max_bytes: Optional[int] = None,
+                 purge_every: Optional[int] = None):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self.purge_every = purge_every or self.PURGE_EVERY
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._writes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                " key TEXT PRIMARY KEY,"
+                " value TEXT NOT NULL,"
+                " expires_at REAL NOT NULL,"
+                " accessed_at REAL NOT NULL,"
+                " stored_at REAL NOT NULL DEFAULT 0,"
+                " size INTEGER NOT NULL DEFAULT 0)"
+            )
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(cache)")}
+            if 'stored_at' not in columns:
+                # Plik z poprzedniej wersji - wpisy bez znacznika traktujemy jako nieświeże
+                conn.execute("ALTER TABLE cache ADD COLUMN stored_at REAL NOT NULL DEFAULT 0")
+            if 'size' not in columns:
+                conn.execute("ALTER TABLE cache ADD COLUMN size INTEGER NOT NULL DEFAULT 0")
+                conn.execute("UPDATE cache SET size = length(CAST(value AS BLOB))")
+            conn.execute("CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed_at)")
+        logger.info(f"SQLite result cache ready: {path}")
+
+    def _connect(self) -> sqlite3.Connection:
+        """Połączenie na wątek (i na proces - po forku tworzone od nowa)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        entry = self.get_entry(key)
+        return entry[0] if entry else None
+
+    def get_entry(self, key: Hashable) -> Optional[Tuple[Any, float]]:
+        """Zwróć (wartość, wiek w sekundach) jeśli wpis nie wygasł"""
+        now = time.time()
+        try:
+            conn = self._connect()
+            row = conn.execute(
+                "SELECT value, expires_at, stored_at FROM cache WHERE key = ?", (str(key),)
+            ).fetchone()
+            if row is None:
+                self._count('misses')
+                return None
+
+            value, expires_at, stored_at = row
+            if expires_at <= now:
+                conn.execute("DELETE FROM cache WHERE key = ? AND expires_at <= ?", (str(key), now))
+                self._count('expirations')
+                self._count('misses')
+                return None
+
+            conn.execute("UPDATE cache SET accessed_at = ? WHERE key = ?", (now, str(key)))
+            self._count('hits')
+            return json.loads(value), now - stored_at
+
+        except sqlite3.Error as e:
+            # Awaria współdzielonego cache nie może blokować obliczeń
+            logger.warning(f"SQLite cache read failed: {e}")
+            self._count('misses')
+            return None
+
+    def put(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        now = time.time()
+        expires_at = now + (self.ttl if ttl is None else ttl)
+        data = json.dumps(value, ensure_ascii=False)
+        size = len(data.encode('utf-8'))
+        if self.max_bytes and size > self.max_bytes:
+            return
+        try:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at, accessed_at, stored_at, size)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (str(key), data, expires_at, now, now, size)
+            )
+            with self._lock:
+                self._writes += 1
+                purge = self._writes % self.purge_every == 0
+            if purge:
+                self._purge(conn, now)
+        except sqlite3.Error as e:
+            logger.warning(f"SQLite cache write failed: {e}")
+
+    def _purge(self, conn: sqlite3.Connection, now: float) -> None:
+        """Usuń wygasłe wpisy i najdawniej używane ponad limit"""
+        expired = conn.execute("DELETE FROM cache WHERE expires_at <= ?", (now,)).rowcount
+        evicted = 0
+        if self.max_entries:
+            evicted = conn.execute(
+                "DELETE FROM cache WHERE key IN ("
+                " SELECT key FROM cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            ).rowcount
+        if self.max_bytes:
+            # Suma narastająca od najświeżej używanych - wszystko ponad limit wylatuje
+            evicted += conn.execute(
+                "DELETE FROM cache WHERE key IN ("
+                " SELECT key FROM (SELECT key, SUM(size) OVER"
+                "  (ORDER BY accessed_at DESC ROWS UNBOUNDED PRECEDING) AS total FROM cache)"
+                " WHERE total > ?)",
+                (self.max_bytes,)
+            ).rowcount
+        with self._lock:
+            self.expirations += max(0, expired)
+            self.evictions += max(0, evicted)
+
+    def delete(self, key: Hashable) -> None:
+        try:
+            self._connect().execute("DELETE FROM cache WHERE key = ?", (str(key),))
+        except sqlite3.Error as e:
+            logger.warning(f"SQLite cache delete failed: {e}")
+
+    def clear(self) -> None:
+        self._connect().execute("DELETE FROM cache")
+
+    def __len__(self) -> int:
+        try:
+            return self._connect().execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+        except sqlite3.Error:
+            return 0
+
+    def total_bytes(self) -> int:
+        try:
+            return self._connect().execute("SELECT COALESCE(SUM(size), 0) FROM cache").fetchone()[0]
+        except sqlite3.Error:
+            return 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Liczniki tego procesu + rozmiar współdzielonego pliku"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            counters = {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+                'evictions': self.evictions,
+                'expirations': self.expirations
+            }
+        return {
+            'backend': 'sqlite',
+            'path': self.path,
+            'entries': len(self),
+            'bytes': self.total_bytes(),
+            'max_entries': self.max_entries,
+            'max_bytes': self.max_bytes,
+            **counters
+        }
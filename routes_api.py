@@ -1,11 +1,17 @@
 """
 API Routes for Heat Pump Calculator
 """
-from flask import Blueprint, request, jsonify, current_app
+from flask import Blueprint, Response, request, jsonify, current_app, stream_with_context, url_for
 from werkzeug.utils import secure_filename
+import json
 import os
+import threading
+import time
 
 from src.services.pdf_analyzer import pdf_analyzer
+from pdf_jobs import FINAL_STATUSES, create_job_runner
+from pdf_sandbox import LIMIT_HTTP_STATUS
+from pdf_upload import UploadRejected, inspect_pdf, spool_upload
 
 # Import for status checking
 try:
@@ -20,6 +26,55 @@ except ImportError:
 
 api_bp = Blueprint('api', __name__)
 
+# Background PDF jobs - created on first use (after the gunicorn fork)
+_job_runner = None
+_job_runner_lock = threading.Lock()
+
+SSE_POLL_INTERVAL = 0.5
+SSE_HEARTBEAT = 15
+# Each open stream holds a gthread thread: responses are short (the browser reconnects
+# with Last-Event-ID) and only some of the threads may stream at once - the rest poll
+SSE_MAX_DURATION = float(os.environ.get('PDF_JOB_SSE_TIMEOUT', 25))
+SSE_MAX_STREAMS = int(os.environ.get('PDF_JOB_SSE_MAX_STREAMS', 4))
+_sse_streams = threading.BoundedSemaphore(max(1, SSE_MAX_STREAMS))
+MULTIPART_OVERHEAD = 64 * 1024  # form boundaries and fields around the file
+
+
+def get_job_runner():
+    global _job_runner
+    with _job_runner_lock:
+        if _job_runner is None:
+            _job_runner = create_job_runner(pdf_analyzer.process_pdf_file)
+        return _job_runner
+
+
+def _wants_async():
+    """Job mode: ?async=1, form field async=1 or header Prefer: respond-async"""
+    flag = request.args.get('async') or request.form.get('async')
+    return flag in ('1', 'true') or 'respond-async' in request.headers.get('Prefer', '')
+
+
+def _rejection(error):
+    """JSON response for an upload refused before parsing"""
+    return jsonify({
+        'status': 'error',
+        'error': error.message,
+        'error_type': error.error_type
+    }), error.http_status
+
+
+def _job_payload(job):
+    """Job state for the client; result in the same shape as the synchronous response"""
+    payload = {key: job[key] for key in ('job_id', 'status', 'stage', 'progress',
+                                         'created_at', 'updated_at')}
+    if job['status'] == 'done':
+        payload['data'] = job['result']
+    elif job['status'] == 'error':
+        payload['error'] = job['error']
+        payload['error_type'] = job['error_type']
+        payload['data'] = job['result']
+    return payload
+
 @api_bp.route('/analyze-pdf', methods=['POST'])
 def analyze_pdf():
     """API endpoint for PDF analysis with AI"""
@@ -34,6 +89,11 @@ def analyze_pdf():
                 'error': 'Serwis analizy PDF nie jest dostępny. Sprawdź konfigurację GROQ_API_KEY.'
             }), 503
         
+        # Oversized body refused from the header alone, before Werkzeug reads it
+        if request.content_length and request.content_length > pdf_analyzer.max_bytes + MULTIPART_OVERHEAD:
+            return _rejection(UploadRejected(
+                f"Plik PDF jest za duży (limit {pdf_analyzer.max_bytes // (1024 * 1024)} MB)", 'too_large', 413))
+
         # Check if file was uploaded - accept both 'file' and 'pdf_file' field names
         pdf_file = None
         if 'file' in request.files:
@@ -64,23 +124,70 @@ def analyze_pdf():
         filename = secure_filename(pdf_file.filename)
         current_app.logger.info(f"Processing PDF file: {filename}")
         
+        # Spool to a temp file and check header, trailer and page tree - no full parse yet
+        try:
+            upload = spool_upload(pdf_file.stream, pdf_analyzer.max_bytes)
+        except UploadRejected as e:
+            current_app.logger.warning(f"PDF upload rejected: {e.error_type}")
+            return _rejection(e)
+        try:
+            inspect_pdf(upload, pdf_analyzer.max_pages)
+        except UploadRejected as e:
+            upload.close()
+            current_app.logger.warning(f"PDF upload rejected: {e.error_type}")
+            return _rejection(e)
+
+        if _wants_async():
+            try:
+                job_id = get_job_runner().submit(upload, filename)
+            except Exception:
+                upload.close()
+                raise
+            if job_id is None:
+                upload.close()
+                current_app.logger.warning("PDF job queue full")
+                response = jsonify({
+                    'status': 'error',
+                    'error': 'Zbyt wiele analiz w kolejce. Spróbuj ponownie za chwilę.',
+                    'error_type': 'queue_full'
+                })
+                response.headers['Retry-After'] = '10'
+                return response, 503
+
+            current_app.logger.info(f"PDF analysis queued as job {job_id}")
+            status_url = url_for('api.pdf_job_status', job_id=job_id)
+            response = jsonify({
+                'status': 'accepted',
+                'job_id': job_id,
+                'status_url': status_url,
+                'events_url': url_for('api.pdf_job_events', job_id=job_id)
+            })
+            response.headers['Location'] = status_url
+            return response, 202
+
         # Process PDF with AI
-        result = pdf_analyzer.process_pdf_file(pdf_file)
+        try:
+            result = pdf_analyzer.process_pdf_file(upload)
+        finally:
+            upload.close()
         
         if result['processing_status'] == 'success':
             current_app.logger.info("PDF analysis completed successfully")
             return jsonify({
                 'status': 'success',
                 'data': result,
+                'cached': result.get('cache', {}).get('hit', False),
                 'message': 'Analiza PDF zakończona pomyślnie'
             })
         else:
             current_app.logger.error(f"PDF analysis failed: {result.get('error_message', 'Unknown error')}")
+            # Sandbox limits are a property of the document (422) or momentary load (503)
             return jsonify({
                 'status': 'error',
                 'error': result.get('error_message', 'Błąd analizy PDF'),
+                'error_type': result.get('error_type'),
                 'data': result
-            }), 500
+            }), LIMIT_HTTP_STATUS.get(result.get('error_type'), 500)
             
     except Exception as e:
         current_app.logger.error(f"PDF analysis endpoint error: {e}")
@@ -89,6 +196,74 @@ def analyze_pdf():
             'error': f'Błąd serwera: {str(e)}'
         }), 500
 
+@api_bp.route('/analyze-pdf/<job_id>', methods=['GET'])
+def pdf_job_status(job_id):
+    """Polling: state of an asynchronous PDF analysis job"""
+    job = get_job_runner().get(job_id)
+    if job is None:
+        return jsonify({
+            'status': 'error',
+            'error': 'Nie znaleziono zadania analizy',
+            'error_type': 'job_not_found'
+        }), 404
+    return jsonify(_job_payload(job))
+
+
+@api_bp.route('/analyze-pdf/<job_id>/events', methods=['GET'])
+def pdf_job_events(job_id):
+    """Server-sent events: job stages until done/error"""
+    runner = get_job_runner()
+    if runner.get(job_id) is None:
+        return jsonify({
+            'status': 'error',
+            'error': 'Nie znaleziono zadania analizy',
+            'error_type': 'job_not_found'
+        }), 404
+
+    try:
+        last_seq = int(request.headers.get('Last-Event-ID', 0))
+    except ValueError:
+        last_seq = 0
+
+    if not _sse_streams.acquire(blocking=False):
+        # EventSource gives up on a non-200 response - the client falls back to polling status_url
+        response = jsonify({
+            'status': 'error',
+            'error': 'Zbyt wiele otwartych strumieni zdarzeń - postęp dostępny przez status zadania',
+            'error_type': 'too_many_streams',
+            'status_url': url_for('api.pdf_job_status', job_id=job_id)
+        })
+        response.headers['Retry-After'] = str(int(SSE_MAX_DURATION))
+        return response, 503
+
+    def generate():
+        nonlocal last_seq
+        started = last_beat = time.monotonic()
+        yield f"retry: {int(SSE_POLL_INTERVAL * 2000)}\n\n"
+        while time.monotonic() - started < SSE_MAX_DURATION:
+            for event in runner.store.events_since(job_id, last_seq):
+                last_seq = event['seq']
+                yield (f"id: {event['seq']}\nevent: {event['stage']}\n"
+                       f"data: {json.dumps(event, ensure_ascii=False)}\n\n")
+
+            job = runner.get(job_id)
+            if job is None or job['status'] in FINAL_STATUSES:
+                if job is not None:
+                    yield f"event: result\ndata: {json.dumps(_job_payload(job), ensure_ascii=False)}\n\n"
+                return
+
+            if time.monotonic() - last_beat >= SSE_HEARTBEAT:
+                last_beat = time.monotonic()
+                yield ": keep-alive\n\n"
+            time.sleep(SSE_POLL_INTERVAL)
+
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream')
+    response.call_on_close(_sse_streams.release)
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
 @api_bp.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
@@ -106,6 +281,14 @@ def pdf_status():
         'pdf_analyzer_available': pdf_analyzer.is_available(),
         'groq_api_configured': bool(pdf_analyzer.api_key),
         'model': pdf_analyzer.model,
+        'models': list(pdf_analyzer.models),
+        'cache': pdf_analyzer.cache_stats(),
+        'page_cache': pdf_analyzer.page_cache_stats(),
+        'near_duplicates': pdf_analyzer.near_duplicate_stats(),
+        'jobs': get_job_runner().stats(),
+        'extraction': pdf_analyzer.extraction_stats(),
+        'rate_limit': pdf_analyzer.rate_limit_stats(),
+        'sandbox': pdf_analyzer.sandbox_stats(),
         'dependencies_ok': {
             'pypdf2': bool(PyPDF2),
             'groq': bool(Groq)
@@ -0,0 +1,251 @@
+"""
+Rule-based project data extraction
+Compiled regexes with unit normalisation that fill the `found_data` schema of
+PDFAIAnalyzer without an LLM call when the project states the values in one
+of the usual Polish forms
+"""
+import re
+from typing import Any, Collection, Dict, List, Optional, Set, Tuple
+
+FOUND_DATA_FIELDS = (
+    'powierzchnia_uzytkowa',
+    'wskaznik_eu',
+    'lokalizacja',
+    'zapotrzebowanie_cieplo',
+    'moc_grzewcza',
+    'temperatura_projektowa',
+    'rodzaj_budynku',
+    'standard_energetyczny'
+)
+
+# Number not glued to a preceding symbol (m2, C24, B500SP); Polish "1 234,5" allowed
+_NUMBER_RE = re.compile(
+    r'(?<![\w.,/])([-−–]\s?)?(\d{1,3}(?:[  ]\d{3})+(?:[.,]\d+)?|\d+(?:[.,]\d+)?)(?![\d])'
+)
+
+# Unit -> (kind, multiplier to the found_data unit); case matters for W vs w
+_UNITS: List[Tuple[re.Pattern, str, float]] = [
+    (re.compile(r'\s*\[?\s*kWh\s*/\s*\(?\s*m\s*(?:2|²|\^2)\s*[·*.x×]?\s*(?i:rok|a)\s*\)?'), 'eu', 1.0),
+    (re.compile(r'\s*\[?\s*MWh\s*/\s*(?i:rok|a)\b'), 'energy', 1000.0),
+    (re.compile(r'\s*\[?\s*GJ\s*/\s*(?i:rok|a)\b'), 'energy', 277.778),
+    (re.compile(r'\s*\[?\s*kWh\s*/\s*(?i:rok|a)\b'), 'energy', 1.0),
+    (re.compile(r'\s*\[?\s*kW\b'), 'power', 1.0),
+    (re.compile(r'\s*\[?\s*W\b'), 'power', 0.001),
+    (re.compile(r'\s*\[?\s*m\s*(?:2|²|\^2)(?![\d/])'), 'area', 1.0),
+    (re.compile(r'\s*\[?\s*(?:°\s*C|oC|C)\b'), 'temp', 1.0),
+]
+
+# field -> (label, expected kind, plausible range, accept a number without unit)
+_NUMERIC_FIELDS = {
+    'powierzchnia_uzytkowa': (
+        re.compile(r'powierzchni\w*\s+u[żz]ytkow\w*(?:\s+ogrzewan\w*)?|pow\.\s*u[żz]yt\w*\.?', re.IGNORECASE),
+        'area', (10, 5000), True
+    ),
+    'wskaznik_eu': (
+        re.compile(r'\bEU(?:co)?\b|energi\w*\s+u[żz]ytkow\w*', re.IGNORECASE),
+        'eu', (5, 500), True
+    ),
+    'zapotrzebowanie_cieplo': (
+        re.compile(r'zapotrzebowani\w*\s+na\s+(?:ciep[łl]o|energi\w*\s+(?:do|na)\s+ogrzewani\w*)'
+                   r'|Q\s*[Hh]\s*,\s*nd\b', re.IGNORECASE),
+        'energy', (500, 1000000), False
+    ),
+    'moc_grzewcza': (
+        re.compile(r'moc\w*\s+(?:grzewcz|ciepln)\w*|obci[ąa][żz]eni\w*\s+ciepln\w*|Φ\s*HL\b|Φ\s*=', re.IGNORECASE),
+        'power', (0.5, 200), False
+    ),
+    'temperatura_projektowa': (
+        re.compile(r'(?:projektow|obliczeniow)\w*\s+temperatur\w*\s+zewn\w*'
+                   r'|temperatur\w*\s+(?:projektow|obliczeniow)\w*\s+zewn\w*|θ\s*e\b', re.IGNORECASE),
+        'temp', (-35, -5), True
+    ),
+}
+
+# Plausible value ranges of the numeric fields, in found_data units
+FIELD_RANGES = {field: bounds for field, (_, _, bounds, _) in _NUMERIC_FIELDS.items()}
+
+_WINDOW = 90  # characters after the label searched for the value
+
+# Numbers that are not the value: "nr 14", "wg WT 2021", "PN-ISO 9836:1997", "PN-EN 12831"
+_SKIP_BEFORE_RE = re.compile(
+    r'(?:\b(?i:nr|wg|poz)\.?|\b(?:PN|ISO|EN|WT|DIN))(?:[\s\-:]*(?:PN|ISO|EN|WT|DIN)\b)*[\s\-:]*$|\d:$'
+)
+
+# Another quantity starts - the window ends before it
+_BOUNDARY_RE = re.compile(
+    r'(?i:powierzchni\w*\s+(?:zabudow|ca[łl]kowit|netto|brutto|ruchu|wewn[ęe]trzn)\w*|kubatur\w*)|\bE[PK]\b'
+)
+_LOCATION_RE = re.compile(
+    r'(?i:lokalizacja|miejscowo[śs][ćc]|adres\s+inwestycji)\s*[:\-]?\s*(?:ul\.\s*[^,\n]+,\s*)?'
+    r'(?:\d{2}-\d{3}\s+)?([A-ZŁŚŻŹĆÓ][\wąćęłńóśźż\-]+(?:\s+[A-ZŁŚŻŹĆÓ][\wąćęłńóśźż\-]+)?)'
+)
+
+_BUILDING_TYPES = [
+    (re.compile(r'wielorodzinn', re.IGNORECASE), 'budynek wielorodzinny'),
+    (re.compile(r'bli[źz]niak|bli[źz]niacz', re.IGNORECASE), 'dom w zabudowie bliźniaczej'),
+    (re.compile(r'szeregow', re.IGNORECASE), 'dom w zabudowie szeregowej'),
+    (re.compile(r'jednorodzinn', re.IGNORECASE), 'dom jednorodzinny'),
+]
+
+_STANDARDS = [
+    (re.compile(r'pasywn', re.IGNORECASE), 'pasywny'),
+    (re.compile(r'niskoenergetyczn', re.IGNORECASE), 'niskoenergetyczny'),
+    (re.compile(r'energooszcz[ęe]dn', re.IGNORECASE), 'energooszczędny'),
+    (re.compile(r'WT\s*2021', re.IGNORECASE), 'WT 2021'),
+    (re.compile(r'WT\s*2017', re.IGNORECASE), 'WT 2017'),
+]
+
+
+def parse_number(sign: Optional[str], digits: str) -> float:
+    """'1 234,5' -> 1234.5; minus, en dash and unicode minus accepted"""
+    value = float(digits.replace(' ', '').replace(' ', '').replace(',', '.'))
+    return -value if sign else value
+
+
+def _unit_at(text: str, position: int) -> Optional[Tuple[str, float]]:
+    for pattern, kind, factor in _UNITS:
+        if pattern.match(text, position):
+            return kind, factor
+    return None
+
+
+def _unit_in(text: str) -> Optional[Tuple[str, float]]:
+    """Unit stated in the label part, e.g. 'EU [kWh/(m2·rok)] 85,2'"""
+    for pattern, kind, factor in _UNITS:
+        if kind != 'temp' and pattern.search(text):
+            return kind, factor
+    return None
+
+
+def _window_end(window: str, field: str) -> int:
+    ends = [match.start() for match in (_BOUNDARY_RE.search(window),) if match]
+    ends += [match.start() for other, (label, _, _, _) in _NUMERIC_FIELDS.items() if other != field
+             for match in (label.search(window),) if match]
+    return min(ends, default=len(window))
+
+
+def _find_value(text: str, field: str) -> Optional[Tuple[float, bool]]:
+    """(value, stated with its unit) of the field, None when not found
+
+    Every number in the window after a label is a candidate; one carrying the
+    expected unit wins over a bare number anywhere in the text, so "mieszkania
+    nr 14 – 62 m2" or "wg WT 2021: 70; EU = 55 kWh/(m2·rok)" read 62 and 55.
+    """
+    label, kind, (low, high), bare_ok = _NUMERIC_FIELDS[field]
+    bare = None
+    for label_match in label.finditer(text):
+        start = label_match.end()
+        window = text[start:start + _WINDOW]
+        window = window[:_window_end(window, field)]
+        for number in _NUMBER_RE.finditer(window):
+            if _SKIP_BEFORE_RE.search(window, 0, number.start()):
+                continue
+            unit = _unit_at(window, number.end())
+            if unit is None:
+                unit = _unit_in(window[:number.start()])
+            if unit is None:
+                if not bare_ok or bare is not None:
+                    continue
+                unit = (kind, 1.0)
+                with_unit = False
+            else:
+                with_unit = True
+            if unit[0] != kind:
+                continue
+            # "mieszkania nr 14 – 62 m2": a dash before a positive quantity separates
+            sign = number.group(1) if low < 0 else None
+            value = parse_number(sign, number.group(2)) * unit[1]
+            if not low <= value <= high:
+                continue
+            if with_unit:
+                return round(value, 2), True
+            bare = round(value, 2)
+    return (bare, False) if bare is not None else None
+
+
+def extract_fields(text: str, confirmed: Optional[Set[str]] = None) -> Dict[str, Any]:
+    """found_data from the project text; fields that were not found are None
+
+    Numeric fields whose value was stated with its unit are added to `confirmed`.
+    """
+    found: Dict[str, Any] = dict.fromkeys(FOUND_DATA_FIELDS)
+    for field in _NUMERIC_FIELDS:
+        match = _find_value(text, field)
+        if match is not None:
+            found[field] = match[0]
+            if match[1] and confirmed is not None:
+                confirmed.add(field)
+
+    location = _LOCATION_RE.search(text)
+    if location:
+        found['lokalizacja'] = location.group(1)
+
+    for pattern, name in _BUILDING_TYPES:
+        if pattern.search(text):
+            found['rodzaj_budynku'] = name
+            break
+
+    for pattern, name in _STANDARDS:
+        if pattern.search(text):
+            found['standard_energetyczny'] = name
+            break
+
+    return found
+
+
+def is_sufficient(found: Dict[str, Any], confirmed: Optional[Collection[str]] = None) -> bool:
+    """Enough for calculate_heating_requirements: direct power, or area plus EU
+
+    With `confirmed`, only those fields count - a bare number next to a label
+    is a hint for the LLM, not enough to skip it.
+    """
+    if confirmed is not None:
+        found = {field: found.get(field) for field in confirmed}
+    return bool(found.get('moc_grzewcza') or
+                (found.get('powierzchnia_uzytkowa') and found.get('wskaznik_eu')))
+
+
+def missing_fields(found: Dict[str, Any]) -> List[str]:
+    return [field for field in FOUND_DATA_FIELDS if found.get(field) is None]
+
+
+class FieldDetector:
+    """extract_fields applied page by page while the text is still being extracted
+
+    A field keeps the first value found, as in a single pass over the whole
+    text, unless a later page states it with its unit. `sufficient` turns
+    true once is_sufficient holds for the unit-confirmed fields.
+    """
+
+    def __init__(self):
+        self.found: Dict[str, Any] = dict.fromkeys(FOUND_DATA_FIELDS)
+        self.confirmed: Set[str] = set()
+        self.sufficient = False
+
+    def feed(self, text: str) -> bool:
+        """Scan one more page; returns True when the fields needed are known"""
+        confirmed: Set[str] = set()
+        for field, value in extract_fields(text, confirmed).items():
+            if value is None:
+                continue
+            if self.found[field] is None or (field in confirmed and field not in self.confirmed):
+                self.found[field] = value
+                if field in confirmed:
+                    self.confirmed.add(field)
+        self.sufficient = is_sufficient(self.found, self.confirmed)
+        return self.sufficient
+
+
+def build_rule_analysis(found: Dict[str, Any]) -> Dict[str, Any]:
+    """analyze_construction_project-shaped result built from rule matches only"""
+    known = len(FOUND_DATA_FIELDS) - len(missing_fields(found))
+    direct = bool(found.get('moc_grzewcza'))
+    return {
+        "found_data": found,
+        "analysis_summary": f"Dane odczytane automatycznie z tekstu projektu ({known} z {len(FOUND_DATA_FIELDS)} pól)",
+        "data_quality": "good" if known >= 4 else "partial",
+        "recommended_calculation_method": "direct_power" if direct else "zordon_formula",
+        "confidence_level": 0.9 if known >= 4 else 0.75,
+        "notes": "Wartości odczytane regułami z jednoznacznych zapisów projektu - bez analizy AI.",
+        "extraction_method": "rules"
+    }